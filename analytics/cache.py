@@ -0,0 +1,166 @@
+"""
+Analytics response cache
+Role-scoped caching for the analytics endpoints with stale-while-revalidate
+and per-key locks, so a burst of dashboard loads triggers one recomputation
+"""
+import hashlib
+import logging
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+# Seconds a cached response is served as fresh
+ANALYTICS_CACHE_SOFT_TTL = getattr(settings, 'ANALYTICS_CACHE_SOFT_TTL', 300)
+# Extra seconds a stale response may be served while one request recomputes
+ANALYTICS_CACHE_STALE_TTL = getattr(settings, 'ANALYTICS_CACHE_STALE_TTL', 1800)
+# Upper bound on how long a recompute may hold the per-key lock
+ANALYTICS_CACHE_LOCK_TIMEOUT = getattr(settings, 'ANALYTICS_CACHE_LOCK_TIMEOUT', 30)
+# How long a cold request waits for another request's recompute
+ANALYTICS_CACHE_WAIT_TIMEOUT = getattr(settings, 'ANALYTICS_CACHE_WAIT_TIMEOUT', 5)
+ANALYTICS_CACHE_WAIT_INTERVAL = 0.1
+
+CACHE_OUTCOMES = ('hit', 'stale', 'miss', 'wait_hit')
+
+# Endpoint names registered through @cached_analytics, for the metrics surface
+_registered_endpoints = set()
+
+
+def get_cache_scope(user):
+    """
+    Scope of the data an analytics view returns for ``user``.
+
+    Admins see platform-wide numbers and share one entry; everyone else gets
+    data filtered to themselves and is keyed by user id.
+    """
+    role = getattr(user, 'role', '') or ''
+    if role == 'admin':
+        return role, 'all'
+    return role, str(user.pk)
+
+
+def build_cache_key(endpoint, request):
+    """Cache key for (endpoint, role, user scope, query params)"""
+    role, scope = get_cache_scope(request.user)
+    params = '&'.join(
+        f'{key}={value}'
+        for key in sorted(request.GET)
+        for value in request.GET.getlist(key)
+    )
+    params_hash = hashlib.md5(params.encode()).hexdigest()
+    return f'analytics_cache:{endpoint}:{role}:{scope}:{params_hash}'
+
+
+def _record(endpoint, outcome):
+    """Increment the hit/miss counter for an endpoint"""
+    key = f'analytics_cache_metrics:{endpoint}:{outcome}'
+    try:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+    except ValueError:
+        # Key evicted between add() and incr()
+        cache.set(key, 1, timeout=None)
+
+
+def _store(key, data):
+    """Store a response payload with its soft expiry"""
+    entry = {'data': data, 'fresh_until': time.time() + ANALYTICS_CACHE_SOFT_TTL}
+    cache.set(key, entry, ANALYTICS_CACHE_SOFT_TTL + ANALYTICS_CACHE_STALE_TTL)
+
+
+def _recompute(view_func, key, request, args, kwargs):
+    """Run the view and cache its payload if it succeeded"""
+    response = view_func(request, *args, **kwargs)
+    if response.status_code == 200:
+        _store(key, response.data)
+    return response
+
+
+def cached_analytics(endpoint):
+    """
+    Cache a DRF analytics view's response data.
+
+    Apply below ``@api_view``/``@permission_classes`` so authentication and
+    permission checks still run on every request. Entries are fresh for
+    ``ANALYTICS_CACHE_SOFT_TTL`` seconds. After that the first request to take
+    the per-key lock recomputes while concurrent requests keep serving the
+    stale copy. On a cold key, requests that lose the lock wait briefly for
+    the winner's result rather than all hitting the database.
+    """
+    _registered_endpoints.add(endpoint)
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            key = build_cache_key(endpoint, request)
+            lock_key = f'{key}:lock'
+            entry = cache.get(key)
+
+            if entry is not None:
+                if entry['fresh_until'] > time.time():
+                    _record(endpoint, 'hit')
+                    return Response(entry['data'])
+                if not cache.add(lock_key, 1, ANALYTICS_CACHE_LOCK_TIMEOUT):
+                    # Someone else is already revalidating
+                    _record(endpoint, 'stale')
+                    return Response(entry['data'])
+                _record(endpoint, 'miss')
+                try:
+                    return _recompute(view_func, key, request, args, kwargs)
+                finally:
+                    cache.delete(lock_key)
+
+            if not cache.add(lock_key, 1, ANALYTICS_CACHE_LOCK_TIMEOUT):
+                deadline = time.time() + ANALYTICS_CACHE_WAIT_TIMEOUT
+                while time.time() < deadline:
+                    time.sleep(ANALYTICS_CACHE_WAIT_INTERVAL)
+                    entry = cache.get(key)
+                    if entry is not None:
+                        _record(endpoint, 'wait_hit')
+                        return Response(entry['data'])
+                logger.warning(f"Timed out waiting for analytics cache fill: {endpoint}")
+                _record(endpoint, 'miss')
+                return _recompute(view_func, key, request, args, kwargs)
+
+            _record(endpoint, 'miss')
+            try:
+                return _recompute(view_func, key, request, args, kwargs)
+            finally:
+                cache.delete(lock_key)
+
+        return wrapper
+    return decorator
+
+
+def get_cache_metrics():
+    """Hit/miss counters per registered endpoint plus overall totals"""
+    endpoints = sorted(_registered_endpoints)
+    keys = [
+        f'analytics_cache_metrics:{endpoint}:{outcome}'
+        for endpoint in endpoints
+        for outcome in CACHE_OUTCOMES
+    ]
+    values = cache.get_many(keys)
+
+    totals = dict.fromkeys(CACHE_OUTCOMES, 0)
+    per_endpoint = {}
+    for endpoint in endpoints:
+        counts = {
+            outcome: values.get(f'analytics_cache_metrics:{endpoint}:{outcome}', 0)
+            for outcome in CACHE_OUTCOMES
+        }
+        for outcome, count in counts.items():
+            totals[outcome] += count
+        per_endpoint[endpoint] = counts
+
+    served = sum(totals.values())
+    cached = served - totals['miss']
+    return {
+        'totals': totals,
+        'hit_ratio': round(cached / served, 4) if served else 0.0,
+        'endpoints': per_endpoint,
+    }
@@ -0,0 +1,201 @@
+"""
+In-memory columnar snapshot of deals for admin analytics
+Deals joined with vehicle, buyer and commission attributes are loaded with a
+single projection query into NumPy arrays. Categorical columns are
+dictionary-encoded, so filters and group-bys run as vectorized operations
+instead of fresh ORM aggregates per slice.
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from deals.models import Deal
+
+# Seconds before a snapshot is rebuilt on next access
+ANALYTICS_SNAPSHOT_TTL = getattr(settings, 'ANALYTICS_SNAPSHOT_TTL', 60)
+
+
+def _encode(values) -> Tuple[np.ndarray, list]:
+    """Dictionary-encode a sequence into int32 codes and a label list"""
+    index = {}
+    codes = np.fromiter(
+        (index.setdefault(value, len(index)) for value in values),
+        dtype=np.int32,
+        count=len(values),
+    )
+    return codes, list(index)
+
+
+class DealSnapshot:
+    """
+    Columnar, read-only view of every deal.
+
+    Categorical columns: status, dealer (id), broker (id), country (buyer
+    country), make (vehicle make), month ('YYYY-MM' in local time).
+    Numeric columns: price (agreed CAD price), commission (sum of commission
+    amounts in CAD), created_at (epoch seconds).
+    """
+
+    def __init__(self, rows: Sequence[tuple], dealers: Dict[int, dict]):
+        self.built_at = time.time()
+        self.size = len(rows)
+        self.dealers = dealers
+        self.codes = {}
+        self.labels = {}
+        self.label_index = {}
+        self.numeric = {}
+
+        columns = list(zip(*rows)) if rows else [()] * 8
+        (status, dealer, broker, country, make, created_at, price, commission) = columns
+
+        months = [timezone.localtime(value).strftime('%Y-%m') for value in created_at]
+        categorical = dict(status=status, dealer=dealer, broker=broker,
+                           country=country, make=make, month=months)
+        for name, values in categorical.items():
+            self.codes[name], self.labels[name] = _encode(values)
+            self.label_index[name] = {label: code for code, label in enumerate(self.labels[name])}
+
+        self.numeric['price'] = np.array([float(value or 0) for value in price], dtype=np.float64)
+        self.numeric['commission'] = np.array([float(value or 0) for value in commission], dtype=np.float64)
+        self.numeric['created_at'] = np.array([value.timestamp() for value in created_at], dtype=np.float64)
+
+    @classmethod
+    def build(cls) -> 'DealSnapshot':
+        """Load the snapshot from projection queries (no model instances)"""
+        rows = list(
+            Deal.objects
+            .order_by()
+            .annotate(commission_total=Sum('commissions__amount_cad'))
+            .values_list(
+                'status', 'dealer_id', 'broker_id', 'buyer__country',
+                'vehicle__make', 'created_at', 'agreed_price_cad', 'commission_total',
+            )
+        )
+        dealers = {
+            row['dealer_id']: {
+                'username': row['dealer__username'],
+                'first_name': row['dealer__first_name'],
+                'last_name': row['dealer__last_name'],
+            }
+            for row in Deal.objects.order_by().values(
+                'dealer_id', 'dealer__username', 'dealer__first_name', 'dealer__last_name'
+            ).distinct()
+        }
+        return cls(rows, dealers)
+
+    def mask(self, since=None, **filters) -> np.ndarray:
+        """
+        Boolean row mask.
+
+        Args:
+            since: Only rows created at or after this datetime
+            **filters: ``column=value`` or ``column__in=[values]`` on
+                categorical columns
+        """
+        result = np.ones(self.size, dtype=bool)
+        if since is not None:
+            result &= self.numeric['created_at'] >= since.timestamp()
+        for key, value in filters.items():
+            column, _, lookup = key.partition('__')
+            values = value if lookup == 'in' else [value]
+            index = self.label_index[column]
+            wanted = [index[item] for item in values if item in index]
+            result &= np.isin(self.codes[column], wanted)
+        return result
+
+    def group_by(self, dims: Sequence[str], measures: Dict[str, tuple],
+                 mask: Optional[np.ndarray] = None) -> List[Dict]:
+        """
+        Vectorized group-by over categorical ``dims``.
+
+        Args:
+            dims: Categorical columns to group on (may be empty)
+            measures: ``name -> (agg, column[, row_mask])`` where agg is one
+                of 'count', 'sum' or 'avg'. ``column`` is ignored for count.
+                The optional ``row_mask`` restricts that measure only.
+            mask: Row mask applied to every measure
+
+        Returns:
+            One dict per non-empty group with dim labels and measures.
+            Without dims a single row is always returned.
+        """
+        if mask is None:
+            mask = np.ones(self.size, dtype=bool)
+
+        if dims:
+            shape = tuple(len(self.labels[dim]) for dim in dims)
+            if self.size:
+                keys = np.ravel_multi_index([self.codes[dim] for dim in dims], shape)
+            else:
+                keys = np.zeros(0, dtype=np.int64)
+            groups, inverse = np.unique(keys[mask], return_inverse=True)
+        else:
+            groups = np.zeros(1, dtype=np.int64)
+            inverse = np.zeros(int(mask.sum()), dtype=np.int64)
+        n_groups = len(groups)
+
+        results = {}
+        for name, spec in measures.items():
+            agg, column = spec[0], spec[1]
+            row_mask = spec[2][mask] if len(spec) > 2 else None
+            weights = None if row_mask is None else row_mask.astype(np.float64)
+            counts = np.bincount(inverse, weights=weights, minlength=n_groups)
+            if agg == 'count':
+                results[name] = counts.astype(np.int64)
+                continue
+            values = self.numeric[column][mask]
+            if row_mask is not None:
+                values = values * row_mask
+            sums = np.bincount(inverse, weights=values, minlength=n_groups)
+            if agg == 'sum':
+                results[name] = sums
+            elif agg == 'avg':
+                results[name] = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+            else:
+                raise ValueError(f'Unsupported aggregate: {agg}')
+
+        unravelled = np.unravel_index(groups, shape) if dims else ()
+        rows = []
+        for index in range(n_groups):
+            row = {
+                dim: self.labels[dim][int(unravelled[position][index])]
+                for position, dim in enumerate(dims)
+            }
+            for name, values in results.items():
+                value = values[index]
+                if np.issubdtype(values.dtype, np.integer):
+                    row[name] = int(value)
+                else:
+                    row[name] = None if np.isnan(value) else round(float(value), 2)
+            rows.append(row)
+        return rows
+
+    def aggregate(self, measures: Dict[str, tuple], mask: Optional[np.ndarray] = None) -> Dict:
+        """Measures over all rows matching ``mask``"""
+        return self.group_by((), measures, mask=mask)[0]
+
+
+_snapshot: Optional[DealSnapshot] = None
+_snapshot_lock = threading.Lock()
+
+
+def get_deal_snapshot(max_age: Optional[int] = None) -> DealSnapshot:
+    """
+    Current process-wide snapshot, rebuilt when older than ``max_age``
+    seconds (defaults to ``ANALYTICS_SNAPSHOT_TTL``). Concurrent callers
+    share one rebuild.
+    """
+    global _snapshot
+    max_age = ANALYTICS_SNAPSHOT_TTL if max_age is None else max_age
+    snapshot = _snapshot
+    if snapshot is not None and time.time() - snapshot.built_at < max_age:
+        return snapshot
+    with _snapshot_lock:
+        if _snapshot is None or time.time() - _snapshot.built_at >= max_age:
+            _snapshot = DealSnapshot.build()
+        return _snapshot
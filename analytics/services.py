@@ -0,0 +1,231 @@
+"""
+Analytics services
+Reusable aggregation helpers shared by the analytics endpoints
+"""
+import hashlib
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import (
+    Aggregate, Avg, Case, Count, DurationField, ExpressionWrapper, F,
+    IntegerField, Value, When,
+)
+from django.utils import timezone
+
+from deals.models import Deal
+from vehicles.models import Vehicle
+
+
+# Models and numeric fields that may be bucketed through the public API
+HISTOGRAM_FIELDS = {
+    'vehicle': (Vehicle, ('price_cad', 'mileage', 'year')),
+    'deal': (Deal, ('agreed_price_cad',)),
+}
+MAX_HISTOGRAM_EDGES = 50
+HISTOGRAM_CACHE_TTL = 300  # 5 minutes
+
+
+class HistogramError(ValueError):
+    """Raised when a histogram request is not valid"""
+
+
+class HistogramService:
+    """
+    Single-pass histogram over a numeric model field.
+
+    Edges ``[e0, e1, ..., en]`` produce ``n + 2`` half-open buckets:
+    ``(-inf, e0)``, ``[e0, e1)``, ..., ``[en, +inf)``. Each row is assigned
+    its bucket with a ``Case/When`` and the buckets are counted in one
+    grouped query.
+    """
+
+    @staticmethod
+    def parse_edges(raw: str) -> List[Decimal]:
+        """Parse a comma separated list of strictly increasing edges"""
+        try:
+            edges = [Decimal(part.strip()) for part in raw.split(',') if part.strip()]
+        except InvalidOperation:
+            raise HistogramError('Edges must be numbers')
+        if not all(edge.is_finite() for edge in edges):
+            raise HistogramError('Edges must be finite numbers')
+        if not edges:
+            raise HistogramError('At least one edge is required')
+        if len(edges) > MAX_HISTOGRAM_EDGES:
+            raise HistogramError(f'At most {MAX_HISTOGRAM_EDGES} edges are allowed')
+        if any(lower >= upper for lower, upper in zip(edges, edges[1:])):
+            raise HistogramError('Edges must be strictly increasing')
+        return edges
+
+    @staticmethod
+    def resolve(model_name: str, field: str):
+        """Return the model class for an allowed (model, field) pair"""
+        if model_name not in HISTOGRAM_FIELDS:
+            raise HistogramError(f'Unsupported model: {model_name}')
+        model, fields = HISTOGRAM_FIELDS[model_name]
+        if field not in fields:
+            raise HistogramError(f'Unsupported field for {model_name}: {field}')
+        return model
+
+    @staticmethod
+    def compute(queryset, field: str, edges: List[Decimal]) -> List[Dict]:
+        """
+        Count rows of ``queryset`` per bucket in a single query.
+
+        Rows where ``field`` is NULL are ignored.
+        """
+        whens = [When(**{f'{field}__lt': edges[0]}, then=Value(0))]
+        for index, upper in enumerate(edges[1:], start=1):
+            whens.append(When(**{f'{field}__lt': upper}, then=Value(index)))
+        bucket = Case(*whens, default=Value(len(edges)), output_field=IntegerField())
+
+        counts = dict(
+            queryset
+            .filter(**{f'{field}__isnull': False})
+            .annotate(bucket=bucket)
+            .values('bucket')
+            .annotate(count=Count('pk'))
+            .order_by()
+            .values_list('bucket', 'count')
+        )
+
+        bounds = [None] + list(edges) + [None]
+        return [
+            {
+                'min': float(lower) if lower is not None else None,
+                'max': float(upper) if upper is not None else None,
+                'count': counts.get(index, 0),
+            }
+            for index, (lower, upper) in enumerate(zip(bounds, bounds[1:]))
+        ]
+
+    @classmethod
+    def get_histogram(cls, model_name: str, field: str, edges: List[Decimal],
+                      days: Optional[int] = None) -> List[Dict]:
+        """
+        Histogram for an allowed model field, cached per edge set.
+
+        Args:
+            model_name: Key of ``HISTOGRAM_FIELDS`` (e.g. 'vehicle')
+            field: Numeric field to bucket (e.g. 'price_cad')
+            edges: Strictly increasing bucket edges
+            days: Only include rows created in the last ``days`` days
+        """
+        model = cls.resolve(model_name, field)
+
+        edge_key = hashlib.md5(','.join(str(edge) for edge in edges).encode()).hexdigest()
+        cache_key = f'analytics_histogram_{model_name}_{field}_{days or "all"}_{edge_key}'
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        queryset = model.objects.all()
+        if days:
+            queryset = queryset.filter(created_at__gte=timezone.now() - timedelta(days=days))
+
+        buckets = cls.compute(queryset, field, edges)
+        cache.set(cache_key, buckets, HISTOGRAM_CACHE_TTL)
+        return buckets
+
+
+class PercentileCont(Aggregate):
+    """PostgreSQL ``percentile_cont`` ordered-set aggregate"""
+    function = 'PERCENTILE_CONT'
+    template = '%(function)s(%(percentile)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+
+    def __init__(self, expression, percentile, **extra):
+        super().__init__(expression, percentile=float(percentile), **extra)
+
+
+# Time between a vehicle being listed and the deal for it being created
+DAYS_TO_SELL = ExpressionWrapper(
+    F('created_at') - F('vehicle__created_at'),
+    output_field=DurationField(),
+)
+
+
+def _duration_days(duration) -> float:
+    """Convert a timedelta (or None) into fractional days"""
+    if duration is None:
+        return 0.0
+    return round(duration.total_seconds() / 86400, 1)
+
+
+class InventoryMetricsService:
+    """
+    Days-to-sell metrics computed in the database.
+
+    Counts and averages are SQL aggregates over ``DAYS_TO_SELL``. Percentiles
+    use ``percentile_cont`` on PostgreSQL; other backends fall back to a NumPy
+    pass over a ``values_list`` projection, so model instances are never
+    loaded either way.
+    """
+    PERCENTILES = (50, 90)
+
+    @classmethod
+    def days_to_sell(cls, deals_qs, group_by: Sequence[str] = ()) -> List[Dict]:
+        """
+        Days-to-sell statistics for ``deals_qs``.
+
+        Args:
+            deals_qs: Deal queryset to measure
+            group_by: Vehicle fields to break results down by (e.g. ['make'])
+
+        Returns:
+            One dict per group with the group fields, count, avg_days and
+            p50_days/p90_days. Without ``group_by`` a single overall row.
+        """
+        group_fields = [f'vehicle__{field}' for field in group_by]
+        queryset = (
+            deals_qs
+            .filter(vehicle__created_at__isnull=False)
+            .annotate(days_to_sell=DAYS_TO_SELL)
+            .order_by()
+        )
+
+        aggregates = {'count': Count('pk'), 'avg_duration': Avg('days_to_sell')}
+        db_percentiles = connection.vendor == 'postgresql'
+        if db_percentiles:
+            for pct in cls.PERCENTILES:
+                aggregates[f'p{pct}_duration'] = PercentileCont(
+                    'days_to_sell', pct / 100, output_field=DurationField()
+                )
+
+        if group_fields:
+            rows = list(queryset.values(*group_fields).annotate(**aggregates))
+        else:
+            rows = [queryset.aggregate(**aggregates)]
+
+        if not db_percentiles:
+            cls._add_percentiles(queryset, group_fields, rows)
+
+        results = []
+        for row in rows:
+            result = {field: row[f'vehicle__{field}'] for field in group_by}
+            result['count'] = row['count']
+            result['avg_days'] = _duration_days(row['avg_duration'])
+            for pct in cls.PERCENTILES:
+                result[f'p{pct}_days'] = _duration_days(row.get(f'p{pct}_duration'))
+            results.append(result)
+        results.sort(key=lambda result: result['count'], reverse=True)
+        return results
+
+    @classmethod
+    def _add_percentiles(cls, queryset, group_fields: List[str], rows: List[Dict]) -> None:
+        """Fill percentile columns from a NumPy pass over a projection"""
+        samples = defaultdict(list)
+        for values in queryset.values_list(*group_fields, 'days_to_sell'):
+            if values[-1] is not None:
+                samples[values[:-1]].append(values[-1].total_seconds())
+
+        for row in rows:
+            seconds = samples.get(tuple(row[field] for field in group_fields))
+            for pct in cls.PERCENTILES:
+                row[f'p{pct}_duration'] = (
+                    timedelta(seconds=float(np.percentile(seconds, pct)))
+                    if seconds else None
+                )
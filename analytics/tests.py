@@ -0,0 +1,363 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from unittest import skipIf
+
+from dateutil.relativedelta import relativedelta
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Avg, Count, Q, Sum
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from commissions.models import Commission
+from deals.models import Deal
+from vehicles.models import Vehicle
+
+from .cache import build_cache_key, cached_analytics, get_cache_metrics
+from .olap import DealSnapshot
+from .services import HistogramError, HistogramService, InventoryMetricsService
+
+User = get_user_model()
+
+
+class AnalyticsDataMixin:
+    """Users, vehicles and deals with controlled timestamps"""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='pass12345', role='admin'
+        )
+        self.dealer = User.objects.create_user(
+            username='dealer', email='dealer@example.com', password='pass12345', role='dealer'
+        )
+        self.buyer = User.objects.create_user(
+            username='buyer', email='buyer@example.com', password='pass12345', role='buyer'
+        )
+        self.vehicles = 0
+
+    def add_vehicle(self, make='Toyota', price='25000.00', listed_at=None):
+        self.vehicles += 1
+        vehicle = Vehicle.objects.create(
+            dealer=self.dealer, make=make, model='Camry', year=2020, vin=f'1HGBH41JXMN1{self.vehicles:05d}',
+            condition='used_good', mileage=50000, color='Blue', price_cad=Decimal(price),
+            location='Toronto, ON'
+        )
+        if listed_at is not None:
+            # Also on the instance: deal signals save() the vehicle
+            vehicle.created_at = listed_at
+            Vehicle.objects.filter(pk=vehicle.pk).update(created_at=listed_at)
+        return vehicle
+
+    def add_deal(self, created_at, price='20000.00', status='completed', vehicle=None):
+        deal = Deal.objects.create(
+            vehicle=vehicle or self.add_vehicle(), buyer=self.buyer, dealer=self.dealer,
+            agreed_price_cad=Decimal(price), status=status
+        )
+        Deal.objects.filter(pk=deal.pk).update(created_at=created_at)
+        return deal
+
+    @staticmethod
+    def local_noon(day):
+        return timezone.make_aware(datetime.combine(day, time(12)))
+
+
+class RevenueChartTest(AnalyticsDataMixin, APITestCase):
+    """Test the revenue chart's calendar buckets"""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.admin)
+        self.today = timezone.localdate()
+        self.this_month = self.today.replace(day=1)
+
+    def chart(self, **params):
+        response = self.client.get('/api/analytics/revenue/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_empty_months_are_filled(self):
+        """Test every month in the window is present, including ones without deals"""
+        two_months_ago = self.this_month - relativedelta(months=2)
+        self.add_deal(self.local_noon(two_months_ago), price='10000.00')
+        self.add_deal(self.local_noon(two_months_ago + timedelta(days=3)), status='pending_docs')
+        self.add_deal(self.local_noon(self.this_month), price='5000.00')
+        # Before the window
+        self.add_deal(self.local_noon(self.this_month - relativedelta(months=3)))
+
+        data = self.chart(months=3)
+
+        self.assertEqual(
+            [row['period'] for row in data],
+            [(self.this_month - relativedelta(months=n)).isoformat() for n in (2, 1, 0)]
+        )
+        self.assertEqual([row['deals'] for row in data], [2, 0, 1])
+        self.assertEqual([row['revenue'] for row in data], [10000.0, 0.0, 5000.0])
+        self.assertEqual(data[2]['month'], self.this_month.strftime('%b %Y'))
+
+    def test_weeks_align_to_mondays(self):
+        """Test week buckets start on Mondays and deals land in their week"""
+        self.add_deal(self.local_noon(self.today), price='7000.00')
+
+        data = self.chart(months=2, granularity='week')
+
+        periods = [datetime.strptime(row['period'], '%Y-%m-%d').date() for row in data]
+        self.assertTrue(all(period.weekday() == 0 for period in periods))
+        self.assertTrue(all(later - earlier == timedelta(weeks=1) for earlier, later in zip(periods, periods[1:])))
+        self.assertLessEqual(periods[0], self.this_month - relativedelta(months=1))
+        self.assertEqual(periods[-1], self.today - timedelta(days=self.today.weekday()))
+        self.assertEqual((data[-1]['deals'], data[-1]['revenue']), (1, 7000.0))
+        self.assertEqual(sum(row['deals'] for row in data), 1)
+
+    def test_days_and_invalid_params(self):
+        """Test daily buckets end today and bad params fall back to defaults"""
+        self.add_deal(self.local_noon(self.today))
+
+        data = self.chart(months=1, granularity='day')
+
+        self.assertEqual(data[0]['period'], self.this_month.isoformat())
+        self.assertEqual(data[-1]['period'], self.today.isoformat())
+        self.assertEqual(len(data), self.today.day)
+        self.assertEqual(data[-1]['month'], self.today.strftime('%b %d %Y'))
+        self.assertEqual(len(self.chart(months='all', granularity='hour')), 6)
+
+
+class HistogramTest(AnalyticsDataMixin, APITestCase):
+    """Test single-query histograms and edge validation"""
+
+    def setUp(self):
+        super().setUp()
+        for price in ('5000.00', '9999.99', '10000.00', '15000.00', '20000.00', '45000.00'):
+            self.add_vehicle(price=price)
+        self.admin.is_staff = True
+        self.admin.save()
+        self.client.force_authenticate(self.admin)
+
+    def test_buckets_are_half_open(self):
+        """Test values on an edge fall in the bucket starting at that edge"""
+        edges = HistogramService.parse_edges('10000, 20000')
+
+        with self.assertNumQueries(1):
+            buckets = HistogramService.compute(Vehicle.objects.all(), 'price_cad', edges)
+
+        self.assertEqual(buckets, [
+            {'min': None, 'max': 10000.0, 'count': 2},
+            {'min': 10000.0, 'max': 20000.0, 'count': 2},
+            {'min': 20000.0, 'max': None, 'count': 2},
+        ])
+
+    def test_endpoint(self):
+        """Test the endpoint buckets the requested field"""
+        response = self.client.get('/api/analytics/histogram/', {'field': 'price_cad', 'edges': '15000'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([bucket['count'] for bucket in response.data['buckets']], [3, 3])
+
+    def test_invalid_edges(self):
+        """Test malformed, non-finite, unordered or too many edges are rejected"""
+        for raw in ('', 'cheap,expensive', '20000,10000', '10000,10000', ','.join(map(str, range(51))),
+                    'nan', '10,NaN', 'sNaN', 'Infinity', '-inf,10'):
+            with self.assertRaises(HistogramError):
+                HistogramService.parse_edges(raw)
+
+        for params in ({'edges': '10,5'}, {'edges': 'x'}, {'edges': '10', 'field': 'vin'},
+                       {'edges': '10', 'model': 'user'}, {'edges': '10', 'days': 'week'},
+                       {'edges': 'nan'}, {'edges': '10,NaN'}, {'edges': 'inf'}):
+            response = self.client.get('/api/analytics/histogram/', params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+class DaysToSellTest(AnalyticsDataMixin, APITestCase):
+    """Test days-to-sell averages and percentiles"""
+
+    def setUp(self):
+        super().setUp()
+        self.listed_at = timezone.now() - timedelta(days=30)
+        for make, gaps in (('Toyota', (2, 4, 6, 8, 10)), ('Honda', (1, 3))):
+            for days in gaps:
+                vehicle = self.add_vehicle(make=make, listed_at=self.listed_at)
+                self.add_deal(self.listed_at + timedelta(days=days), vehicle=vehicle)
+
+    def test_overall(self):
+        """Test count, average and interpolated percentiles over every deal"""
+        [row] = InventoryMetricsService.days_to_sell(Deal.objects.all())
+
+        self.assertEqual(row, {'count': 7, 'avg_days': 4.9, 'p50_days': 4.0, 'p90_days': 8.8})
+
+    def test_group_by(self):
+        """Test each make gets its own statistics, largest group first"""
+        rows = InventoryMetricsService.days_to_sell(Deal.objects.all(), group_by=['make'])
+
+        self.assertEqual(rows, [
+            {'make': 'Toyota', 'count': 5, 'avg_days': 6.0, 'p50_days': 6.0, 'p90_days': 9.2},
+            {'make': 'Honda', 'count': 2, 'avg_days': 2.0, 'p50_days': 2.0, 'p90_days': 2.8},
+        ])
+
+    @skipIf(connection.vendor == 'postgresql', 'percentile_cont is used on PostgreSQL')
+    def test_numpy_fallback_reads_a_projection(self):
+        """Test other backends take percentiles from one values_list query"""
+        with self.assertNumQueries(2):
+            rows = InventoryMetricsService.days_to_sell(Deal.objects.all(), group_by=['make'])
+
+        self.assertEqual(len(rows), 2)
+
+    def test_no_deals(self):
+        """Test an empty queryset reports zeros rather than failing"""
+        [row] = InventoryMetricsService.days_to_sell(Deal.objects.none())
+
+        self.assertEqual(row, {'count': 0, 'avg_days': 0.0, 'p50_days': 0.0, 'p90_days': 0.0})
+
+
+class AnalyticsCacheTest(TestCase):
+    """Test stale-while-revalidate caching of analytics responses"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='admin', email='admin@example.com', password='pass12345', role='admin'
+        )
+        self.calls = 0
+        self.during_recompute = None
+
+        @cached_analytics('test_endpoint')
+        def view(request):
+            self.calls += 1
+            if self.during_recompute:
+                self.during_recompute()
+            return Response({'version': self.calls})
+
+        self.view = view
+
+    def get(self):
+        request = APIRequestFactory().get('/api/analytics/test/', {'months': 6})
+        request.user = self.user
+        return request, self.view(request).data
+
+    def expire(self):
+        request, _ = self.get()
+        key = build_cache_key('test_endpoint', request)
+        cache.set(key, dict(cache.get(key), fresh_until=0))
+        return key
+
+    def test_fresh_entry_is_served(self):
+        """Test a second request inside the soft TTL does not recompute"""
+        self.assertEqual(self.get()[1], {'version': 1})
+        self.assertEqual(self.get()[1], {'version': 1})
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_entry_served_while_another_request_refreshes(self):
+        """Test only the request holding the lock recomputes; the rest get the stale copy"""
+        self.expire()
+        stale = []
+        self.during_recompute = lambda: stale.append(self.get()[1])
+
+        self.assertEqual(self.get()[1], {'version': 2})
+
+        self.assertEqual(stale, [{'version': 1}])
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.get()[1], {'version': 2})
+        counts = get_cache_metrics()['endpoints']['test_endpoint']
+        self.assertEqual((counts['miss'], counts['stale'], counts['hit']), (2, 1, 1))
+
+    def test_lock_released_after_refresh(self):
+        """Test the lock does not outlive the refresh, even if the view fails"""
+        key = self.expire()
+
+        def fail():
+            raise RuntimeError('database is down')
+
+        self.during_recompute = fail
+        with self.assertRaises(RuntimeError):
+            self.get()
+
+        self.assertIsNone(cache.get(f'{key}:lock'))
+        self.during_recompute = None
+        self.assertEqual(self.get()[1], {'version': 3})
+
+
+class DealSnapshotTest(AnalyticsDataMixin, APITestCase):
+    """Test the columnar snapshot agrees with ORM aggregates"""
+
+    def setUp(self):
+        super().setUp()
+        self.other_dealer = User.objects.create_user(
+            username='dealer2', email='dealer2@example.com', password='pass12345', role='dealer'
+        )
+        now = timezone.now()
+        for days_ago, make, price, status in (
+            (1, 'Toyota', '20000.00', 'completed'), (3, 'Toyota', '22000.00', 'pending_docs'),
+            (10, 'Honda', '15000.00', 'completed'), (40, 'Honda', '18000.00', 'shipped'),
+            (70, 'Ford', '30000.00', 'completed'), (75, 'Ford', '9000.00', 'cancelled'),
+        ):
+            self.add_deal(now - timedelta(days=days_ago), price=price, status=status,
+                          vehicle=self.add_vehicle(make=make))
+        Deal.objects.filter(vehicle__make='Honda').update(dealer=self.other_dealer)
+        for deal in Deal.objects.filter(status='completed'):
+            Commission.objects.create(
+                deal=deal, recipient=self.dealer, commission_type='dealer',
+                amount_cad=deal.agreed_price_cad / 10, percentage=Decimal('10.00')
+            )
+        self.since = now - timedelta(days=30)
+        self.snapshot = DealSnapshot.build()
+
+    def test_group_by_matches_orm(self):
+        """Test counts, sums and averages per (dealer, status)"""
+        rows = self.snapshot.group_by(['dealer', 'status'], {
+            'deals': ('count', None),
+            'revenue': ('sum', 'price'),
+            'avg_price': ('avg', 'price'),
+        })
+
+        expected = (
+            Deal.objects.order_by().values('dealer_id', 'status')
+            .annotate(deals=Count('id'), revenue=Sum('agreed_price_cad'), avg_price=Avg('agreed_price_cad'))
+        )
+        self.assertEqual(
+            sorted((row['dealer'], row['status'], row['deals'], row['revenue'], row['avg_price']) for row in rows),
+            sorted(
+                (row['dealer_id'], row['status'], row['deals'], float(row['revenue']), float(row['avg_price']))
+                for row in expected
+            ),
+        )
+
+    def test_masks_match_orm(self):
+        """Test since, equality and __in masks and per-measure masks"""
+        in_period = self.snapshot.mask(since=self.since)
+        totals = self.snapshot.aggregate({
+            'deals': ('count', None),
+            'completed': ('count', None, self.snapshot.mask(status='completed')),
+            'completed_revenue': ('sum', 'price', self.snapshot.mask(status__in=['completed', 'shipped'])),
+            'commission': ('sum', 'commission'),
+        }, mask=in_period)
+
+        recent = Deal.objects.filter(created_at__gte=self.since)
+        expected = recent.aggregate(
+            deals=Count('id'),
+            completed=Count('id', filter=Q(status='completed')),
+            completed_revenue=Sum('agreed_price_cad', filter=Q(status__in=['completed', 'shipped'])),
+        )
+        commission = Commission.objects.filter(deal__in=recent).aggregate(total=Sum('amount_cad'))['total']
+        self.assertEqual(totals, {
+            'deals': expected['deals'],
+            'completed': expected['completed'],
+            'completed_revenue': float(expected['completed_revenue']),
+            'commission': float(commission),
+        })
+
+    def test_group_by_make_within_mask(self):
+        """Test groups with no rows in the mask are omitted"""
+        rows = self.snapshot.group_by(['make'], {'revenue': ('sum', 'price')},
+                                      mask=self.snapshot.mask(since=self.since, status='completed'))
+
+        expected = (
+            Deal.objects.filter(created_at__gte=self.since, status='completed')
+            .order_by().values('vehicle__make').annotate(revenue=Sum('agreed_price_cad'))
+        )
+        self.assertEqual(
+            sorted((row['make'], row['revenue']) for row in rows),
+            sorted((row['vehicle__make'], float(row['revenue'])) for row in expected),
+        )
+        self.assertEqual(self.snapshot.mask(make='Tesla').sum(), 0)
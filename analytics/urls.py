@@ -3,4 +3,6 @@ from . import views
 
 urlpatterns = [
     path('dashboard-stats/', views.dashboard_stats, name='dashboard-stats'),
+    path('histogram/', views.histogram, name='analytics-histogram'),
+    path('cache-metrics/', views.cache_metrics, name='analytics-cache-metrics'),
 ]
@@ -1,11 +1,14 @@
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
+from rest_framework import status
 from django.db.models import Count, Sum
 from vehicles.models import Vehicle
 from deals.models import Deal, Lead
 from commissions.models import Commission
 from shipments.models import Shipment
+from .services import HistogramService, HistogramError
+from .cache import get_cache_metrics
 
 
 @api_view(['GET'])
@@ -103,3 +106,40 @@ def dashboard_stats(request):
         'conversion_rate': round(conversion_rate, 2) if user.role == 'broker' else None,
         'closed_deals': closed_deals if user.role == 'broker' else None,
     })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def histogram(request):
+    """
+    Bucket a numeric field into a histogram in a single query
+    Query params: model (vehicle/deal), field, edges (comma separated), days (optional)
+    """
+    try:
+        edges = HistogramService.parse_edges(request.GET.get('edges', ''))
+        days = request.GET.get('days')
+        days = int(days) if days else None
+        buckets = HistogramService.get_histogram(
+            request.GET.get('model', 'vehicle'),
+            request.GET.get('field', 'price_cad'),
+            edges,
+            days=days,
+        )
+    except (HistogramError, ValueError) as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'model': request.GET.get('model', 'vehicle'),
+        'field': request.GET.get('field', 'price_cad'),
+        'days': days,
+        'buckets': buckets,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def cache_metrics(request):
+    """
+    Analytics response cache hit/miss counters per endpoint
+    """
+    return Response(get_cache_metrics())
@@ -1,18 +1,27 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
-from django.db.models import Count, Sum, Avg, Q, F
+from django.db.models import Count, Sum, Avg, F
 from django.db.models.functions import TruncDate, TruncWeek, TruncMonth
 from django.utils import timezone
 from datetime import timedelta
+from decimal import Decimal
 from vehicles.models import Vehicle
 from deals.models import Deal
 from shipments.models import Shipment
 from payments.models import Payment
+from analytics.services import HistogramService, InventoryMetricsService
+from analytics.cache import cached_analytics
+from analytics.olap import get_deal_snapshot
+
+
+PRICE_RANGE_EDGES = [Decimal('10000'), Decimal('20000'), Decimal('30000'), Decimal('50000')]
+PRICE_RANGE_LABELS = ['under_10k', '10k_20k', '20k_30k', '30k_50k', 'over_50k']
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsAdminUser])
+@cached_analytics('revenue_trends')
 def revenue_trends(request):
     """
     Get revenue trends over time (daily, weekly, or monthly)
@@ -55,36 +64,35 @@ def revenue_trends(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsAdminUser])
+@cached_analytics('deal_pipeline')
 def deal_pipeline(request):
     """
     Get deal pipeline metrics by status
     """
-    pipeline_data = (
-        Deal.objects
-        .values('status')
-        .annotate(
-            count=Count('id'),
-            total_value=Sum('final_price'),
-            avg_value=Avg('final_price')
-        )
-        .order_by('-count')
-    )
+    snapshot = get_deal_snapshot()
+    pipeline_data = snapshot.group_by(['status'], {
+        'count': ('count', None),
+        'total_value': ('sum', 'price'),
+        'avg_value': ('avg', 'price'),
+    })
+    pipeline_data.sort(key=lambda row: row['count'], reverse=True)
     
     # Total deals and value
-    totals = Deal.objects.aggregate(
-        total_deals=Count('id'),
-        total_value=Sum('final_price'),
-        avg_deal_value=Avg('final_price')
-    )
+    totals = snapshot.aggregate({
+        'total_deals': ('count', None),
+        'total_value': ('sum', 'price'),
+        'avg_deal_value': ('avg', 'price'),
+    })
     
     return Response({
-        'pipeline': list(pipeline_data),
+        'pipeline': pipeline_data,
         'totals': totals
     })
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsAdminUser])
+@cached_analytics('conversion_funnel')
 def conversion_funnel(request):
     """
     Get conversion funnel metrics (vehicles -> deals -> completed)
@@ -97,16 +105,15 @@ def conversion_funnel(request):
         created_at__gte=start_date
     ).count()
     
-    # Count deals created in period
-    deals_created = Deal.objects.filter(
-        created_at__gte=start_date
-    ).count()
-    
-    # Count deals completed in period
-    deals_completed = Deal.objects.filter(
-        created_at__gte=start_date,
-        status='completed'
-    ).count()
+    # Count deals created and completed in period
+    snapshot = get_deal_snapshot()
+    in_period = snapshot.mask(since=start_date)
+    deal_counts = snapshot.aggregate({
+        'created': ('count', None),
+        'completed': ('count', None, snapshot.mask(status='completed')),
+    }, mask=in_period)
+    deals_created = deal_counts['created']
+    deals_completed = deal_counts['completed']
     
     # Count shipments created in period
     shipments_created = Shipment.objects.filter(
@@ -136,6 +143,7 @@ def conversion_funnel(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsAdminUser])
+@cached_analytics('dealer_performance')
 def dealer_performance(request):
     """
     Get dealer performance metrics
@@ -143,29 +151,33 @@ def dealer_performance(request):
     days = int(request.GET.get('days', 30))
     start_date = timezone.now() - timedelta(days=days)
     
-    # Aggregate by dealer (seller in Deal model)
-    dealer_stats = (
-        Deal.objects
-        .filter(created_at__gte=start_date)
-        .values('seller__username', 'seller__first_name', 'seller__last_name')
-        .annotate(
-            total_deals=Count('id'),
-            completed_deals=Count('id', filter=Q(status='completed')),
-            total_revenue=Sum('final_price', filter=Q(status='completed')),
-            avg_deal_value=Avg('final_price', filter=Q(status='completed')),
-            conversion_rate=Count('id', filter=Q(status='completed')) * 100.0 / Count('id')
-        )
-        .order_by('-total_revenue')
-    )
+    # Aggregate by dealer
+    snapshot = get_deal_snapshot()
+    completed = snapshot.mask(status='completed')
+    dealer_stats = snapshot.group_by(['dealer'], {
+        'total_deals': ('count', None),
+        'completed_deals': ('count', None, completed),
+        'total_revenue': ('sum', 'price', completed),
+        'avg_deal_value': ('avg', 'price', completed),
+    }, mask=snapshot.mask(since=start_date))
+    
+    for row in dealer_stats:
+        dealer = snapshot.dealers.get(row.pop('dealer'), {})
+        row['dealer__username'] = dealer.get('username')
+        row['dealer__first_name'] = dealer.get('first_name')
+        row['dealer__last_name'] = dealer.get('last_name')
+        row['conversion_rate'] = round(row['completed_deals'] * 100.0 / row['total_deals'], 2)
+    dealer_stats.sort(key=lambda row: row['total_revenue'], reverse=True)
     
     return Response({
         'days': days,
-        'dealers': list(dealer_stats)
+        'dealers': dealer_stats
     })
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsAdminUser])
+@cached_analytics('buyer_behavior')
 def buyer_behavior(request):
     """
     Get buyer behavior insights (popular makes, models, price ranges)
@@ -191,13 +203,13 @@ def buyer_behavior(request):
         .order_by('-count')[:10]
     )
     
-    # Price range distribution
+    # Price range distribution (single bucketed query)
+    price_buckets = HistogramService.get_histogram(
+        'vehicle', 'price_cad', PRICE_RANGE_EDGES, days=days
+    )
     price_ranges = {
-        'under_10k': Vehicle.objects.filter(created_at__gte=start_date, price__lt=10000).count(),
-        '10k_20k': Vehicle.objects.filter(created_at__gte=start_date, price__gte=10000, price__lt=20000).count(),
-        '20k_30k': Vehicle.objects.filter(created_at__gte=start_date, price__gte=20000, price__lt=30000).count(),
-        '30k_50k': Vehicle.objects.filter(created_at__gte=start_date, price__gte=30000, price__lt=50000).count(),
-        'over_50k': Vehicle.objects.filter(created_at__gte=start_date, price__gte=50000).count(),
+        label: bucket['count']
+        for label, bucket in zip(PRICE_RANGE_LABELS, price_buckets)
     }
     
     # Condition preference
@@ -220,6 +232,7 @@ def buyer_behavior(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsAdminUser])
+@cached_analytics('inventory_insights')
 def inventory_insights(request):
     """
     Get inventory insights (days to sell, turnover rate, pricing trends)
@@ -227,19 +240,14 @@ def inventory_insights(request):
     days = int(request.GET.get('days', 30))
     start_date = timezone.now() - timedelta(days=days)
     
-    # Average days to sell (vehicles that got deals in the period)
+    # Days to sell (vehicles that got deals in the period), computed in SQL
     completed_deals = Deal.objects.filter(
         created_at__gte=start_date,
         status='completed'
-    ).select_related('vehicle')
-    
-    days_to_sell = []
-    for deal in completed_deals:
-        if deal.vehicle and deal.vehicle.created_at:
-            days_diff = (deal.created_at - deal.vehicle.created_at).days
-            days_to_sell.append(days_diff)
-    
-    avg_days_to_sell = sum(days_to_sell) / len(days_to_sell) if days_to_sell else 0
+    )
+    days_to_sell = InventoryMetricsService.days_to_sell(completed_deals)[0]
+    days_to_sell_by_make = InventoryMetricsService.days_to_sell(completed_deals, group_by=['make'])
+    days_to_sell_by_condition = InventoryMetricsService.days_to_sell(completed_deals, group_by=['condition'])
     
     # Current inventory stats
     total_inventory = Vehicle.objects.filter(status='available').count()
@@ -259,22 +267,23 @@ def inventory_insights(request):
         .annotate(period=TruncDate('created_at'))
         .values('period')
         .annotate(
-            avg_price=Avg('price'),
+            avg_price=Avg('price_cad'),
             vehicle_count=Count('id')
         )
         .order_by('period')
     )
     
     # Turnover rate (deals closed / total inventory)
-    deals_closed = Deal.objects.filter(
-        created_at__gte=start_date,
-        status='completed'
-    ).count()
+    deals_closed = days_to_sell['count']
     turnover_rate = (deals_closed / total_inventory * 100) if total_inventory > 0 else 0
     
     return Response({
         'days': days,
-        'avg_days_to_sell': round(avg_days_to_sell, 1),
+        'avg_days_to_sell': days_to_sell['avg_days'],
+        'p50_days_to_sell': days_to_sell['p50_days'],
+        'p90_days_to_sell': days_to_sell['p90_days'],
+        'days_to_sell_by_make': days_to_sell_by_make,
+        'days_to_sell_by_condition': days_to_sell_by_condition,
         'total_inventory': total_inventory,
         'inventory_by_status': list(inventory_by_status),
         'price_trends': list(price_trends),
@@ -285,6 +294,7 @@ def inventory_insights(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsAdminUser])
+@cached_analytics('dashboard_summary')
 def dashboard_summary(request):
     """
     Get a comprehensive dashboard summary with key metrics
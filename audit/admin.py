@@ -1,7 +1,7 @@
 from django.contrib import admin
 from .models import (
     AuditLog, LoginHistory, DataChangeLog,
-    SecurityEvent, APIAccessLog
+    SecurityEvent, APIAccessLog, APIAccessAggregate, AuditStatsRollup
 )
 
 
@@ -88,3 +88,29 @@ class APIAccessLogAdmin(admin.ModelAdmin):
     ]
     date_hierarchy = 'timestamp'
     ordering = ['-timestamp']
+
+
+@admin.register(APIAccessAggregate)
+class APIAccessAggregateAdmin(admin.ModelAdmin):
+    list_display = ['minute', 'method', 'path', 'status_code', 'request_count', 'max_response_time_ms']
+    list_filter = ['method', 'status_code', 'minute']
+    search_fields = ['path']
+    readonly_fields = [
+        'minute', 'path', 'method', 'status_code', 'request_count',
+        'total_response_time_ms', 'max_response_time_ms'
+    ]
+    date_hierarchy = 'minute'
+    ordering = ['-minute']
+
+
+@admin.register(AuditStatsRollup)
+class AuditStatsRollupAdmin(admin.ModelAdmin):
+    list_display = ['hour', 'user', 'actions', 'logins', 'failed_logins', 'security_events', 'api_calls']
+    list_filter = ['hour']
+    search_fields = ['user__email']
+    readonly_fields = [
+        'hour', 'user', 'actions', 'logins', 'failed_logins', 'data_changes',
+        'security_events', 'resolved_security_events', 'api_calls', 'total_response_time_ms'
+    ]
+    date_hierarchy = 'hour'
+    ordering = ['-hour']
@@ -5,3 +5,7 @@ class AuditConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'audit'
     verbose_name = 'Audit Trail'
+
+    def ready(self):
+        import audit.signals  # noqa
+        import audit.checks  # noqa
@@ -0,0 +1,35 @@
+"""
+System checks for the audit app
+"""
+
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Cache backends whose entries live inside one process
+PER_PROCESS_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Sliding-window counters (audit/counters.py), and the brute-force
+    detection and payment throttles built on them, only count across
+    workers if the default cache is shared
+    """
+    if settings.DEBUG or getattr(settings, 'TESTING', False):
+        return []
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if backend not in PER_PROCESS_CACHE_BACKENDS:
+        return []
+    return [Warning(
+        f"The default cache ({backend}) is not shared between worker processes.",
+        hint=(
+            "Failed-login counters and payment throttles are counted per process, so "
+            "limits multiply with the number of workers. Configure a shared cache such "
+            "as Redis (see settings_production.py)."
+        ),
+        id='audit.W001',
+    )]
@@ -0,0 +1,75 @@
+"""
+Sliding-window counters backed by the Django cache
+Counts events per key (IP, user id, card fingerprint, ...) over a rolling
+window. Each window is split into fixed buckets stored as separate cache
+keys that are incremented atomically and expire on their own, so memory
+stays bounded without any cleanup.
+
+Counts are shared across worker processes and nodes only if the cache is
+(Redis in production). The default LocMemCache counts per process; system
+check audit.W001 warns about it outside DEBUG.
+"""
+
+import time
+
+from django.core.cache import caches
+
+
+class SlidingWindowCounter:
+    """
+    Rolling event counter
+
+    Args:
+        name: Namespace for the counter's cache keys
+        window: Window length in seconds
+        buckets: Number of buckets the window is split into; counts are
+            accurate to ``window / buckets`` seconds
+        cache_alias: Django cache to store buckets in
+    """
+
+    def __init__(self, name, window=900, buckets=15, cache_alias='default'):
+        self.name = name
+        self.window = window
+        self.buckets = buckets
+        self.bucket_seconds = max(1, window // buckets)
+        self.cache_alias = cache_alias
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _bucket_keys(self, key, now=None):
+        current = int((now or time.time()) // self.bucket_seconds)
+        return [f'swc:{self.name}:{key}:{index}' for index in range(current - self.buckets + 1, current + 1)]
+
+    def hit(self, key, amount=1, now=None):
+        """Record ``amount`` events for ``key`` and return the window total"""
+        bucket_keys = self._bucket_keys(key, now)
+        current_key = bucket_keys[-1]
+        # Bucket must outlive the window it can still be counted in
+        timeout = self.window + self.bucket_seconds
+        self.cache.add(current_key, 0, timeout=timeout)
+        try:
+            self.cache.incr(current_key, amount)
+        except ValueError:
+            # Evicted between add() and incr()
+            self.cache.set(current_key, amount, timeout=timeout)
+        return sum(self.cache.get_many(bucket_keys).values())
+
+    def count(self, key, now=None):
+        """Events recorded for ``key`` within the window"""
+        return sum(self.cache.get_many(self._bucket_keys(key, now)).values())
+
+    def exceeded(self, key, limit, now=None):
+        """True if ``key`` has reached ``limit`` events within the window"""
+        return self.count(key, now) >= limit
+
+    def reset(self, key, now=None):
+        """Forget all events for ``key``"""
+        self.cache.delete_many(self._bucket_keys(key, now))
+
+
+# Shared counters for authentication and payment endpoints
+failed_logins = SlidingWindowCounter('failed_logins', window=900, buckets=15)
+failed_two_factor = SlidingWindowCounter('failed_2fa', window=900, buckets=15)
+payment_attempts = SlidingWindowCounter('payment_attempts', window=3600, buckets=12)
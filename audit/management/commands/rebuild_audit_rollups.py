@@ -0,0 +1,27 @@
+"""
+Management command to rebuild hourly audit rollups from the audit tables
+Run once after deploying rollups, or to repair counters after a bulk import
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from audit.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute AuditStatsRollup rows from the audit tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=90,
+            help='Rebuild rollups for this many days back',
+        )
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+        rows = rebuild_rollups(since)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} rollup rows since {since:%Y-%m-%d %H:00}'))
@@ -0,0 +1,215 @@
+"""
+Latency Metrics - Per-endpoint latency histograms with Prometheus exposition
+Each worker records request latencies into HDR-style log-linear histograms
+keyed by (route template, method, status class) and periodically publishes a
+snapshot to the shared cache. The /metrics endpoint merges every worker's
+snapshot, so tail latency is visible without querying the audit tables.
+"""
+
+import os
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Linear sub-buckets per power of two; values are accurate to ~1/16 (6%)
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+# Cumulative bucket bounds exposed to Prometheus, in milliseconds
+PROMETHEUS_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+QUANTILES = (0.5, 0.95, 0.99)
+
+WORKERS_KEY = 'latency_metrics:workers'
+
+
+def bucket_index(value):
+    """Histogram bucket for a latency in milliseconds"""
+    value = max(0, int(value))
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift + 1) * SUB_BUCKETS + (value >> shift) - SUB_BUCKETS
+
+
+def bucket_upper_bound(index):
+    """Largest latency (ms) that falls into bucket ``index``"""
+    if index < SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    lower = (index % SUB_BUCKETS + SUB_BUCKETS) << shift
+    return lower + (1 << shift) - 1
+
+
+def status_class(status_code):
+    return f'{status_code // 100}xx'
+
+
+class LatencyHistogram:
+    """Log-linear latency histogram (counts per bucket, plus count and sum)"""
+
+    def __init__(self, buckets=None, count=0, total=0):
+        self.buckets = dict(buckets or {})
+        self.count = count
+        self.total = total
+
+    def record(self, value_ms):
+        index = bucket_index(value_ms)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value_ms
+
+    def merge(self, other):
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+
+    def quantile(self, q):
+        """Upper bound (ms) of the bucket holding the ``q`` quantile"""
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return bucket_upper_bound(index)
+        return bucket_upper_bound(max(self.buckets))
+
+    def cumulative(self, bounds_ms):
+        """Observations <= each bound, counting a bucket once it fits entirely"""
+        counts = []
+        for bound in bounds_ms:
+            counts.append(sum(
+                count for index, count in self.buckets.items()
+                if bucket_upper_bound(index) <= bound
+            ))
+        return counts
+
+    def to_dict(self):
+        return {'buckets': self.buckets, 'count': self.count, 'total': self.total}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['buckets'], data['count'], data['total'])
+
+
+class LatencyRegistry:
+    """
+    Per-process histograms, published to the shared cache every
+    ``flush_interval`` seconds under this worker's id
+    """
+
+    def __init__(self, flush_interval=5.0, worker_ttl=86400, cache_alias='default'):
+        self.flush_interval = flush_interval
+        self.worker_ttl = worker_ttl
+        self.cache_alias = cache_alias
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self.worker_id = f'{socket.gethostname()}:{self._pid}'
+        self.histograms = {}
+        self._last_flush = time.monotonic()
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def record(self, route, method, status_code, response_time_ms):
+        key = (route, method, status_class(status_code))
+        with self._lock:
+            # A forked worker must not republish its parent's counts
+            if self._pid != os.getpid():
+                self._reset()
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = LatencyHistogram()
+            histogram.record(response_time_ms)
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Publish this worker's cumulative histograms"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            snapshot = {key: histogram.to_dict() for key, histogram in self.histograms.items()}
+        self.cache.set(f'latency_metrics:worker:{self.worker_id}', snapshot, timeout=self.worker_ttl)
+        # Read-modify-write can lose a concurrent registration; every flush
+        # re-checks, so a lost id is restored on the worker's next flush
+        workers = self.cache.get(WORKERS_KEY) or set()
+        if self.worker_id not in workers:
+            self.cache.set(WORKERS_KEY, workers | {self.worker_id}, timeout=None)
+
+    def collect(self):
+        """Histograms merged across every worker with a live snapshot"""
+        self.flush()
+        workers = self.cache.get(WORKERS_KEY) or set()
+        keys = {f'latency_metrics:worker:{worker_id}': worker_id for worker_id in workers}
+        snapshots = self.cache.get_many(list(keys))
+
+        expired = workers - {keys[key] for key in snapshots}
+        if expired:
+            self.cache.set(WORKERS_KEY, workers - expired, timeout=None)
+
+        merged = {}
+        for snapshot in snapshots.values():
+            for key, data in snapshot.items():
+                merged.setdefault(key, LatencyHistogram()).merge(LatencyHistogram.from_dict(data))
+        return merged
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(histograms):
+    """Prometheus text exposition (format 0.0.4) of merged histograms"""
+    name = 'api_request_duration_seconds'
+    lines = [
+        f'# HELP {name} API request latency by route template, method and status class',
+        f'# TYPE {name} histogram',
+    ]
+    quantile_lines = [
+        f'# HELP {name}_quantile Estimated API request latency quantiles',
+        f'# TYPE {name}_quantile gauge',
+    ]
+    for (route, method, status), histogram in sorted(histograms.items()):
+        labels = f'route="{_escape(route)}",method="{_escape(method)}",status="{status}"'
+        for bound, count in zip(PROMETHEUS_BUCKETS_MS, histogram.cumulative(PROMETHEUS_BUCKETS_MS)):
+            lines.append(f'{name}_bucket{{{labels},le="{bound / 1000:g}"}} {count}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+        lines.append(f'{name}_sum{{{labels}}} {histogram.total / 1000:g}')
+        lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+        for q in QUANTILES:
+            quantile_lines.append(
+                f'{name}_quantile{{{labels},quantile="{q:g}"}} {histogram.quantile(q) / 1000:g}'
+            )
+    return '\n'.join(lines + quantile_lines) + '\n'
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_latency_registry():
+    """Process-wide LatencyRegistry configured from settings"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = LatencyRegistry(
+                    flush_interval=getattr(settings, 'METRICS_FLUSH_INTERVAL', 5.0),
+                    worker_ttl=getattr(settings, 'METRICS_WORKER_TTL', 86400),
+                    cache_alias=getattr(settings, 'METRICS_CACHE_ALIAS', 'default'),
+                )
+    return _registry
+
+
+def record_latency(route, method, status_code, response_time_ms):
+    get_latency_registry().record(route, method, status_code, response_time_ms)
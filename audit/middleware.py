@@ -5,6 +5,73 @@ Audit Middleware - Automatically log API requests and responses
 import time
 import sys
 from .services import AuditService, get_client_ip
+from .policy import record_sampled_api_access
+from .counters import failed_logins, failed_two_factor
+from .threats import detector, CATEGORY_EVENT_TYPES
+from .metrics import record_latency
+
+# Failures within a counter's window before a security event is logged
+FAILED_LOGIN_THRESHOLD = 5
+FAILED_TWO_FACTOR_THRESHOLD = 5
+TWO_FACTOR_PATHS = (
+    '/api/accounts/2fa/verify-totp/',
+    '/api/accounts/2fa/verify-sms/',
+    '/api/accounts/2fa/authenticate/',
+)
+
+
+UNMATCHED_ROUTE = 'unmatched'
+
+
+def get_route(request):
+    """
+    Route template, so per-endpoint counters are not split per object id
+
+    Requests no URL pattern matched (404 scans, typos) all share one label;
+    using their raw paths would make metric cardinality unbounded.
+    """
+    resolver_match = getattr(request, 'resolver_match', None)
+    route = getattr(resolver_match, 'route', None)
+    return f'/{route}' if route else UNMATCHED_ROUTE
+
+
+class CountingStream:
+    """
+    Wraps a streaming response body, counting bytes as they are sent
+
+    ``on_close(bytes_sent)`` runs once, when the server closes the response
+    (after the last chunk, or early if the client disconnected).
+    """
+
+    def __init__(self, iterator, on_close):
+        self.iterator = iterator
+        self.on_close = on_close
+        self.bytes_sent = 0
+        self.closed = False
+
+    def __iter__(self):
+        # iter() raises TypeError up front for async bodies, which is how
+        # StreamingHttpResponse tells sync and async iterators apart
+        return self._count(iter(self.iterator))
+
+    def __aiter__(self):
+        return self._acount(self.iterator.__aiter__())
+
+    def _count(self, iterator):
+        for chunk in iterator:
+            self.bytes_sent += len(chunk)
+            yield chunk
+
+    async def _acount(self, iterator):
+        async for chunk in iterator:
+            self.bytes_sent += len(chunk)
+            yield chunk
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.on_close(self.bytes_sent)
 
 
 class AuditMiddleware:
@@ -28,34 +95,49 @@ class AuditMiddleware:
         # Only log API requests (not static files)
         if request.path.startswith('/api/'):
             try:
-                # Get user (may be None for unauthenticated requests)
-                user = request.user if request.user.is_authenticated else None
-                
-                # Get request body size
-                request_body_size = int(request.META.get('CONTENT_LENGTH', 0))
-                
-                # Get response body size
-                response_body_size = len(response.content) if hasattr(response, 'content') else 0
-                
-                # Log the API access
-                AuditService.log_api_access(
-                    user=user,
-                    method=request.method,
-                    path=request.path,
-                    status_code=response.status_code,
-                    response_time_ms=response_time_ms,
-                    ip_address=get_client_ip(request),
-                    user_agent=request.META.get('HTTP_USER_AGENT', '')[:500],
-                    query_params=request.META.get('QUERY_STRING', '')[:500],
-                    request_body_size=request_body_size,
-                    response_body_size=response_body_size,
-                )
+                record_latency(get_route(request), request.method, response.status_code, response_time_ms)
             except Exception as e:
-                # Don't let logging errors break the request
-                print(f"Error logging API access: {e}", file=sys.stderr)
+                print(f"Error recording API latency: {e}", file=sys.stderr)
+            
+            if response.streaming:
+                # Count bytes as they are sent and log once the stream closes,
+                # so downloads are never buffered in memory
+                response.streaming_content = CountingStream(
+                    response.streaming_content,
+                    lambda bytes_sent: self.log_access(request, response, response_time_ms, bytes_sent),
+                )
+            else:
+                self.log_access(request, response, response_time_ms, len(response.content))
         
         return response
 
+    def log_access(self, request, response, response_time_ms, response_body_size):
+        try:
+            # Get user (may be None for unauthenticated requests)
+            user = request.user if request.user.is_authenticated else None
+            
+            # Get request body size
+            request_body_size = int(request.META.get('CONTENT_LENGTH') or 0)
+            
+            # Log the API access (sampled/aggregated per AUDIT_ACCESS_* policy,
+            # queued for a batched write when enabled)
+            record_sampled_api_access(
+                route=get_route(request),
+                user=user,
+                method=request.method,
+                path=request.path,
+                status_code=response.status_code,
+                response_time_ms=response_time_ms,
+                ip_address=get_client_ip(request),
+                user_agent=request.META.get('HTTP_USER_AGENT', '')[:500],
+                query_params=request.META.get('QUERY_STRING', '')[:500],
+                request_body_size=request_body_size,
+                response_body_size=response_body_size,
+            )
+        except Exception as e:
+            # Don't let logging errors break the request
+            print(f"Error logging API access: {e}", file=sys.stderr)
+
 
 class SecurityAuditMiddleware:
     """
@@ -64,47 +146,50 @@ class SecurityAuditMiddleware:
     
     def __init__(self, get_response):
         self.get_response = get_response
-        self.failed_login_attempts = {}  # Track failed attempts per IP
 
     def __call__(self, request):
+        # Inspect before the view runs, while the request body is still readable
+        try:
+            threats = detector.inspect_request(request)
+        except Exception as e:
+            print(f"Error in threat detection: {e}", file=sys.stderr)
+            threats = None
+        
         response = self.get_response(request)
         
         # Check for suspicious activity
         try:
             ip_address = get_client_ip(request)
             
-            # Check for SQL injection patterns in query params
-            query_string = request.META.get('QUERY_STRING', '')
-            if any(pattern in query_string.lower() for pattern in ['union select', 'drop table', '--', ';--']):
-                AuditService.log_security_event(
-                    event_type='sql_injection_attempt',
-                    risk_level='high',
-                    description=f'Potential SQL injection attempt detected in query: {query_string[:200]}',
-                    ip_address=ip_address,
-                    user_agent=request.META.get('HTTP_USER_AGENT', ''),
-                    request_path=request.path,
-                    blocked=True,
-                    action_taken='Request blocked and logged',
-                )
-            
-            # Check for XSS patterns
-            if any(pattern in query_string.lower() for pattern in ['<script', 'javascript:', 'onerror=']):
-                AuditService.log_security_event(
-                    event_type='xss_attempt',
-                    risk_level='high',
-                    description=f'Potential XSS attempt detected: {query_string[:200]}',
-                    ip_address=ip_address,
-                    user_agent=request.META.get('HTTP_USER_AGENT', ''),
-                    request_path=request.path,
-                    blocked=True,
-                    action_taken='Request blocked and logged',
-                )
+            # SQL injection / XSS / path traversal signatures in the path,
+            # query string or body (one event per category, listing rule ids)
+            if threats:
+                query_string = request.META.get('QUERY_STRING', '')
+                for category in threats.categories:
+                    rule_ids = threats.rules_for(category)
+                    AuditService.log_security_event(
+                        event_type=CATEGORY_EVENT_TYPES[category],
+                        risk_level='high',
+                        description=(
+                            f'Potential {category} attempt detected ({", ".join(rule_ids)}): '
+                            f'{request.path[:100]}?{query_string[:200]}'
+                        ),
+                        ip_address=ip_address,
+                        user_agent=request.META.get('HTTP_USER_AGENT', ''),
+                        request_path=request.path,
+                        blocked=True,
+                        action_taken='Request blocked and logged',
+                        metadata={
+                            'rules': rule_ids,
+                            'locations': {rule_id: threats.locations[rule_id] for rule_id in rule_ids},
+                        },
+                    )
             
-            # Track failed login attempts
+            # Track failed login attempts (shared across workers)
             if request.path == '/api/accounts/login/' and response.status_code in [401, 403]:
-                self.failed_login_attempts[ip_address] = self.failed_login_attempts.get(ip_address, 0) + 1
+                attempts = failed_logins.hit(ip_address)
                 
-                if self.failed_login_attempts[ip_address] >= 5:
+                if attempts >= FAILED_LOGIN_THRESHOLD:
                     AuditService.log_security_event(
                         event_type='multiple_failed_logins',
                         risk_level='medium',
@@ -114,12 +199,31 @@ class SecurityAuditMiddleware:
                         request_path=request.path,
                         blocked=False,
                         action_taken='Monitoring for account lockout',
-                        metadata={'attempts': self.failed_login_attempts[ip_address]},
+                        metadata={'attempts': attempts, 'window_seconds': failed_logins.window},
                     )
             
             # Reset counter on successful login
             if request.path == '/api/accounts/login/' and response.status_code == 200:
-                self.failed_login_attempts.pop(ip_address, None)
+                failed_logins.reset(ip_address)
+            
+            # Track failed 2FA verifications
+            if request.path in TWO_FACTOR_PATHS and response.status_code in [400, 401, 403]:
+                attempts = failed_two_factor.hit(ip_address)
+                
+                if attempts >= FAILED_TWO_FACTOR_THRESHOLD:
+                    user = request.user if request.user.is_authenticated else None
+                    AuditService.log_security_event(
+                        event_type='2fa_bypass_attempt',
+                        risk_level='high',
+                        description=f'Multiple failed 2FA verifications from IP: {ip_address}',
+                        user=user,
+                        ip_address=ip_address,
+                        user_agent=request.META.get('HTTP_USER_AGENT', ''),
+                        request_path=request.path,
+                        blocked=False,
+                        action_taken='Monitoring for account lockout',
+                        metadata={'attempts': attempts, 'window_seconds': failed_two_factor.window},
+                    )
             
             # Check for rate limit exceeded (429 responses)
             if response.status_code == 429:
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-19 07:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0002_api_access_log_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='APIAccessAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('minute', models.DateTimeField(db_index=True)),
+                ('path', models.CharField(max_length=500)),
+                ('method', models.CharField(max_length=10)),
+                ('status_code', models.IntegerField()),
+                ('request_count', models.PositiveIntegerField(default=0)),
+                ('total_response_time_ms', models.BigIntegerField(default=0)),
+                ('max_response_time_ms', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'API Access Aggregate',
+                'verbose_name_plural': 'API Access Aggregates',
+                'ordering': ['-minute'],
+                'indexes': [models.Index(fields=['path', '-minute'], name='audit_apiac_path_2f1354_idx')],
+                'unique_together': {('minute', 'path', 'method', 'status_code')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 07:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0003_api_access_aggregate'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='securityevent',
+            name='event_type',
+            field=models.CharField(choices=[('suspicious_login', 'Suspicious Login'), ('multiple_failed_logins', 'Multiple Failed Logins'), ('password_reset_request', 'Password Reset Request'), ('password_reset_complete', 'Password Reset Complete'), ('account_locked', 'Account Locked'), ('account_unlocked', 'Account Unlocked'), ('2fa_bypass_attempt', '2FA Bypass Attempt'), ('permission_denied', 'Permission Denied'), ('api_rate_limit_exceeded', 'API Rate Limit Exceeded'), ('sql_injection_attempt', 'SQL Injection Attempt'), ('xss_attempt', 'XSS Attempt'), ('path_traversal_attempt', 'Path Traversal Attempt'), ('csrf_failure', 'CSRF Failure'), ('unusual_activity', 'Unusual Activity')], db_index=True, max_length=50),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-19 07:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('audit', '0004_security_event_path_traversal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditStatsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(db_index=True)),
+                ('actions', models.PositiveIntegerField(default=0)),
+                ('logins', models.PositiveIntegerField(default=0)),
+                ('failed_logins', models.PositiveIntegerField(default=0)),
+                ('data_changes', models.PositiveIntegerField(default=0)),
+                ('security_events', models.PositiveIntegerField(default=0)),
+                ('resolved_security_events', models.PositiveIntegerField(default=0)),
+                ('api_calls', models.PositiveIntegerField(default=0)),
+                ('total_response_time_ms', models.BigIntegerField(default=0)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='audit_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Audit Stats Rollup',
+                'verbose_name_plural': 'Audit Stats Rollups',
+                'ordering': ['-hour'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='auditstatsrollup',
+            constraint=models.UniqueConstraint(fields=('hour', 'user'), name='audit_rollup_hour_user_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='auditstatsrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('hour',), name='audit_rollup_hour_system_uniq'),
+        ),
+    ]
@@ -4,6 +4,7 @@ Comprehensive logging system for tracking all user actions and system events
 """
 
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
@@ -242,6 +243,7 @@ class SecurityEvent(models.Model):
         ('api_rate_limit_exceeded', 'API Rate Limit Exceeded'),
         ('sql_injection_attempt', 'SQL Injection Attempt'),
         ('xss_attempt', 'XSS Attempt'),
+        ('path_traversal_attempt', 'Path Traversal Attempt'),
         ('csrf_failure', 'CSRF Failure'),
         ('unusual_activity', 'Unusual Activity'),
     ]
@@ -330,7 +332,8 @@ class APIAccessLog(models.Model):
     request_body_size = models.IntegerField(default=0)
     response_body_size = models.IntegerField(default=0)
     
-    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Set by the caller so queued (batched) writes keep the request time
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
 
     class Meta:
         ordering = ['-timestamp']
@@ -345,3 +348,82 @@ class APIAccessLog(models.Model):
     def __str__(self):
         user_str = self.user.email if self.user else 'Anonymous'
         return f'{user_str} - {self.method} {self.path} [{self.status_code}]'
+
+
+class APIAccessAggregate(models.Model):
+    """
+    Per-minute counters for API requests that were not logged individually
+
+    Successful reads that fall outside the sampling rate are folded into one
+    row per (minute, route, method, status code).
+    """
+    minute = models.DateTimeField(db_index=True)
+    path = models.CharField(max_length=500)
+    method = models.CharField(max_length=10)
+    status_code = models.IntegerField()
+    
+    request_count = models.PositiveIntegerField(default=0)
+    total_response_time_ms = models.BigIntegerField(default=0)
+    max_response_time_ms = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['-minute']
+        unique_together = [('minute', 'path', 'method', 'status_code')]
+        indexes = [
+            models.Index(fields=['path', '-minute']),
+        ]
+        verbose_name = 'API Access Aggregate'
+        verbose_name_plural = 'API Access Aggregates'
+
+    def __str__(self):
+        return f'{self.method} {self.path} [{self.status_code}] x{self.request_count} at {self.minute}'
+
+    @property
+    def avg_response_time_ms(self):
+        if not self.request_count:
+            return 0
+        return self.total_response_time_ms / self.request_count
+
+
+class AuditStatsRollup(models.Model):
+    """
+    Hourly audit counters, maintained as audit entries are written
+
+    One row per (hour, user) plus a system-wide row per hour with a null
+    user, so dashboard statistics are sums over a bounded number of rows.
+    """
+    hour = models.DateTimeField(db_index=True)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='audit_rollups'
+    )
+    
+    actions = models.PositiveIntegerField(default=0)
+    logins = models.PositiveIntegerField(default=0)
+    failed_logins = models.PositiveIntegerField(default=0)
+    data_changes = models.PositiveIntegerField(default=0)
+    security_events = models.PositiveIntegerField(default=0)
+    resolved_security_events = models.PositiveIntegerField(default=0)
+    api_calls = models.PositiveIntegerField(default=0)
+    total_response_time_ms = models.BigIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-hour']
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'user'], name='audit_rollup_hour_user_uniq'),
+            # NULLs are distinct in unique indexes, so the system row needs its own
+            models.UniqueConstraint(
+                fields=['hour'],
+                condition=models.Q(user__isnull=True),
+                name='audit_rollup_hour_system_uniq',
+            ),
+        ]
+        verbose_name = 'Audit Stats Rollup'
+        verbose_name_plural = 'Audit Stats Rollups'
+
+    def __str__(self):
+        scope = self.user or 'system'
+        return f'{scope} @ {self.hour}: {self.actions} actions, {self.api_calls} API calls'
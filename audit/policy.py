@@ -0,0 +1,194 @@
+"""
+Audit Policy - Decide which API requests are logged individually
+Mutating requests and non-2xx responses are always kept. Successful reads are
+sampled per path pattern; the rest are folded into per-minute counters
+(APIAccessAggregate) so compliance data stays complete at a fraction of the
+write volume.
+"""
+
+import logging
+import random
+import re
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from django.utils import timezone
+
+from .models import APIAccessAggregate
+from .rollups import record_rollup
+from .writer import get_audit_writer, record_api_access
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class AccessLogPolicy:
+    """
+    Sampling policy for API access logs
+
+    ``sample_rates`` is a list of ``(regex, rate)`` pairs checked in order
+    against the request path; the first match wins. ``rate`` is the fraction
+    (0.0-1.0) of successful reads logged as individual rows.
+    """
+
+    def __init__(self, sample_rates=(), default_rate=1.0):
+        self.sample_rates = [(re.compile(pattern), rate) for pattern, rate in sample_rates]
+        self.default_rate = default_rate
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            sample_rates=getattr(settings, 'AUDIT_ACCESS_SAMPLE_RATES', ()),
+            default_rate=getattr(settings, 'AUDIT_ACCESS_DEFAULT_SAMPLE_RATE', 1.0),
+        )
+
+    def sample_rate(self, path):
+        for pattern, rate in self.sample_rates:
+            if pattern.search(path):
+                return rate
+        return self.default_rate
+
+    def should_log(self, method, path, status_code):
+        """True if the request must be stored as an individual APIAccessLog"""
+        if method not in SAFE_METHODS or not 200 <= status_code < 300:
+            return True
+        rate = self.sample_rate(path)
+        return rate >= 1.0 or random.random() < rate
+
+
+class APIAccessAggregator:
+    """
+    In-process per-minute counters, upserted into APIAccessAggregate on flush
+    """
+
+    def __init__(self):
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def add(self, path, method, status_code, response_time_ms, timestamp=None):
+        minute = (timestamp or timezone.now()).replace(second=0, microsecond=0)
+        key = (minute, path[:500], method, status_code)
+        with self._lock:
+            count, total, peak = self._counters.get(key, (0, 0, 0))
+            self._counters[key] = (count + 1, total + response_time_ms, max(peak, response_time_ms))
+
+    def pending_minutes(self):
+        with self._lock:
+            return {key[0] for key in self._counters}
+
+    def flush(self, force=False):
+        """
+        Write counters for completed minutes (all minutes when ``force``)
+        """
+        current_minute = timezone.now().replace(second=0, microsecond=0)
+        with self._lock:
+            ready = {
+                key: value for key, value in self._counters.items()
+                if force or key[0] < current_minute
+            }
+            for key in ready:
+                del self._counters[key]
+
+        for (minute, path, method, status_code), (count, total, peak) in ready.items():
+            try:
+                self._upsert(minute, path, method, status_code, count, total, peak)
+            except Exception as e:
+                logger.error(f"Failed to write API access aggregate for {method} {path}: {e}")
+
+    @staticmethod
+    def _upsert(minute, path, method, status_code, count, total, peak):
+        lookup = dict(minute=minute, path=path, method=method, status_code=status_code)
+        increment = dict(
+            request_count=F('request_count') + count,
+            total_response_time_ms=F('total_response_time_ms') + total,
+            max_response_time_ms=Greatest('max_response_time_ms', peak),
+        )
+        if APIAccessAggregate.objects.filter(**lookup).update(**increment):
+            return
+        try:
+            with transaction.atomic():
+                APIAccessAggregate.objects.create(
+                    request_count=count,
+                    total_response_time_ms=total,
+                    max_response_time_ms=peak,
+                    **lookup,
+                )
+        except IntegrityError:
+            # Another worker created the row first
+            APIAccessAggregate.objects.filter(**lookup).update(**increment)
+
+
+_policy = None
+_aggregator = None
+_lock = threading.Lock()
+
+
+@receiver(setting_changed)
+def _reset_access_policy(setting, **kwargs):
+    global _policy
+    if setting.startswith('AUDIT_ACCESS_'):
+        _policy = None
+
+
+def get_access_policy():
+    global _policy
+    if _policy is None:
+        _policy = AccessLogPolicy.from_settings()
+    return _policy
+
+
+def get_access_aggregator():
+    """
+    Process-wide aggregator
+
+    With AUDIT_ASYNC_WRITES the audit writer thread flushes it; otherwise
+    completed minutes are flushed inline when a new minute starts.
+    """
+    global _aggregator
+    if _aggregator is None:
+        with _lock:
+            if _aggregator is None:
+                _aggregator = APIAccessAggregator()
+                if getattr(settings, 'AUDIT_ASYNC_WRITES', False):
+                    get_audit_writer().add_flush_hook(_aggregator.flush)
+    return _aggregator
+
+
+def record_sampled_api_access(**fields):
+    """
+    Log an API access subject to the sampling policy
+
+    Accepts the same fields as AuditService.log_api_access. Returns True if
+    the request was logged individually, False if it was aggregated.
+    """
+    path = fields['path']
+    route = fields.pop('route', None) or path
+    user = fields.get('user')
+    if get_access_policy().should_log(fields['method'], path, fields['status_code']):
+        record_rollup(
+            user_id=user.pk if user is not None else None,
+            api_calls=1,
+            total_response_time_ms=fields['response_time_ms'],
+        )
+        record_api_access(**fields)
+        return True
+
+    # Aggregates carry no user, so only the system-wide row counts this
+    # call; per-user counts match what rebuild_rollups can recover
+    record_rollup(api_calls=1, total_response_time_ms=fields['response_time_ms'])
+    aggregator = get_access_aggregator()
+    aggregator.add(route, fields['method'], fields['status_code'], fields['response_time_ms'])
+    if getattr(settings, 'AUDIT_ASYNC_WRITES', False):
+        # Nothing may have been queued in this worker yet to start the flusher
+        get_audit_writer().start()
+    else:
+        current_minute = timezone.now().replace(second=0, microsecond=0)
+        if any(minute < current_minute for minute in aggregator.pending_minutes()):
+            aggregator.flush()
+    return False
@@ -0,0 +1,180 @@
+"""
+Audit Retention - Bucketed archiving and purging of audit tables
+Audit rows are grouped into calendar-month buckets on their (indexed)
+timestamp column. Once a whole bucket is past its retention window it is
+exported to a gzipped NDJSON archive and then deleted in bounded primary-key
+chunks with a pause between chunks, so retention never issues one large,
+lock-heavy DELETE.
+"""
+
+import gzip
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.utils import timezone
+
+from .models import (
+    AuditLog, LoginHistory, DataChangeLog, SecurityEvent, APIAccessLog, APIAccessAggregate
+)
+
+logger = logging.getLogger(__name__)
+
+# Model -> column that buckets are cut on
+AUDIT_BUCKET_FIELDS = {
+    AuditLog: 'timestamp',
+    LoginHistory: 'login_timestamp',
+    DataChangeLog: 'timestamp',
+    SecurityEvent: 'timestamp',
+    APIAccessLog: 'timestamp',
+    APIAccessAggregate: 'minute',
+}
+
+DEFAULT_RETENTION_DAYS = 2555  # 7 years
+
+
+def month_start(value):
+    """First instant of the (local) calendar month containing ``value``"""
+    local = timezone.localtime(value)
+    return local.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(bucket):
+    """Start of the bucket following ``bucket``"""
+    return timezone.make_aware(
+        datetime.combine(bucket.date() + relativedelta(months=1), datetime.min.time())
+    )
+
+
+class AuditRetentionEngine:
+    """
+    Archive and purge expired monthly buckets of the audit tables
+
+    Args:
+        retention_days: Model name -> days to keep (falls back to
+            AUDIT_LOG_RETENTION_DAYS, then 7 years)
+        chunk_size: Rows deleted per DELETE statement
+        chunk_sleep: Seconds to pause between chunks
+        archive_dir: Directory for ``<model>/<YYYY-MM>.ndjson.gz`` archives;
+            archiving is skipped when None
+    """
+
+    def __init__(self, retention_days=None, chunk_size=5000, chunk_sleep=0.1, archive_dir=None):
+        self.retention_days = retention_days or {}
+        self.chunk_size = chunk_size
+        self.chunk_sleep = chunk_sleep
+        self.archive_dir = archive_dir
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            retention_days=getattr(settings, 'AUDIT_RETENTION_DAYS', {}),
+            chunk_size=getattr(settings, 'AUDIT_RETENTION_CHUNK_SIZE', 5000),
+            chunk_sleep=getattr(settings, 'AUDIT_RETENTION_CHUNK_SLEEP', 0.1),
+            archive_dir=getattr(settings, 'AUDIT_ARCHIVE_DIR', None),
+        )
+
+    def get_retention_days(self, model):
+        default = getattr(settings, 'AUDIT_LOG_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+        return self.retention_days.get(model.__name__, default)
+
+    def expired_buckets(self, model, now=None):
+        """
+        Month starts of buckets that lie entirely before the retention cutoff
+        """
+        field = AUDIT_BUCKET_FIELDS[model]
+        cutoff = (now or timezone.now()) - timedelta(days=self.get_retention_days(model))
+        last_bucket_end = month_start(cutoff)
+
+        oldest = (
+            model.objects
+            .filter(**{f'{field}__lt': last_bucket_end})
+            .order_by(field)
+            .values_list(field, flat=True)
+            .first()
+        )
+        if oldest is None:
+            return []
+
+        buckets = []
+        bucket = month_start(oldest)
+        while bucket < last_bucket_end:
+            buckets.append(bucket)
+            bucket = next_month(bucket)
+        return buckets
+
+    def bucket_queryset(self, model, bucket):
+        field = AUDIT_BUCKET_FIELDS[model]
+        return model.objects.filter(**{f'{field}__gte': bucket, f'{field}__lt': next_month(bucket)})
+
+    def archive_bucket(self, model, bucket):
+        """
+        Export a bucket to ``<archive_dir>/<model>/<YYYY-MM>.ndjson.gz``
+
+        Written to a temporary file and renamed, so a partial archive never
+        looks complete. Returns the archive path and row count.
+        """
+        directory = os.path.join(self.archive_dir, model._meta.model_name)
+        os.makedirs(directory, exist_ok=True)
+        # A previous run may have archived this bucket and then failed while
+        # purging; never overwrite, write the leftover rows to a new part
+        path = os.path.join(directory, f'{bucket:%Y-%m}.ndjson.gz')
+        part = 1
+        while os.path.exists(path):
+            path = os.path.join(directory, f'{bucket:%Y-%m}.{part}.ndjson.gz')
+            part += 1
+        partial_path = f'{path}.partial'
+
+        rows = 0
+        with gzip.open(partial_path, 'wt', encoding='utf-8') as archive:
+            queryset = self.bucket_queryset(model, bucket).order_by('pk').values()
+            for row in queryset.iterator(chunk_size=self.chunk_size):
+                archive.write(json.dumps(row, default=str) + '\n')
+                rows += 1
+        os.replace(partial_path, path)
+        return path, rows
+
+    def purge_bucket(self, model, bucket):
+        """Delete a bucket in primary-key chunks. Returns rows deleted."""
+        queryset = self.bucket_queryset(model, bucket)
+        deleted = 0
+        while True:
+            pks = list(queryset.order_by('pk').values_list('pk', flat=True)[:self.chunk_size])
+            if not pks:
+                break
+            count, _ = model.objects.filter(pk__in=pks).delete()
+            deleted += count
+            if len(pks) < self.chunk_size:
+                break
+            if self.chunk_sleep:
+                time.sleep(self.chunk_sleep)
+        return deleted
+
+    def run(self, models=None, now=None, dry_run=False):
+        """
+        Archive and purge every expired bucket
+
+        Returns a list of ``{'model', 'bucket', 'rows', 'archive'}`` dicts.
+        """
+        results = []
+        for model in models or AUDIT_BUCKET_FIELDS:
+            for bucket in self.expired_buckets(model, now=now):
+                result = {'model': model.__name__, 'bucket': f'{bucket:%Y-%m}', 'archive': None}
+                if dry_run:
+                    result['rows'] = self.bucket_queryset(model, bucket).count()
+                    results.append(result)
+                    continue
+
+                if self.archive_dir:
+                    result['archive'], _ = self.archive_bucket(model, bucket)
+                result['rows'] = self.purge_bucket(model, bucket)
+                logger.info(
+                    f"Purged {result['rows']} {model.__name__} rows for {result['bucket']}"
+                    + (f" (archived to {result['archive']})" if result['archive'] else '')
+                )
+                results.append(result)
+        return results
@@ -0,0 +1,183 @@
+"""
+Audit Rollups - Hourly counters behind the audit dashboard statistics
+Audit writes add to in-process counters that are upserted into
+AuditStatsRollup (per user, plus a system-wide row) with F() increments, so
+AuditService statistics read a bounded number of rows however large the
+audit tables grow.
+"""
+
+import logging
+import threading
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncHour
+from django.utils import timezone
+
+from .models import (
+    AuditLog, LoginHistory, DataChangeLog, SecurityEvent,
+    APIAccessLog, APIAccessAggregate, AuditStatsRollup
+)
+from .writer import get_audit_writer
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_COUNTERS = (
+    'actions', 'logins', 'failed_logins', 'data_changes', 'security_events',
+    'resolved_security_events', 'api_calls', 'total_response_time_ms',
+)
+
+
+def hour_start(value):
+    return value.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+class AuditRollupBuffer:
+    """
+    In-process rollup increments keyed by (hour, user id), upserted on flush
+    """
+
+    def __init__(self):
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def add(self, user_id=None, timestamp=None, **increments):
+        hour = hour_start(timestamp or timezone.now())
+        scopes = (None, user_id) if user_id is not None else (None,)
+        with self._lock:
+            for scope in scopes:
+                counters = self._counters.setdefault((hour, scope), {})
+                for name, amount in increments.items():
+                    counters[name] = counters.get(name, 0) + amount
+
+    def flush(self, force=False):
+        """Write all pending increments (``force`` is accepted for flush hooks)"""
+        with self._lock:
+            ready, self._counters = self._counters, {}
+
+        for (hour, user_id), increments in ready.items():
+            try:
+                self._upsert(hour, user_id, increments)
+            except Exception as e:
+                logger.error(f"Failed to write audit rollup for {hour} (user {user_id}): {e}")
+
+    @staticmethod
+    def _upsert(hour, user_id, increments):
+        lookup = dict(hour=hour, user_id=user_id)
+        update = {name: F(name) + amount for name, amount in increments.items()}
+        if AuditStatsRollup.objects.filter(**lookup).update(**update):
+            return
+        try:
+            with transaction.atomic():
+                AuditStatsRollup.objects.create(**lookup, **increments)
+        except IntegrityError:
+            # Another worker created the row first
+            AuditStatsRollup.objects.filter(**lookup).update(**update)
+
+
+_buffer = None
+_lock = threading.Lock()
+
+
+def get_rollup_buffer():
+    """
+    Process-wide rollup buffer
+
+    With AUDIT_ASYNC_WRITES the audit writer thread flushes it; otherwise
+    increments are written inline.
+    """
+    global _buffer
+    if _buffer is None:
+        with _lock:
+            if _buffer is None:
+                _buffer = AuditRollupBuffer()
+                if getattr(settings, 'AUDIT_ASYNC_WRITES', False):
+                    get_audit_writer().add_flush_hook(_buffer.flush)
+    return _buffer
+
+
+def record_rollup(user_id=None, timestamp=None, **increments):
+    """Add to the hourly counters for ``user_id`` and the system-wide row"""
+    buffer = get_rollup_buffer()
+    buffer.add(user_id=user_id, timestamp=timestamp, **increments)
+    if getattr(settings, 'AUDIT_ASYNC_WRITES', False):
+        get_audit_writer().start()
+    else:
+        buffer.flush()
+
+
+def get_rollup_totals(since, user=None):
+    """
+    Counter totals from the start of ``since``'s hour onwards, for ``user``
+    or system-wide
+    """
+    queryset = AuditStatsRollup.objects.filter(hour__gte=hour_start(since))
+    if user is not None:
+        queryset = queryset.filter(user=user)
+    else:
+        queryset = queryset.filter(user__isnull=True)
+    return queryset.aggregate(**{name: Coalesce(Sum(name), 0) for name in ROLLUP_COUNTERS})
+
+
+def rebuild_rollups(since):
+    """
+    Recompute rollups from the audit tables for every hour from ``since``
+
+    Rows in the range are replaced, so run while audit writes are quiet.
+    Returns the number of rollup rows written.
+    """
+    since = hour_start(since)
+    rollups = {}
+
+    def add(hour, user_id, **counts):
+        for scope in (None, user_id) if user_id is not None else (None,):
+            row = rollups.setdefault((hour, scope), dict.fromkeys(ROLLUP_COUNTERS, 0))
+            for name, amount in counts.items():
+                row[name] += amount or 0
+
+    def grouped(model, field, **annotations):
+        return (
+            model.objects
+            .filter(**{f'{field}__gte': since})
+            .annotate(bucket=TruncHour(field, tzinfo=dt_timezone.utc))
+            .values('bucket', 'user_id')
+            .annotate(**annotations)
+        )
+
+    for row in grouped(AuditLog, 'timestamp', actions=Count('id')):
+        add(row['bucket'], row['user_id'], actions=row['actions'])
+    for row in grouped(LoginHistory, 'login_timestamp', logins=Count('id'),
+                       failed_logins=Count('id', filter=Q(status='failed'))):
+        add(row['bucket'], row['user_id'], logins=row['logins'], failed_logins=row['failed_logins'])
+    for row in grouped(DataChangeLog, 'timestamp', data_changes=Count('id')):
+        add(row['bucket'], row['user_id'], data_changes=row['data_changes'])
+    for row in grouped(SecurityEvent, 'timestamp', security_events=Count('id'),
+                       resolved_security_events=Count('id', filter=Q(resolved=True))):
+        add(row['bucket'], row['user_id'], security_events=row['security_events'],
+            resolved_security_events=row['resolved_security_events'])
+    for row in grouped(APIAccessLog, 'timestamp', api_calls=Count('id'),
+                       total_response_time_ms=Sum('response_time_ms')):
+        add(row['bucket'], row['user_id'], api_calls=row['api_calls'],
+            total_response_time_ms=row['total_response_time_ms'])
+
+    # Requests folded into per-minute aggregates carry no user
+    aggregates = (
+        APIAccessAggregate.objects
+        .filter(minute__gte=since)
+        .annotate(bucket=TruncHour('minute', tzinfo=dt_timezone.utc))
+        .values('bucket')
+        .annotate(api_calls=Sum('request_count'), total_response_time_ms=Sum('total_response_time_ms'))
+    )
+    for row in aggregates:
+        add(row['bucket'], None, api_calls=row['api_calls'],
+            total_response_time_ms=row['total_response_time_ms'])
+
+    with transaction.atomic():
+        AuditStatsRollup.objects.filter(hour__gte=since).delete()
+        AuditStatsRollup.objects.bulk_create([
+            AuditStatsRollup(hour=hour, user_id=user_id, **counts)
+            for (hour, user_id), counts in rollups.items()
+        ], batch_size=1000)
+    return len(rollups)
@@ -181,44 +181,46 @@ class AuditService:
 
     @staticmethod
     def get_user_activity(user, days=30):
-        """Get recent activity for a user"""
+        """Get recent activity for a user (from hourly rollups)"""
         from django.utils import timezone
         from datetime import timedelta
+        from .rollups import get_rollup_totals
         
         since = timezone.now() - timedelta(days=days)
+        totals = get_rollup_totals(since, user=user)
         
         return {
-            'audit_logs': AuditLog.objects.filter(user=user, timestamp__gte=since).count(),
-            'logins': LoginHistory.objects.filter(user=user, login_timestamp__gte=since).count(),
-            'data_changes': DataChangeLog.objects.filter(user=user, timestamp__gte=since).count(),
-            'api_calls': APIAccessLog.objects.filter(user=user, timestamp__gte=since).count(),
+            'audit_logs': totals['actions'],
+            'logins': totals['logins'],
+            'data_changes': totals['data_changes'],
+            'api_calls': totals['api_calls'],
         }
 
     @staticmethod
     def get_system_stats(days=7):
-        """Get system-wide audit statistics"""
+        """
+        Get system-wide audit statistics
+
+        Served from hourly rollups (audit/rollups.py), so the window starts
+        at the top of the hour ``days`` ago and includes sampled-out API
+        calls that were only aggregated.
+        """
         from django.utils import timezone
         from datetime import timedelta
-        from django.db.models import Count, Avg
+        from .rollups import get_rollup_totals
         
         since = timezone.now() - timedelta(days=days)
+        totals = get_rollup_totals(since)
+        api_calls = totals['api_calls']
         
         return {
-            'total_actions': AuditLog.objects.filter(timestamp__gte=since).count(),
-            'total_logins': LoginHistory.objects.filter(login_timestamp__gte=since).count(),
-            'failed_logins': LoginHistory.objects.filter(
-                login_timestamp__gte=since, 
-                status='failed'
-            ).count(),
-            'security_events': SecurityEvent.objects.filter(timestamp__gte=since).count(),
-            'unresolved_security_events': SecurityEvent.objects.filter(
-                timestamp__gte=since, 
-                resolved=False
-            ).count(),
-            'api_calls': APIAccessLog.objects.filter(timestamp__gte=since).count(),
-            'avg_response_time': APIAccessLog.objects.filter(
-                timestamp__gte=since
-            ).aggregate(Avg('response_time_ms'))['response_time_ms__avg'] or 0,
+            'total_actions': totals['actions'],
+            'total_logins': totals['logins'],
+            'failed_logins': totals['failed_logins'],
+            'security_events': totals['security_events'],
+            'unresolved_security_events': totals['security_events'] - totals['resolved_security_events'],
+            'api_calls': api_calls,
+            'avg_response_time': totals['total_response_time_ms'] / api_calls if api_calls else 0,
         }
 
 
@@ -0,0 +1,56 @@
+"""
+Audit Signals - Keep hourly rollups in step with audit writes
+Entries created anywhere (AuditService or direct ORM creates) are counted
+from post_save. bulk_create does not send signals, so bulk writers (the
+API access pipeline) call record_rollup themselves.
+"""
+
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from .models import AuditLog, LoginHistory, DataChangeLog, SecurityEvent
+from .rollups import record_rollup
+
+
+@receiver(post_save, sender=AuditLog)
+def rollup_audit_log(sender, instance, created, **kwargs):
+    if created:
+        record_rollup(user_id=instance.user_id, timestamp=instance.timestamp, actions=1)
+
+
+@receiver(post_save, sender=LoginHistory)
+def rollup_login(sender, instance, created, **kwargs):
+    if created:
+        record_rollup(
+            user_id=instance.user_id,
+            timestamp=instance.login_timestamp,
+            logins=1,
+            failed_logins=int(instance.status == 'failed'),
+        )
+
+
+@receiver(post_save, sender=DataChangeLog)
+def rollup_data_change(sender, instance, created, **kwargs):
+    if created:
+        record_rollup(user_id=instance.user_id, timestamp=instance.timestamp, data_changes=1)
+
+
+@receiver(post_init, sender=SecurityEvent)
+def remember_resolved(sender, instance, **kwargs):
+    # Read from __dict__ so a deferred field is not fetched
+    instance._rollup_resolved = instance.__dict__.get('resolved')
+
+
+@receiver(post_save, sender=SecurityEvent)
+def rollup_security_event(sender, instance, created, **kwargs):
+    newly_resolved = instance.resolved and not instance._rollup_resolved
+    if created or newly_resolved:
+        # Resolutions count against the event's own hour, so
+        # "unresolved" is events minus resolutions over the same range
+        record_rollup(
+            user_id=instance.user_id,
+            timestamp=instance.timestamp,
+            security_events=int(created),
+            resolved_security_events=int(instance.resolved),
+        )
+    instance._rollup_resolved = instance.resolved
@@ -1,15 +1,35 @@
-from django.test import TestCase, RequestFactory
+from django.db import OperationalError
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
+from django.urls import resolve
 from django.utils import timezone
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from unittest.mock import Mock, patch
+import glob
+import os
+import tempfile
 from datetime import timedelta
+import gzip
+import json
 
-from .models import AuditLog, LoginHistory, DataChangeLog, SecurityEvent, APIAccessLog
+from .models import (
+    AuditLog, LoginHistory, DataChangeLog, SecurityEvent, APIAccessLog, APIAccessAggregate,
+    AuditStatsRollup
+)
 from .services import AuditService, get_client_ip, serialize_changes
-from .middleware import AuditMiddleware, SecurityAuditMiddleware
+from .middleware import AuditMiddleware, SecurityAuditMiddleware, get_route
+from .writer import AuditWriter, OVERFLOW_SPILL, record_api_access
+from .policy import AccessLogPolicy, APIAccessAggregator, get_access_aggregator, record_sampled_api_access
+from .retention import AuditRetentionEngine
+from .rollups import get_rollup_buffer, rebuild_rollups
+from .checks import check_shared_cache
+from .counters import SlidingWindowCounter, failed_logins
+from .threats import ThreatDetector, detector
+from .metrics import LatencyHistogram, LatencyRegistry, bucket_index, bucket_upper_bound, render_prometheus
 from deals.models import Deal
 
 User = get_user_model()
@@ -326,6 +346,7 @@ class AuditServiceTest(TestCase):
         self.assertEqual(ip, '10.0.0.1')
 
 
+@override_settings(AUDIT_ASYNC_WRITES=False, AUDIT_ACCESS_DEFAULT_SAMPLE_RATE=1.0)
 class AuditMiddlewareTest(TestCase):
     """Test AuditMiddleware"""
 
@@ -337,7 +358,7 @@ class AuditMiddlewareTest(TestCase):
         )
         self.factory = RequestFactory()
         # Create a proper mock response with content attribute
-        mock_response = Mock(status_code=200, content=b'{"result": "success"}')
+        mock_response = Mock(status_code=200, content=b'{"result": "success"}', streaming=False)
         self.middleware = AuditMiddleware(get_response=lambda r: mock_response)
 
     def test_middleware_logs_api_request(self):
@@ -376,6 +397,653 @@ class AuditMiddlewareTest(TestCase):
         self.assertIsNotNone(log.response_time_ms)
         self.assertGreaterEqual(log.response_time_ms, 0)
 
+    def test_streaming_response_logged_on_close(self):
+        """Test streamed bodies are counted as sent and logged when closed"""
+        response = StreamingHttpResponse(iter([b'a' * 100, b'b' * 50]))
+        middleware = AuditMiddleware(get_response=lambda r: response)
+        request = self.factory.get('/api/payments/invoice/1/pdf/')
+        request.user = self.user
+
+        middleware(request)
+        self.assertFalse(APIAccessLog.objects.exists())
+
+        self.assertEqual(b''.join(response.streaming_content), b'a' * 100 + b'b' * 50)
+        response.close()
+
+        log = APIAccessLog.objects.get()
+        self.assertEqual(log.response_body_size, 150)
+
+    def test_aborted_stream_logs_bytes_sent(self):
+        """Test a stream closed early logs only what was sent"""
+        response = StreamingHttpResponse(iter([b'a' * 100, b'b' * 50]))
+        middleware = AuditMiddleware(get_response=lambda r: response)
+        request = self.factory.get('/api/payments/invoice/1/pdf/')
+        request.user = self.user
+
+        middleware(request)
+        next(iter(response))
+        response.close()
+        response.close()
+
+        self.assertEqual(APIAccessLog.objects.get().response_body_size, 100)
+
+
+class AuditWriterTest(TestCase):
+    """Test batched API access log writer"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+
+    def make_record(self, path='/api/deals/'):
+        return {
+            'user_id': self.user.pk,
+            'method': 'GET',
+            'path': path,
+            'status_code': 200,
+            'response_time_ms': 12,
+            'ip_address': '192.168.1.1',
+            'timestamp': timezone.now() - timedelta(seconds=5),
+        }
+
+    def test_flush_writes_batch(self):
+        """Test queued records are bulk inserted on flush"""
+        writer = AuditWriter(batch_size=2)
+        writer._queue.put_nowait(self.make_record())
+        writer._queue.put_nowait(self.make_record())
+        writer._queue.put_nowait(self.make_record())
+
+        writer.flush()
+
+        self.assertEqual(APIAccessLog.objects.count(), 3)
+        self.assertEqual(writer.stats['written'], 3)
+        # Timestamp is the request time, not the flush time
+        log = APIAccessLog.objects.first()
+        self.assertLess(log.timestamp, timezone.now() - timedelta(seconds=4))
+
+    def test_overflow_drops_when_full(self):
+        """Test records are dropped when the queue is full"""
+        writer = AuditWriter(queue_size=1)
+        writer._ensure_started = lambda: None
+        writer.submit(self.make_record())
+        writer.submit(self.make_record())
+
+        self.assertEqual(writer.stats['enqueued'], 1)
+        self.assertEqual(writer.stats['dropped'], 1)
+
+    def test_overflow_spills_and_replays(self):
+        """Test overflowing records spill to NDJSON and are replayed"""
+        spill_path = os.path.join(tempfile.mkdtemp(), 'spill.ndjson')
+        writer = AuditWriter(queue_size=1, overflow=OVERFLOW_SPILL, spill_path=spill_path)
+        writer._ensure_started = lambda: None
+        writer.submit(self.make_record('/api/a/'))
+        writer.submit(self.make_record('/api/b/'))
+        self.assertEqual(writer.stats['spilled'], 1)
+        self.assertTrue(os.path.exists(spill_path))
+
+        writer.flush()
+
+        self.assertEqual(
+            set(APIAccessLog.objects.values_list('path', flat=True)),
+            {'/api/a/', '/api/b/'}
+        )
+        self.assertFalse(os.path.exists(spill_path))
+
+    def test_spilled_records_stop_after_max_replays(self):
+        """Test a record that keeps failing is dead-lettered, not replayed forever"""
+        spill_path = os.path.join(tempfile.mkdtemp(), 'spill.ndjson')
+        writer = AuditWriter(overflow=OVERFLOW_SPILL, spill_path=spill_path, max_replays=2)
+        writer._overflow([self.make_record()])
+
+        with patch.object(writer, '_insert', side_effect=OperationalError('database is down')):
+            for _ in range(3):
+                writer._replay_spill()
+
+        self.assertFalse(os.path.exists(spill_path))
+        self.assertEqual(writer.stats['dead_lettered'], 1)
+        with open(f'{spill_path}.dead', encoding='utf-8') as dead:
+            self.assertEqual(len(dead.readlines()), 1)
+
+    def test_corrupt_spill_lines_are_dead_lettered(self):
+        """Test a truncated spill line is set aside and the rest still replay"""
+        spill_path = os.path.join(tempfile.mkdtemp(), 'spill.ndjson')
+        writer = AuditWriter(overflow=OVERFLOW_SPILL, spill_path=spill_path)
+        writer._overflow([self.make_record('/api/a/')])
+        with open(spill_path, 'a', encoding='utf-8') as spill:
+            spill.write('{"user_id": 1, "method": "GE\n')
+        writer._overflow([self.make_record('/api/b/')])
+
+        writer._replay_spill()
+
+        self.assertEqual(set(APIAccessLog.objects.values_list('path', flat=True)), {'/api/a/', '/api/b/'})
+        self.assertEqual(writer.stats['dead_lettered'], 1)
+        self.assertFalse(os.path.exists(spill_path))
+        self.assertEqual(glob.glob(f'{spill_path}.replay.*'), [])
+        with open(f'{spill_path}.dead', encoding='utf-8') as dead:
+            self.assertEqual(dead.read(), '{"user_id": 1, "method": "GE\n')
+
+    def test_leftover_replay_files_are_kept(self):
+        """Test an unfinished replay is appended to, and one left by a dead worker is adopted"""
+        spill_path = os.path.join(tempfile.mkdtemp(), 'spill.ndjson')
+        writer = AuditWriter(overflow=OVERFLOW_SPILL, spill_path=spill_path)
+        writer._append(f'{spill_path}.replay.{os.getpid()}', [self.make_record('/api/own/')])
+        writer._append(f'{spill_path}.replay.999999', [self.make_record('/api/orphan/')])
+        writer._overflow([self.make_record('/api/new/')])
+
+        writer._replay_spill()
+
+        self.assertEqual(
+            set(APIAccessLog.objects.values_list('path', flat=True)),
+            {'/api/own/', '/api/orphan/', '/api/new/'}
+        )
+        self.assertEqual(glob.glob(f'{spill_path}.replay.*'), [])
+
+    def test_writer_thread_survives_errors(self):
+        """Test an exception in one cycle does not kill the background thread"""
+        writer = AuditWriter(flush_interval=0.01)
+        cycles = []
+
+        def replay():
+            cycles.append(1)
+            if len(cycles) == 1:
+                raise OSError('disk full')
+            writer._stop.set()
+
+        writer._replay_spill = replay
+        with self.assertLogs('audit.writer', level='ERROR'):
+            writer._run()
+
+        self.assertEqual(len(cycles), 2)
+
+    @override_settings(AUDIT_ASYNC_WRITES=True)
+    def test_record_api_access_queues(self):
+        """Test record_api_access enqueues instead of writing inline"""
+        with patch('audit.writer.get_audit_writer') as get_writer:
+            record_api_access(
+                user=self.user, method='GET', path='/api/deals/', status_code=200,
+                response_time_ms=5, ip_address='192.168.1.1',
+            )
+
+        self.assertEqual(APIAccessLog.objects.count(), 0)
+        record = get_writer.return_value.submit.call_args[0][0]
+        self.assertEqual(record['user_id'], self.user.pk)
+        self.assertIn('timestamp', record)
+
+
+class AuditWriterRejectedRowsTest(TransactionTestCase):
+    """Test one bad row does not sink the rest of its batch"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', email='test@example.com')
+        self.spill_path = os.path.join(tempfile.mkdtemp(), 'spill.ndjson')
+
+    def make_record(self, user_id):
+        return {
+            'user_id': user_id, 'method': 'GET', 'path': '/api/deals/', 'status_code': 200,
+            'response_time_ms': 12, 'ip_address': '192.168.1.1', 'timestamp': timezone.now(),
+        }
+
+    def test_only_rejected_rows_are_dead_lettered(self):
+        """Test a user deleted before the flush costs only its own row"""
+        writer = AuditWriter(batch_size=10, overflow=OVERFLOW_SPILL, spill_path=self.spill_path)
+        deleted_user_id = self.user.pk + 1000
+        batch = [self.make_record(self.user.pk) for _ in range(4)]
+        batch.insert(2, self.make_record(deleted_user_id))
+
+        writer._write(batch)
+
+        self.assertEqual(APIAccessLog.objects.count(), 4)
+        self.assertEqual((writer.stats['written'], writer.stats['dead_lettered']), (4, 1))
+        self.assertFalse(os.path.exists(self.spill_path))
+        with open(f'{self.spill_path}.dead', encoding='utf-8') as dead:
+            self.assertEqual(json.loads(dead.readline())['user_id'], deleted_user_id)
+
+    def test_drop_policy_keeps_good_rows(self):
+        """Test the drop policy still writes the good rows of a rejected batch"""
+        writer = AuditWriter(batch_size=10)
+
+        writer._write([self.make_record(self.user.pk), self.make_record(self.user.pk + 1000)])
+
+        self.assertEqual(APIAccessLog.objects.count(), 1)
+        self.assertEqual(writer.stats['dropped'], 1)
+
+
+class AccessLogPolicyTest(TestCase):
+    """Test API access log sampling and aggregation"""
+
+    def setUp(self):
+        self.policy = AccessLogPolicy(
+            sample_rates=[(r'^/api/vehicles/', 0.0), (r'^/api/payments/', 1.0)],
+            default_rate=0.0,
+        )
+
+    def test_always_logs_mutations_and_errors(self):
+        """Test mutating requests and non-2xx responses are always kept"""
+        self.assertTrue(self.policy.should_log('POST', '/api/vehicles/', 201))
+        self.assertTrue(self.policy.should_log('DELETE', '/api/vehicles/1/', 204))
+        self.assertTrue(self.policy.should_log('GET', '/api/vehicles/', 404))
+        self.assertTrue(self.policy.should_log('GET', '/api/vehicles/', 500))
+
+    def test_samples_successful_reads_per_pattern(self):
+        """Test successful reads follow the first matching sample rate"""
+        self.assertFalse(self.policy.should_log('GET', '/api/vehicles/', 200))
+        self.assertTrue(self.policy.should_log('GET', '/api/payments/', 200))
+        self.assertFalse(self.policy.should_log('GET', '/api/deals/', 200))
+
+    def test_aggregator_upserts_per_minute_counters(self):
+        """Test aggregated requests are counted per (minute, path, method, status)"""
+        aggregator = APIAccessAggregator()
+        aggregator.add('/api/deals/', 'GET', 200, 10)
+        aggregator.add('/api/deals/', 'GET', 200, 30)
+        aggregator.add('/api/deals/', 'HEAD', 200, 5)
+        aggregator.flush(force=True)
+        aggregator.add('/api/deals/', 'GET', 200, 50)
+        aggregator.flush(force=True)
+
+        row = APIAccessAggregate.objects.get(path='/api/deals/', method='GET')
+        self.assertEqual(row.request_count, 3)
+        self.assertEqual(row.total_response_time_ms, 90)
+        self.assertEqual(row.max_response_time_ms, 50)
+        self.assertEqual(APIAccessAggregate.objects.count(), 2)
+
+    def read_through_middleware(self):
+        # Drain counts left in the process-wide aggregator by earlier tests
+        get_access_aggregator().flush(force=True)
+        response = Mock(status_code=200, content=b'{}', streaming=False)
+        middleware = AuditMiddleware(get_response=lambda r: response)
+        request = RequestFactory().get('/api/deals/')
+        request.resolver_match = resolve('/api/deals/')
+        request.user = User.objects.create_user(username='reader', email='reader@example.com')
+        request.META['REMOTE_ADDR'] = '192.168.1.1'
+
+        middleware(request)
+        get_access_aggregator().flush(force=True)
+
+    @override_settings(AUDIT_ASYNC_WRITES=False, AUDIT_ACCESS_DEFAULT_SAMPLE_RATE=0.0)
+    def test_middleware_aggregates_unsampled_reads(self):
+        """Test unsampled successful reads are counted, not logged individually"""
+        self.read_through_middleware()
+
+        self.assertEqual(APIAccessLog.objects.count(), 0)
+        row = APIAccessAggregate.objects.get(path='/api/deals/', method='GET', status_code=200)
+        self.assertEqual(row.request_count, 1)
+
+    @override_settings(AUDIT_ASYNC_WRITES=False, AUDIT_ACCESS_DEFAULT_SAMPLE_RATE=1.0)
+    def test_middleware_logs_sampled_reads(self):
+        """Test sampled-in successful reads get an individual row and no aggregate"""
+        self.read_through_middleware()
+
+        log = APIAccessLog.objects.get()
+        self.assertEqual((log.path, log.method, log.status_code), ('/api/deals/', 'GET', 200))
+        self.assertFalse(APIAccessAggregate.objects.exists())
+
+@override_settings(AUDIT_ASYNC_WRITES=False, AUDIT_ACCESS_DEFAULT_SAMPLE_RATE=0.0)
+class AuditRollupTest(TestCase):
+    """Test rollup-backed audit statistics"""
+
+    def setUp(self):
+        # Drop increments buffered by earlier tests running with async writes
+        get_rollup_buffer().flush()
+        AuditStatsRollup.objects.all().delete()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        AuditService.log_action(user=self.user, action='login', description='Logged in')
+        AuditLog.objects.create(user=None, action='other', description='System task')
+        AuditService.log_login(user=self.user, status='success', ip_address='10.0.0.1')
+        AuditService.log_login(user=self.user, status='failed', ip_address='10.0.0.1')
+        self.event = AuditService.log_security_event(
+            event_type='xss_attempt', risk_level='high', description='XSS', ip_address='10.0.0.1'
+        )
+        record_sampled_api_access(
+            user=self.user, method='GET', path='/api/deals/', status_code=200,
+            response_time_ms=30, ip_address='10.0.0.1',
+        )
+        record_sampled_api_access(
+            user=None, method='POST', path='/api/deals/', status_code=201,
+            response_time_ms=90, ip_address='10.0.0.1',
+        )
+
+    def test_system_stats_from_rollups(self):
+        """Test stats count every write, including aggregated API calls"""
+        with self.assertNumQueries(1):
+            stats = AuditService.get_system_stats(days=7)
+
+        self.assertEqual(stats['total_actions'], 2)
+        self.assertEqual(stats['total_logins'], 2)
+        self.assertEqual(stats['failed_logins'], 1)
+        self.assertEqual(stats['security_events'], 1)
+        self.assertEqual(stats['unresolved_security_events'], 1)
+        self.assertEqual(stats['api_calls'], 2)
+        self.assertEqual(stats['avg_response_time'], 60)
+
+    def test_user_activity_from_rollups(self):
+        """Test per-user rollups only count the user's own entries"""
+        record_sampled_api_access(
+            user=self.user, method='PATCH', path='/api/deals/1/', status_code=200,
+            response_time_ms=40, ip_address='10.0.0.1',
+        )
+
+        activity = AuditService.get_user_activity(self.user, days=30)
+
+        # The sampled-out GET is only in the system-wide aggregate
+        self.assertEqual(activity, {'audit_logs': 1, 'logins': 2, 'data_changes': 0, 'api_calls': 1})
+
+    def test_resolving_event_counted_once(self):
+        """Test resolution decrements unresolved events, saving again does not"""
+        self.event.resolved = True
+        self.event.save()
+        self.event.save()
+
+        self.assertEqual(AuditService.get_system_stats()['unresolved_security_events'], 0)
+
+    def test_rebuild_matches_incremental_rollups(self):
+        """Test rebuilding from the audit tables reproduces the counters"""
+        record_sampled_api_access(
+            user=self.user, method='PATCH', path='/api/deals/1/', status_code=200,
+            response_time_ms=40, ip_address='10.0.0.1',
+        )
+        get_access_aggregator().flush(force=True)
+        before = AuditService.get_system_stats()
+        user_before = AuditService.get_user_activity(self.user)
+
+        rebuild_rollups(timezone.now() - timedelta(days=1))
+
+        self.assertEqual(AuditService.get_system_stats(), before)
+        self.assertEqual(AuditService.get_user_activity(self.user), user_before)
+        self.assertEqual(user_before['api_calls'], 1)
+
+
+class AuditRetentionTest(TestCase):
+    """Test bucketed audit retention"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.now = timezone.now()
+        self.old = AuditLog.objects.create(user=self.user, action='login')
+        self.recent = AuditLog.objects.create(user=self.user, action='logout')
+        AuditLog.objects.filter(pk=self.old.pk).update(timestamp=self.now - timedelta(days=120))
+        AuditLog.objects.filter(pk=self.recent.pk).update(timestamp=self.now - timedelta(days=10))
+        self.archive_dir = tempfile.mkdtemp()
+        self.engine = AuditRetentionEngine(
+            retention_days={'AuditLog': 60},
+            chunk_size=1,
+            chunk_sleep=0,
+            archive_dir=self.archive_dir,
+        )
+
+    def test_only_whole_expired_buckets(self):
+        """Test buckets overlapping the retention window are kept"""
+        buckets = self.engine.expired_buckets(AuditLog, now=self.now)
+        self.assertTrue(buckets)
+        for bucket in buckets:
+            self.assertLess(bucket, self.now - timedelta(days=60))
+
+    def test_archives_then_purges_in_chunks(self):
+        """Test expired rows are exported to NDJSON and deleted"""
+        for i in range(2):
+            log = AuditLog.objects.create(user=self.user, action='update')
+            AuditLog.objects.filter(pk=log.pk).update(timestamp=self.now - timedelta(days=120))
+
+        results = self.engine.run(models=[AuditLog], now=self.now)
+
+        self.assertEqual(sum(result['rows'] for result in results), 3)
+        self.assertFalse(AuditLog.objects.filter(pk=self.old.pk).exists())
+        self.assertTrue(AuditLog.objects.filter(pk=self.recent.pk).exists())
+        with gzip.open(results[0]['archive'], 'rt', encoding='utf-8') as archive:
+            rows = [json.loads(line) for line in archive]
+        self.assertIn(self.old.pk, [row['id'] for row in rows])
+
+    def test_dry_run_deletes_nothing(self):
+        """Test dry run only reports bucket sizes"""
+        results = self.engine.run(models=[AuditLog], now=self.now, dry_run=True)
+
+        self.assertEqual(sum(result['rows'] for result in results), 1)
+        self.assertEqual(AuditLog.objects.count(), 2)
+
+
+class SlidingWindowCounterTest(TestCase):
+    """Test cache-backed sliding-window counters"""
+
+    def setUp(self):
+        cache.clear()
+        self.counter = SlidingWindowCounter('test_counter', window=60, buckets=6)
+        self.now = 1_000_000.0
+
+    def test_counts_within_window(self):
+        """Test hits are summed across buckets in the window"""
+        self.counter.hit('1.2.3.4', now=self.now)
+        self.counter.hit('1.2.3.4', now=self.now + 15)
+        total = self.counter.hit('1.2.3.4', now=self.now + 30)
+
+        self.assertEqual(total, 3)
+        self.assertEqual(self.counter.count('5.6.7.8', now=self.now + 30), 0)
+
+    def test_old_buckets_slide_out(self):
+        """Test hits older than the window are no longer counted"""
+        self.counter.hit('1.2.3.4', now=self.now)
+        self.counter.hit('1.2.3.4', now=self.now + 50)
+
+        self.assertEqual(self.counter.count('1.2.3.4', now=self.now + 65), 1)
+        self.assertFalse(self.counter.exceeded('1.2.3.4', 2, now=self.now + 65))
+
+    def test_reset(self):
+        """Test reset forgets all hits for a key"""
+        self.counter.hit('1.2.3.4', now=self.now)
+        self.counter.reset('1.2.3.4', now=self.now)
+
+        self.assertEqual(self.counter.count('1.2.3.4', now=self.now), 0)
+
+    def test_per_process_cache_is_flagged(self):
+        """Test the system check warns when counters cannot be shared between workers"""
+        with override_settings(DEBUG=False, TESTING=False):
+            self.assertEqual([w.id for w in check_shared_cache(None)], ['audit.W001'])
+            redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}
+            with override_settings(CACHES=redis):
+                self.assertEqual(check_shared_cache(None), [])
+        with override_settings(DEBUG=True):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class SecurityAuditMiddlewareTest(TestCase):
+    """Test SecurityAuditMiddleware login tracking"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        cache.clear()
+
+    def login(self, status_code):
+        middleware = SecurityAuditMiddleware(get_response=lambda r: Mock(status_code=status_code))
+        request = self.factory.post('/api/accounts/login/')
+        request.user = Mock(is_authenticated=False)
+        request.META['REMOTE_ADDR'] = '10.0.0.9'
+        middleware(request)
+
+    def test_repeated_failures_log_security_event(self):
+        """Test failures counted in the shared cache raise an event at the threshold"""
+        for _ in range(4):
+            self.login(401)
+        self.assertFalse(SecurityEvent.objects.filter(event_type='multiple_failed_logins').exists())
+
+        self.login(401)
+
+        event = SecurityEvent.objects.get(event_type='multiple_failed_logins')
+        self.assertEqual(event.metadata['attempts'], 5)
+
+    def test_successful_login_resets_counter(self):
+        """Test a successful login clears the failure count"""
+        for _ in range(3):
+            self.login(401)
+        self.login(200)
+
+        self.assertEqual(failed_logins.count('10.0.0.9'), 0)
+
+    def test_threat_in_body_logs_event_with_rule_ids(self):
+        """Test the body is inspected before the view consumes it"""
+        def view(request):
+            request.read()
+            return Mock(status_code=201)
+
+        middleware = SecurityAuditMiddleware(get_response=view)
+        request = self.factory.post(
+            '/api/chat/messages/',
+            data=json.dumps({'content': '<script>alert(1)</script>'}),
+            content_type='application/json',
+        )
+        request.user = Mock(is_authenticated=False)
+        middleware(request)
+
+        event = SecurityEvent.objects.get(event_type='xss_attempt')
+        self.assertEqual(event.metadata['rules'], ['xss.script_tag'])
+        self.assertEqual(event.metadata['locations'], {'xss.script_tag': ['body']})
+
+
+class ThreatDetectorTest(TestCase):
+    """Test combined-regex threat detection"""
+
+    def test_detects_url_encoded_query(self):
+        """Test the query string is URL-decoded before matching"""
+        report = detector.inspect('/api/vehicles/', 'id=1+UNION+SELECT+password&x=%3Cscript%3E')
+
+        self.assertEqual(report.categories, ['sqli', 'xss'])
+        self.assertIn('sqli.union_select', report.rule_ids)
+        self.assertEqual(report.locations['xss.script_tag'], ['query'])
+
+    def test_detects_path_traversal(self):
+        """Test the path is inspected"""
+        report = detector.inspect('/api/documents/..%2F..%2Fetc%2Fpasswd')
+
+        self.assertEqual(report.rules_for('traversal'), ['traversal.dot_dot', 'traversal.sensitive_file'])
+
+    def test_clean_request_not_flagged(self):
+        """Test ordinary requests (including prose and dashes) are not flagged"""
+        report = detector.inspect(
+            '/api/vehicles/',
+            'make=toyota&model=land-cruiser&sort=-price',
+            json.dumps({'notes': "Buyer's agent asked about the 2015--2018 range"}).encode(),
+        )
+
+        self.assertFalse(report)
+
+    def test_json_punctuation_not_flagged(self):
+        """Test hex colours, hashtags, leading dashes and prose semicolons"""
+        bodies = [
+            {'color': '#ff0000'},
+            {'notes': '-- urgent'},
+            {'title': '#1 seller'},
+            {'q': 'Toyota; update price'},
+            {'notes': 'Shipped; delete the old listing when sold'},
+        ]
+        for body in bodies:
+            with self.subTest(body=body):
+                self.assertFalse(detector.inspect('/api/vehicles/', '', json.dumps(body).encode()))
+        self.assertFalse(detector.inspect('/api/vehicles/', 'x="%23'))
+
+    def test_detects_quote_break_comments_and_stacked_queries(self):
+        """Test real SQL context after a quote break is still flagged"""
+        cases = {
+            "username=admin'--": 'sqli.comment',
+            "username=admin'%23": 'sqli.comment',
+            "id=1'/*": 'sqli.comment',
+            "id=1'; update users set role='admin'": 'sqli.stacked_query',
+            "id=1; delete from accounts_user": 'sqli.stacked_query',
+        }
+        for query, rule_id in cases.items():
+            with self.subTest(query=query):
+                self.assertIn(rule_id, detector.inspect('/api/vehicles/', query).rule_ids)
+
+    def test_body_inspection_is_bounded(self):
+        """Test only the body prefix is scanned"""
+        body = b'a' * 5000 + b'<script>'
+
+        self.assertFalse(detector.inspect('/api/', '', body))
+
+    def test_rejects_capturing_groups(self):
+        """Test rules with capturing groups are refused"""
+        with self.assertRaises(ValueError):
+            ThreatDetector([('bad.rule', 'sqli', ('x',), r'(x)')])
+
+
+class LatencyMetricsTest(TestCase):
+    """Test latency histograms and the /metrics endpoint"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_buckets_are_contiguous_and_bounded(self):
+        """Test every value lands in a bucket within ~6% of it"""
+        for value in range(1, 100000, 7):
+            upper = bucket_upper_bound(bucket_index(value))
+            self.assertGreaterEqual(upper, value)
+            self.assertLessEqual(upper - value, max(1, value // 16))
+
+    def test_quantiles(self):
+        """Test quantiles of a known distribution"""
+        histogram = LatencyHistogram()
+        for value in range(1, 1001):
+            histogram.record(value)
+
+        self.assertAlmostEqual(histogram.quantile(0.5), 500, delta=500 / 16)
+        self.assertAlmostEqual(histogram.quantile(0.99), 990, delta=990 / 16)
+
+    def test_collect_merges_workers(self):
+        """Test snapshots published by separate workers are summed"""
+        first = LatencyRegistry(flush_interval=60)
+        second = LatencyRegistry(flush_interval=60)
+        second.worker_id = 'other-host:1'
+        first.record('/api/deals/', 'GET', 200, 40)
+        second.record('/api/deals/', 'GET', 204, 400)
+        second.flush()
+
+        merged = first.collect()
+
+        histogram = merged[('/api/deals/', 'GET', '2xx')]
+        self.assertEqual(histogram.count, 2)
+        self.assertEqual(histogram.total, 440)
+
+    def test_render_prometheus(self):
+        """Test exposition has cumulative buckets, sum, count and quantiles"""
+        histogram = LatencyHistogram()
+        for value in (3, 40, 2000):
+            histogram.record(value)
+
+        body = render_prometheus({('/api/deals/<int:pk>/', 'GET', '2xx'): histogram})
+
+        labels = 'route="/api/deals/<int:pk>/",method="GET",status="2xx"'
+        self.assertIn(f'api_request_duration_seconds_bucket{{{labels},le="0.005"}} 1', body)
+        self.assertIn(f'api_request_duration_seconds_bucket{{{labels},le="0.05"}} 2', body)
+        self.assertIn(f'api_request_duration_seconds_bucket{{{labels},le="+Inf"}} 3', body)
+        self.assertIn(f'api_request_duration_seconds_count{{{labels}}} 3', body)
+        self.assertIn(f'api_request_duration_seconds_quantile{{{labels},quantile="0.5"}}', body)
+
+    def test_routes_collapse_unmatched_paths(self):
+        """Test resolved requests use their route template and 404s share one label"""
+        request = RequestFactory().get('/api/settings/currency/42/')
+        request.resolver_match = resolve('/api/settings/currency/42/')
+        self.assertEqual(get_route(request), '/api/settings/currency/<int:pk>/')
+
+        for path in ('/api/wp-login.php', '/api/../../etc/passwd'):
+            self.assertEqual(get_route(RequestFactory().get(path)), 'unmatched')
+
+    @override_settings(METRICS_AUTH_TOKEN='scrape-secret')
+    def test_metrics_endpoint_requires_token(self):
+        """Test /metrics rejects scrapes without the bearer token"""
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE api_request_duration_seconds histogram', response.content.decode())
+
 
 class AuditAPITest(APITestCase):
     """Test Audit REST API endpoints"""
@@ -7,7 +7,10 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django_filters.rest_framework import DjangoFilterBackend
+from django.conf import settings
+from django.http import HttpResponse
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 from datetime import timedelta
 from django.db.models import Count, Q
 
@@ -22,6 +25,7 @@ from .serializers import (
     UserActivitySerializer
 )
 from .services import AuditService
+from .metrics import get_latency_registry, render_prometheus
 
 
 class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
@@ -288,3 +292,22 @@ class APIAccessLogViewSet(viewsets.ReadOnlyModelViewSet):
         ).order_by('-count')[:20]
         
         return Response(errors)
+
+
+def prometheus_metrics(request):
+    """
+    Prometheus scrape endpoint for API latency histograms
+
+    Scrapers authenticate with ``Authorization: Bearer <METRICS_AUTH_TOKEN>``;
+    without a configured token only staff sessions may read it.
+    """
+    token = getattr(settings, 'METRICS_AUTH_TOKEN', '')
+    if token:
+        provided = request.META.get('HTTP_AUTHORIZATION', '').removeprefix('Bearer ')
+        if not constant_time_compare(provided, token):
+            return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    elif not (request.user.is_authenticated and request.user.is_staff):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+
+    body = render_prometheus(get_latency_registry().collect())
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
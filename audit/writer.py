@@ -0,0 +1,353 @@
+"""
+Audit Writer - Asynchronous, batched persistence for API access logs
+Requests enqueue records into a bounded in-process queue; a background thread
+flushes them with bulk_create so request latency no longer includes audit I/O.
+A batch the database rejects is bisected so only the offending rows (e.g.
+for a user deleted before the flush) are dead-lettered.
+
+Every worker process appends to the same spill file. Appends and the rename
+that claims the file for replay hold an fcntl lock on ``<spill_path>.lock``,
+and each claimed ``<spill_path>.replay.<pid>`` file stays locked while it is
+replayed, so a file left behind by a killed worker is picked up by the next
+one instead of being overwritten.
+"""
+
+import atexit
+import contextlib
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows; spill files are then only safe within one process
+    fcntl = None
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import APIAccessLog
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_DROP = 'drop'
+OVERFLOW_SPILL = 'spill'
+
+
+class AuditWriter:
+    """
+    Bounded queue of APIAccessLog records flushed in batches by a daemon thread
+
+    Under backpressure (queue full, or the database unavailable) records are
+    either dropped or appended to an NDJSON spill file, depending on
+    ``overflow``. Spilled records are replayed once the queue has drained, at
+    most ``max_replays`` times. Rows the database rejects, and records out of
+    replays, are dead-lettered: appended to ``<spill_path>.dead`` when
+    spilling, dropped otherwise.
+    """
+
+    def __init__(self, batch_size=200, flush_interval=1.0, queue_size=10000,
+                 overflow=OVERFLOW_DROP, spill_path=None, max_replays=5):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.spill_path = spill_path
+        self.max_replays = max_replays
+        self.stats = {
+            'enqueued': 0, 'written': 0, 'dropped': 0, 'spilled': 0, 'failed': 0, 'dead_lettered': 0,
+        }
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._flush_hooks = []
+        self._spill_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def submit(self, record):
+        """Enqueue a record (dict of APIAccessLog field values) without blocking"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+            self.stats['enqueued'] += 1
+        except queue.Full:
+            self._overflow([record])
+
+    def start(self):
+        """
+        Start the background thread (restarting it after a fork) without
+        submitting a record, for components that only use flush hooks
+        """
+        self._ensure_started()
+
+    def add_flush_hook(self, hook):
+        """
+        Run ``hook(force)`` on every flush cycle of the background thread,
+        and with ``force=True`` on an explicit flush or shutdown
+        """
+        self._flush_hooks.append(hook)
+
+    def flush(self):
+        """Write everything queued (and spilled) from the calling thread"""
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                break
+            self._write(batch)
+        self._replay_spill()
+        self._run_hooks(force=True)
+
+    def shutdown(self, timeout=5.0):
+        """Stop the background thread and flush what is left"""
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+        self.flush()
+
+    def _ensure_started(self):
+        # Threads do not survive fork(), so each worker process starts its own
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.queue_size)
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                batch = self._collect()
+                if batch:
+                    self._write(batch)
+                if self._queue.qsize() < self.batch_size:
+                    self._replay_spill()
+                self._run_hooks(force=False)
+            except Exception as e:
+                # Keep the thread alive; the next cycle retries
+                logger.exception(f"Audit writer cycle failed: {e}")
+                self._stop.wait(self.flush_interval)
+
+    def _run_hooks(self, force):
+        for hook in self._flush_hooks:
+            try:
+                hook(force)
+            except Exception as e:
+                logger.error(f"Audit writer flush hook failed: {e}")
+
+    def _collect(self):
+        """Wait up to flush_interval for a full batch"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            close_old_connections()
+            written, rejected = self._insert(batch)
+        except Exception as e:
+            # The database itself is failing; keep the batch for a retry
+            logger.error(f"Failed to write {len(batch)} API access logs: {e}")
+            self.stats['failed'] += len(batch)
+            self._overflow(batch)
+            return
+        self.stats['written'] += written
+        if rejected:
+            logger.error(f"Dead-lettering {len(rejected)} API access logs rejected by the database")
+            self.stats['failed'] += len(rejected)
+            self._dead_letter(rejected)
+
+    def _insert(self, records):
+        """
+        Bulk insert ``records``, bisecting a batch that violates a constraint
+        until the offending rows are isolated. Returns (written, rejected).
+        """
+        try:
+            with transaction.atomic():
+                APIAccessLog.objects.bulk_create(
+                    [APIAccessLog(**_model_fields(record)) for record in records],
+                    batch_size=self.batch_size,
+                )
+            return len(records), []
+        except (IntegrityError, DataError):
+            if len(records) == 1:
+                return 0, records
+        middle = len(records) // 2
+        written_left, rejected_left = self._insert(records[:middle])
+        written_right, rejected_right = self._insert(records[middle:])
+        return written_left + written_right, rejected_left + rejected_right
+
+    def _overflow(self, records):
+        if self.overflow != OVERFLOW_SPILL or not self.spill_path:
+            self.stats['dropped'] += len(records)
+            return
+        if self._append(self.spill_path, records):
+            self.stats['spilled'] += len(records)
+        else:
+            self.stats['dropped'] += len(records)
+
+    def _dead_letter(self, records):
+        lines = [json.dumps(record, default=str) for record in records]
+        self._dead_letter_lines(lines)
+
+    def _dead_letter_lines(self, lines):
+        if self.overflow == OVERFLOW_SPILL and self.spill_path and self._append_lines(f'{self.spill_path}.dead', lines):
+            self.stats['dead_lettered'] += len(lines)
+        else:
+            self.stats['dropped'] += len(lines)
+
+    def _append(self, path, records):
+        return self._append_lines(path, [json.dumps(record, default=str) for record in records])
+
+    def _append_lines(self, path, lines):
+        try:
+            with self._spill_file_lock(), open(path, 'a', encoding='utf-8') as spill:
+                spill.writelines(line + '\n' for line in lines)
+            return True
+        except OSError as e:
+            logger.error(f"Failed to append API access logs to {path}: {e}")
+            return False
+
+    @contextlib.contextmanager
+    def _spill_file_lock(self):
+        """Serialize spill file appends and claims across threads and processes"""
+        with self._spill_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(f'{self.spill_path}.lock', 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _replay_spill(self):
+        """Load spilled records, and replays other workers left behind, back into the database"""
+        if not self.spill_path:
+            return
+        claimed_path = f'{self.spill_path}.replay.{os.getpid()}'
+        with self._spill_file_lock():
+            if os.path.exists(self.spill_path):
+                if os.path.exists(claimed_path):
+                    # An earlier replay of ours did not finish; keep its records
+                    with open(self.spill_path, encoding='utf-8') as spill, \
+                            open(claimed_path, 'a', encoding='utf-8') as claimed:
+                        claimed.writelines(spill)
+                    os.remove(self.spill_path)
+                else:
+                    os.replace(self.spill_path, claimed_path)
+
+        for replay_path in sorted(glob.glob(f'{glob.escape(self.spill_path)}.replay.*')):
+            self._replay_file(replay_path)
+
+    def _replay_file(self, replay_path):
+        try:
+            replay = open(replay_path, encoding='utf-8')
+        except FileNotFoundError:
+            # Another worker finished it
+            return
+        with replay:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(replay, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Another worker is replaying it
+                    return
+            if os.fstat(replay.fileno()).st_nlink == 0:
+                # Replayed and removed while we were opening it
+                return
+
+            batch = []
+            for line in replay:
+                try:
+                    record = json.loads(line)
+                    record['timestamp'] = parse_datetime(record['timestamp'])
+                except (ValueError, TypeError, KeyError) as e:
+                    # Truncated by a killed worker or a full disk
+                    logger.error(f"Dead-lettering unreadable spilled API access log: {e}")
+                    self._dead_letter_lines([line.rstrip('\n')])
+                    continue
+                # Counted per replay, so a record that keeps failing stops
+                # cycling through the spill file
+                record['_replays'] = record.get('_replays', 0) + 1
+                if record['_replays'] > self.max_replays:
+                    self._dead_letter([record])
+                    continue
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    self._write(batch)
+                    batch = []
+            if batch:
+                self._write(batch)
+            os.remove(replay_path)
+
+
+def _model_fields(record):
+    """APIAccessLog field values of a record, without writer bookkeeping keys"""
+    return {name: value for name, value in record.items() if not name.startswith('_')}
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_audit_writer():
+    """Process-wide AuditWriter configured from settings"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = AuditWriter(
+                    batch_size=getattr(settings, 'AUDIT_WRITE_BATCH_SIZE', 200),
+                    flush_interval=getattr(settings, 'AUDIT_WRITE_FLUSH_INTERVAL', 1.0),
+                    queue_size=getattr(settings, 'AUDIT_WRITE_QUEUE_SIZE', 10000),
+                    overflow=getattr(settings, 'AUDIT_WRITE_OVERFLOW', OVERFLOW_DROP),
+                    spill_path=getattr(settings, 'AUDIT_WRITE_SPILL_PATH', None),
+                    max_replays=getattr(settings, 'AUDIT_WRITE_MAX_REPLAYS', 5),
+                )
+                atexit.register(_writer.shutdown)
+    return _writer
+
+
+def record_api_access(**fields):
+    """
+    Persist an API access log, queued when AUDIT_ASYNC_WRITES is enabled
+
+    Accepts the same fields as AuditService.log_api_access. ``user`` is
+    stored as ``user_id`` so queued records do not hold model instances.
+    """
+    from .services import AuditService
+
+    if not getattr(settings, 'AUDIT_ASYNC_WRITES', False):
+        return AuditService.log_api_access(**fields)
+
+    user = fields.pop('user', None)
+    fields['user_id'] = user.pk if user is not None else None
+    fields.setdefault('timestamp', timezone.now())
+    get_audit_writer().submit(fields)
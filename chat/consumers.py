@@ -6,19 +6,46 @@ Consumers handle WebSocket connections, message broadcasting, typing indicators,
 and read receipts.
 """
 
+import asyncio
+import functools
 import json
 import logging
+import time
 from typing import Any, Dict, Optional
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
 from django.utils import timezone
+import msgpack
 
 from .models import Conversation, Message, MessageRead
+from .presence import presence
+from .typing_indicators import TypingCoalescer
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
+# Seconds between client heartbeats; must be well under PRESENCE_TTL. Any
+# inbound frame also counts, rewriting presence at most every half interval.
+HEARTBEAT_INTERVAL = getattr(settings, 'PRESENCE_HEARTBEAT_INTERVAL', 30)
+
+# Typing indicators: at most one broadcast per interval, expiring after timeout
+TYPING_BROADCAST_INTERVAL = getattr(settings, 'CHAT_TYPING_BROADCAST_INTERVAL', 2.0)
+TYPING_TIMEOUT = getattr(settings, 'CHAT_TYPING_TIMEOUT', 6.0)
+
+# Message history frames
+HISTORY_FIELDS = ('id', 'sender_id', 'content', 'created_at', 'is_read', 'is_system_message')
+HISTORY_DEFAULT_LIMIT = 50
+HISTORY_MAX_LIMIT = 200
+
+# Offline broadcasts still waiting out their grace period
+_pending_tasks = set()
+
 
 class ChatConsumer(AsyncWebsocketConsumer):
     """
@@ -34,6 +61,9 @@ class ChatConsumer(AsyncWebsocketConsumer):
     URL pattern: /ws/chat/<conversation_id>/
     """
     
+    # Set once presence is registered (monotonic clock)
+    presence_refreshed_at: Optional[float] = None
+    
     async def connect(self) -> None:
         """Handle WebSocket connection."""
         self.conversation_id = self.scope.get('url_route', {}).get('kwargs', {}).get('conversation_id')
@@ -59,37 +89,41 @@ class ChatConsumer(AsyncWebsocketConsumer):
         
         await self.accept()
         
-        # Send connection success message
+        self.typing = self.make_typing_coalescer(self.room_group_name)
+        
+        # Send connection success message, with the other participant's
+        # current presence (status events only announce transitions)
+        other_id = other_participant_id(self.participant_ids, self.user.id)
+        other_online = await sync_to_async(presence.is_online)(other_id)
         await self.send(text_data=json.dumps({
             'type': 'connection_established',
             'conversation_id': self.conversation_id,
+            'other_participant_online': other_online,
+            'heartbeat_interval': HEARTBEAT_INTERVAL,
             'timestamp': timezone.now().isoformat()
         }))
         
-        # Notify other participant that user is online
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'user_status',
-                'user_id': self.user.id,
-                'status': 'online'
-            }
-        )
+        # Notify other participant only if the user was actually offline
+        came_online = await sync_to_async(presence.connect)(self.user.id, self.channel_name)
+        self.presence_refreshed_at = time.monotonic()
+        if came_online:
+            await self.broadcast_status('online')
         
         logger.info(f"User {self.user.id} connected to conversation {self.conversation_id}")
     
     async def disconnect(self, code: int) -> None:
         """Handle WebSocket disconnection."""
-        # Notify other participant that user is offline
-        if hasattr(self, 'user') and self.user:
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'user_status',
-                    'user_id': self.user.id,
-                    'status': 'offline'
-                }
-            )
+        # Closing the last socket starts a grace period; the offline status
+        # is broadcast only if the user has not reconnected by its end
+        if hasattr(self, 'typing'):
+            await self.typing.stop()
+        
+        if hasattr(self, 'participant_ids'):
+            last_connection = await sync_to_async(presence.disconnect)(self.user.id, self.channel_name)
+            if last_connection:
+                task = asyncio.ensure_future(self.broadcast_offline_after_grace())
+                _pending_tasks.add(task)
+                task.add_done_callback(_pending_tasks.discard)
         
         # Leave room group
         await self.channel_layer.group_discard(
@@ -108,23 +142,18 @@ class ChatConsumer(AsyncWebsocketConsumer):
         - message: Send a chat message
         - typing: Send typing indicator
         - read: Mark messages as read
+        - history: Page of older messages (before_id, limit, encoding)
+        - heartbeat: Keep the user's presence alive (every heartbeat_interval seconds)
+        
+        Every frame keeps presence alive, so clients only need heartbeats
+        while idle.
         """
+        await self.refresh_presence()
         if not text_data:
             return
             
         try:
-            data = json.loads(text_data)
-            message_type = data.get('type')
-            
-            if message_type == 'message':
-                await self.handle_message(data)
-            elif message_type == 'typing':
-                await self.handle_typing(data)
-            elif message_type == 'read':
-                await self.handle_read(data)
-            else:
-                logger.warning(f"Unknown message type: {message_type}")
-        
+            await self.handle_frame(json.loads(text_data))
         except json.JSONDecodeError:
             logger.error("Invalid JSON received")
             await self.send(text_data=json.dumps({
@@ -138,6 +167,32 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 'message': 'Internal error'
             }))
     
+    async def refresh_presence(self) -> None:
+        """Extend this connection's presence, at most every half heartbeat interval."""
+        if self.presence_refreshed_at is None:
+            return
+        now = time.monotonic()
+        if now - self.presence_refreshed_at >= HEARTBEAT_INTERVAL / 2:
+            self.presence_refreshed_at = now
+            await sync_to_async(presence.heartbeat)(self.user.id, self.channel_name)
+    
+    async def handle_frame(self, data: Dict[str, Any]) -> None:
+        """Dispatch a decoded client frame by its type."""
+        message_type = data.get('type')
+        
+        if message_type == 'message':
+            await self.handle_message(data)
+        elif message_type == 'typing':
+            await self.handle_typing(data)
+        elif message_type == 'read':
+            await self.handle_read(data)
+        elif message_type == 'history':
+            await self.handle_history(data)
+        elif message_type == 'heartbeat':
+            pass  # Presence was refreshed in receive()
+        else:
+            logger.warning(f"Unknown message type: {message_type}")
+    
     async def handle_message(self, data: Dict[str, Any]) -> None:
         """Handle incoming chat message."""
         if not self.user:
@@ -151,11 +206,15 @@ class ChatConsumer(AsyncWebsocketConsumer):
         # Save message to database
         message = await self.save_message(content)
         
+        # Sending ends the typing state
+        await self.typing.update(False)
+        
         # Broadcast to room group
         await self.channel_layer.group_send(
             self.room_group_name,
             {
                 'type': 'chat_message',
+                'conversation_id': int(self.conversation_id),
                 'message_id': message.id,
                 'sender_id': self.user.id,
                 'sender_name': self.user.get_full_name() or self.user.username,
@@ -166,17 +225,27 @@ class ChatConsumer(AsyncWebsocketConsumer):
         )
     
     async def handle_typing(self, data: Dict[str, Any]) -> None:
-        """Handle typing indicator."""
+        """Handle typing indicator (coalesced, see chat/typing_indicators.py)."""
         if not self.user:
             return
-            
-        is_typing = data.get('is_typing', False)
         
-        # Broadcast typing status to room (excluding sender)
+        await self.typing.update(bool(data.get('is_typing', False)))
+    
+    def make_typing_coalescer(self, room_group_name: str) -> TypingCoalescer:
+        """Typing state for one conversation, bound to its room group."""
+        return TypingCoalescer(
+            functools.partial(self.broadcast_typing, room_group_name),
+            interval=TYPING_BROADCAST_INTERVAL,
+            timeout=TYPING_TIMEOUT,
+        )
+    
+    async def broadcast_typing(self, room_group_name: str, is_typing: bool) -> None:
+        """Broadcast a typing state change to the room (excluding sender)."""
         await self.channel_layer.group_send(
-            self.room_group_name,
+            room_group_name,
             {
                 'type': 'user_typing',
+                'conversation_id': int(room_group_name.removeprefix('chat_')),
                 'user_id': self.user.id,
                 'user_name': self.user.get_full_name() or self.user.username,
                 'is_typing': is_typing
@@ -191,25 +260,91 @@ class ChatConsumer(AsyncWebsocketConsumer):
         message_ids = data.get('message_ids', [])
         
         if message_ids:
-            await self.mark_messages_read(message_ids)
+            read_ids = await self.mark_messages_read(message_ids)
+            if not read_ids:
+                return
             
-            # Notify sender that messages were read
+            # Notify sender that messages were read (only newly read ones)
             await self.channel_layer.group_send(
                 self.room_group_name,
                 {
                     'type': 'messages_read',
-                    'message_ids': message_ids,
+                    'conversation_id': int(self.conversation_id),
+                    'message_ids': read_ids,
                     'reader_id': self.user.id,
                     'timestamp': timezone.now().isoformat()
                 }
             )
     
+    def status_group_names(self):
+        """Groups that hear this user's online/offline transitions."""
+        return [self.room_group_name]
+    
+    async def broadcast_status(self, status: str) -> None:
+        """Broadcast an online/offline transition."""
+        await asyncio.gather(*[
+            self.channel_layer.group_send(
+                group_name,
+                {
+                    'type': 'user_status',
+                    'user_id': self.user.id,
+                    'status': status
+                }
+            )
+            for group_name in self.status_group_names()
+        ])
+    
+    async def broadcast_offline_after_grace(self) -> None:
+        """Broadcast offline status once the presence grace period has passed."""
+        await asyncio.sleep(presence.grace)
+        try:
+            if await sync_to_async(presence.settle)(self.user.id):
+                await self.broadcast_status('offline')
+        except Exception as e:
+            logger.error(f"Error broadcasting offline status for user {self.user.id}: {str(e)}")
+    
+    async def handle_history(self, data: Dict[str, Any]) -> None:
+        """
+        Send a page of messages older than ``before_id`` (newest first).
+        
+        ``encoding`` selects the frame format:
+        - json: {"messages": [{field: value, ...}, ...]}
+        - compact: {"fields": [...], "rows": [[value, ...], ...]}
+        - msgpack: the compact frame, msgpack-encoded in a binary frame
+        """
+        try:
+            before_id = int(data['before_id']) if data.get('before_id') is not None else None
+            limit = min(max(int(data.get('limit', HISTORY_DEFAULT_LIMIT)), 1), HISTORY_MAX_LIMIT)
+        except (TypeError, ValueError):
+            await self.send(text_data=json.dumps({'type': 'error', 'message': 'Invalid history request'}))
+            return
+        encoding = data.get('encoding', 'json')
+        
+        rows, has_more = await self.get_history(before_id, limit)
+        frame = {
+            'type': 'history',
+            'conversation_id': int(self.conversation_id),
+            'has_more': has_more,
+            'next_before_id': rows[-1][0] if rows and has_more else None,
+        }
+        if encoding in ('compact', 'msgpack'):
+            frame['fields'] = list(HISTORY_FIELDS)
+            frame['rows'] = rows
+        else:
+            frame['messages'] = [dict(zip(HISTORY_FIELDS, row)) for row in rows]
+        
+        if encoding == 'msgpack':
+            await self.send(bytes_data=msgpack.packb(frame))
+        else:
+            await self.send(text_data=json.dumps(frame, separators=(',', ':')))
+    
     # WebSocket event handlers (called by channel_layer.group_send)
     
     async def chat_message(self, event: Dict[str, Any]) -> None:
         """Send chat message to WebSocket."""
         await self.send(text_data=json.dumps({
             'type': 'message',
+            'conversation_id': event['conversation_id'],
             'message_id': event['message_id'],
             'sender_id': event['sender_id'],
             'sender_name': event['sender_name'],
@@ -227,6 +362,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
         if event['user_id'] != self.user.id:
             await self.send(text_data=json.dumps({
                 'type': 'typing',
+                'conversation_id': event['conversation_id'],
                 'user_id': event['user_id'],
                 'user_name': event['user_name'],
                 'is_typing': event['is_typing']
@@ -254,6 +390,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
         if event['reader_id'] != self.user.id:
             await self.send(text_data=json.dumps({
                 'type': 'read',
+                'conversation_id': event['conversation_id'],
                 'message_ids': event['message_ids'],
                 'reader_id': event['reader_id'],
                 'timestamp': event['timestamp']
@@ -263,56 +400,306 @@ class ChatConsumer(AsyncWebsocketConsumer):
     
     @database_sync_to_async
     def check_participant(self):
-        """Check if user is participant in conversation."""
-        try:
-            conversation = Conversation.objects.get(id=self.conversation_id)
-            return conversation.participant_1 == self.user or conversation.participant_2 == self.user
-        except Conversation.DoesNotExist:
+        """
+        Check if user is participant in conversation, caching the
+        participant ids for the lifetime of the connection.
+        """
+        participants = get_participant_ids(self.conversation_id, self.user.id)
+        if participants is None:
             return False
+        self.participant_ids = participants
+        return True
     
     @database_sync_to_async
     def save_message(self, content: str) -> Message:
-        """Save message to database."""
-        conversation = Conversation.objects.get(id=self.conversation_id)
-        message = Message.objects.create(
-            conversation=conversation,
+        """
+        Save message to database.
+        
+        One INSERT; Message.save() then bumps the recipient's unread count
+        and updated_at in a single atomic UPDATE.
+        """
+        return Message.objects.create(
+            conversation_id=self.conversation_id,
             sender=self.user,
             content=content
         )
+    
+    @database_sync_to_async
+    def get_history(self, before_id, limit):
+        """
+        Keyset page of messages as value rows, newest first.
         
-        # Update conversation's unread count for the other participant
-        if conversation.participant_1 == self.user:
-            conversation.unread_count_p2 += 1
-        else:
-            conversation.unread_count_p1 += 1
-        conversation.save(update_fields=['unread_count_p1', 'unread_count_p2'])
-        
-        return message
+        Returns (rows, has_more); one query on the (conversation, id) index.
+        """
+        queryset = Message.objects.filter(conversation_id=self.conversation_id)
+        if before_id is not None:
+            queryset = queryset.filter(id__lt=before_id)
+        rows = list(queryset.order_by('-id').values_list(*HISTORY_FIELDS)[:limit + 1])
+        has_more = len(rows) > limit
+        return [
+            [message_id, sender_id, content, created_at.isoformat(), is_read, is_system_message]
+            for message_id, sender_id, content, created_at, is_read, is_system_message in rows[:limit]
+        ], has_more
     
     @database_sync_to_async
     def mark_messages_read(self, message_ids):
-        """Mark messages as read."""
-        messages = Message.objects.filter(
-            id__in=message_ids,
-            conversation_id=self.conversation_id
-        ).exclude(sender=self.user)
-        
-        for message in messages:
-            message.is_read = True
-            message.read_at = timezone.now()
-            message.save(update_fields=['is_read', 'read_at'])
+        """
+        Mark messages as read in three queries: one UPDATE returning the ids
+        that actually changed, one bulk insert of read receipts and one
+        atomic decrement of the reader's unread count by that many.
+        
+        Returns the ids of messages that were newly read.
+        """
+        now = timezone.now()
+        with transaction.atomic(savepoint=False):
+            read_ids = _mark_unread_messages(self.conversation_id, self.user.id, message_ids, now)
+            if not read_ids:
+                return []
+            
+            MessageRead.objects.bulk_create(
+                [MessageRead(message_id=message_id, user=self.user) for message_id in read_ids],
+                ignore_conflicts=True,
+            )
             
-            # Create MessageRead record
-            MessageRead.objects.get_or_create(
-                message=message,
-                reader=self.user,
-                defaults={'read_at': timezone.now()}
+            # Decrement the reader's counter (participants cached at connect)
+            field = 'unread_count_p1' if self.user.id == self.participant_ids[0] else 'unread_count_p2'
+            Conversation.objects.filter(id=self.conversation_id).update(
+                **{field: Greatest(F(field) - len(read_ids), 0)}
             )
+        return read_ids
+
+
+class UserChatConsumer(ChatConsumer):
+    """
+    One WebSocket per user for all of their conversations.
+    
+    Subscribes to every conversation group the user takes part in, plus a
+    personal ``user_<id>`` group for notifications. Client frames carry a
+    ``conversation_id`` and are routed to the per-conversation handlers of
+    ChatConsumer; outgoing frames carry it too.
+    
+    Extra frame types:
+    - subscribe: Join a conversation started after the socket connected
+    - unsubscribe: Stop receiving a conversation's events
+    
+    URL pattern: /ws/chat/
+    """
+    
+    async def connect(self) -> None:
+        """Handle WebSocket connection."""
+        self.user = self.scope.get('user')
+        
+        if not self.user or not self.user.is_authenticated:
+            await self.close()
+            return
+        
+        self.user_group_name = f'user_{self.user.id}'
+        # conversation id -> (participant_1_id, participant_2_id)
+        self.conversations = await self.load_conversations()
+        self.typing_states = {}
+        
+        await asyncio.gather(
+            self.channel_layer.group_add(self.user_group_name, self.channel_name),
+            *[
+                self.channel_layer.group_add(f'chat_{conversation_id}', self.channel_name)
+                for conversation_id in self.conversations
+            ]
+        )
+        
+        await self.accept()
+        
+        other_ids = {
+            other_participant_id(participants, self.user.id)
+            for participants in self.conversations.values()
+        }
+        online_ids = await sync_to_async(presence.online_among)(other_ids)
+        await self.send(text_data=json.dumps({
+            'type': 'connection_established',
+            'conversation_ids': sorted(self.conversations),
+            'online_user_ids': sorted(online_ids),
+            'heartbeat_interval': HEARTBEAT_INTERVAL,
+            'timestamp': timezone.now().isoformat()
+        }))
+        
+        self.presence_registered = True
+        came_online = await sync_to_async(presence.connect)(self.user.id, self.channel_name)
+        self.presence_refreshed_at = time.monotonic()
+        if came_online:
+            await self.broadcast_status('online')
+        
+        logger.info(f"User {self.user.id} connected to {len(self.conversations)} conversations")
+    
+    async def disconnect(self, code: int) -> None:
+        """Handle WebSocket disconnection."""
+        if not hasattr(self, 'conversations'):
+            return
+        
+        for typing in self.typing_states.values():
+            await typing.stop()
+        
+        if hasattr(self, 'presence_registered'):
+            last_connection = await sync_to_async(presence.disconnect)(self.user.id, self.channel_name)
+            if last_connection:
+                task = asyncio.ensure_future(self.broadcast_offline_after_grace())
+                _pending_tasks.add(task)
+                task.add_done_callback(_pending_tasks.discard)
+        
+        await asyncio.gather(
+            self.channel_layer.group_discard(self.user_group_name, self.channel_name),
+            *[
+                self.channel_layer.group_discard(f'chat_{conversation_id}', self.channel_name)
+                for conversation_id in self.conversations
+            ]
+        )
+        
+        logger.info(f"User {self.user.id} disconnected from multiplexed chat")
+    
+    def status_group_names(self):
+        return [f'chat_{conversation_id}' for conversation_id in self.conversations]
+    
+    async def handle_frame(self, data: Dict[str, Any]) -> None:
+        """Route a client frame to the conversation it names."""
+        message_type = data.get('type')
+        
+        if message_type == 'heartbeat':
+            return  # Presence was refreshed in receive()
+        
+        try:
+            conversation_id = int(data.get('conversation_id'))
+        except (TypeError, ValueError):
+            await self.send_error('conversation_id is required')
+            return
         
-        # Update conversation's unread count
-        conversation = Conversation.objects.get(id=self.conversation_id)
-        if conversation.participant_1 == self.user:
-            conversation.unread_count_p1 = max(0, conversation.unread_count_p1 - len(message_ids))
+        if message_type == 'subscribe':
+            await self.subscribe(conversation_id)
+        elif message_type == 'unsubscribe':
+            await self.unsubscribe(conversation_id)
+        elif conversation_id not in self.conversations:
+            await self.send_error('Not subscribed to this conversation', conversation_id)
         else:
-            conversation.unread_count_p2 = max(0, conversation.unread_count_p2 - len(message_ids))
-        conversation.save(update_fields=['unread_count_p1', 'unread_count_p2'])
+            self.activate(conversation_id)
+            await super().handle_frame(data)
+    
+    def activate(self, conversation_id: int) -> None:
+        """
+        Point the per-conversation state used by ChatConsumer's handlers at
+        ``conversation_id``. Frames are handled one at a time, so this is
+        safe; background work (typing flushes) is bound to its own room.
+        """
+        self.conversation_id = conversation_id
+        self.room_group_name = f'chat_{conversation_id}'
+        self.participant_ids = self.conversations[conversation_id]
+        if conversation_id not in self.typing_states:
+            self.typing_states[conversation_id] = self.make_typing_coalescer(self.room_group_name)
+        self.typing = self.typing_states[conversation_id]
+    
+    async def subscribe(self, conversation_id: int) -> None:
+        """Join a conversation's group after checking participation."""
+        if conversation_id not in self.conversations:
+            participants = await database_sync_to_async(get_participant_ids)(conversation_id, self.user.id)
+            if participants is None:
+                await self.send_error('Conversation not found', conversation_id)
+                return
+            self.conversations[conversation_id] = participants
+            await self.channel_layer.group_add(f'chat_{conversation_id}', self.channel_name)
+        
+        other_id = other_participant_id(self.conversations[conversation_id], self.user.id)
+        await self.send(text_data=json.dumps({
+            'type': 'subscribed',
+            'conversation_id': conversation_id,
+            'other_participant_online': await sync_to_async(presence.is_online)(other_id),
+        }))
+    
+    async def unsubscribe(self, conversation_id: int) -> None:
+        """Leave a conversation's group."""
+        if self.conversations.pop(conversation_id, None) is not None:
+            typing = self.typing_states.pop(conversation_id, None)
+            if typing:
+                await typing.stop()
+            await self.channel_layer.group_discard(f'chat_{conversation_id}', self.channel_name)
+        
+        await self.send(text_data=json.dumps({
+            'type': 'unsubscribed',
+            'conversation_id': conversation_id,
+        }))
+    
+    async def send_error(self, message: str, conversation_id: Optional[int] = None) -> None:
+        await self.send(text_data=json.dumps({
+            'type': 'error',
+            'conversation_id': conversation_id,
+            'message': message
+        }))
+    
+    # Personal channel events (group_send to user_<id>)
+    
+    async def notify(self, event: Dict[str, Any]) -> None:
+        """Send a personal notification to WebSocket."""
+        await self.send(text_data=json.dumps({
+            'type': 'notification',
+            'notification': event.get('notification'),
+            'unread_count': event.get('unread_count')
+        }))
+    
+    @database_sync_to_async
+    def load_conversations(self):
+        """Ids and participants of the user's active conversations, in one query."""
+        rows = (
+            Conversation.objects
+            .filter(Q(participant_1=self.user) | Q(participant_2=self.user), is_archived=False)
+            .values_list('id', 'participant_1_id', 'participant_2_id')
+        )
+        return {conversation_id: (p1_id, p2_id) for conversation_id, p1_id, p2_id in rows}
+
+
+def get_participant_ids(conversation_id, user_id):
+    """(participant_1_id, participant_2_id) if ``user_id`` takes part, else None"""
+    participants = (
+        Conversation.objects
+        .filter(id=conversation_id)
+        .values_list('participant_1_id', 'participant_2_id')
+        .first()
+    )
+    if participants is None or user_id not in participants:
+        return None
+    return participants
+
+
+def other_participant_id(participant_ids, user_id):
+    p1_id, p2_id = participant_ids
+    return p2_id if p1_id == user_id else p1_id
+
+
+def _mark_unread_messages(conversation_id, reader_id, message_ids, now):
+    """
+    Set is_read on the reader's unread messages among ``message_ids`` and
+    return the ids that changed, using UPDATE ... RETURNING where supported.
+    """
+    message_ids = [int(message_id) for message_id in message_ids]
+    if not message_ids:
+        return []
+    
+    supports_returning = connection.vendor == 'postgresql' or (
+        # SQLite 3.35+ (the same versions that support INSERT ... RETURNING)
+        connection.vendor == 'sqlite' and connection.features.can_return_columns_from_insert
+    )
+    if not supports_returning:
+        # No UPDATE ... RETURNING (MySQL/MariaDB): lock the candidates, then update them
+        queryset = Message.objects.filter(
+            id__in=message_ids, conversation_id=conversation_id, is_read=False
+        ).exclude(sender_id=reader_id)
+        read_ids = list(queryset.select_for_update().values_list('id', flat=True))
+        Message.objects.filter(id__in=read_ids).update(is_read=True, read_at=now)
+        return read_ids
+    
+    qn = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(message_ids))
+    sql = (
+        f'UPDATE {qn(Message._meta.db_table)} '
+        f'SET {qn("is_read")} = %s, {qn("read_at")} = %s '
+        f'WHERE {qn("id")} IN ({placeholders}) '
+        f'AND {qn("conversation_id")} = %s AND {qn("sender_id")} <> %s AND {qn("is_read")} = %s '
+        f'RETURNING {qn("id")}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [True, now, *message_ids, conversation_id, reader_id, False])
+        return [row[0] for row in cursor.fetchall()]
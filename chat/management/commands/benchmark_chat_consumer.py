@@ -0,0 +1,204 @@
+"""
+Management command to load-test the chat WebSocket consumer
+Connects simulated buyer/dealer pairs to ChatConsumer through
+WebsocketCommunicator on the in-memory channel layer, drives a mix of
+message, typing and read-receipt frames and reports throughput, delivery
+latency and database queries per message.
+
+Runs against a throwaway test database (created and destroyed like the
+test runner's). With --allow-live-db, temporary users and conversations are
+created in the configured database instead and deleted afterwards.
+"""
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from chat.models import Conversation
+from chat.routing import websocket_urlpatterns
+
+User = get_user_model()
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class SimulatedClient:
+    """One participant's socket plus the frames it has seen"""
+
+    def __init__(self, user, conversation_id):
+        self.user = user
+        self.communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), f'/ws/chat/{conversation_id}/'
+        )
+        self.communicator.scope['user'] = user
+        self.unread_ids = []
+
+    async def read(self, sent_at, latencies):
+        """Record delivery latency of the other participant's messages"""
+        while True:
+            frame = json.loads(await self.communicator.receive_from(timeout=None))
+            if frame['type'] == 'message' and frame['sender_id'] != self.user.id:
+                latencies.append(time.perf_counter() - sent_at[frame['content']])
+                self.unread_ids.append(frame['message_id'])
+
+
+class Command(BaseCommand):
+    help = 'Load-test ChatConsumer with simulated clients on the in-memory channel layer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conversations', type=int, default=20,
+                            help='Simulated buyer/dealer pairs (two sockets each)')
+        parser.add_argument('--frames', type=int, default=50,
+                            help='Frames sent by each client')
+        parser.add_argument('--interval', type=float, default=0.05,
+                            help='Seconds between frames from one client (0 saturates)')
+        parser.add_argument('--mix', default='70:20:10',
+                            help='message:typing:read frame weights')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--timeout', type=float, default=30.0,
+                            help='Seconds to wait for outstanding deliveries')
+        parser.add_argument('--allow-live-db', action='store_true',
+                            help='Use the configured database instead of a throwaway test database')
+
+    def handle(self, *args, **options):
+        try:
+            weights = [int(weight) for weight in options['mix'].split(':')]
+        except ValueError:
+            weights = []
+        if len(weights) != 3 or sum(weights) <= 0:
+            raise CommandError('--mix must be three non-negative weights, e.g. 70:20:10')
+
+        # Consumer database calls are thread-sensitive and run in this
+        # thread, so one execute wrapper here sees all of them
+        queries = {'counting': False, 'count': 0}
+
+        def count_query(execute, sql, params, many, context):
+            if queries['counting']:
+                queries['count'] += 1
+            return execute(sql, params, many, context)
+
+        use_test_db = not options['allow_live_db']
+        old_db_name = connection.settings_dict['NAME']
+        if use_test_db:
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+        prefix = f'chatbench-{uuid.uuid4().hex[:8]}'
+        with override_settings(
+            CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        ):
+            try:
+                users = [
+                    User.objects.create_user(username=f'{prefix}-{i}', email=f'{prefix}-{i}@example.com')
+                    for i in range(options['conversations'] * 2)
+                ]
+                conversations = [
+                    Conversation.objects.create(participant_1=users[i], participant_2=users[i + 1])
+                    for i in range(0, len(users), 2)
+                ]
+                with connection.execute_wrapper(count_query):
+                    results = async_to_sync(self.run)(conversations, weights, queries, options)
+            finally:
+                if use_test_db:
+                    connection.creation.destroy_test_db(old_db_name, verbosity=0)
+                else:
+                    User.objects.filter(username__startswith=prefix).delete()
+
+        self.report(results)
+
+    async def run(self, conversations, weights, queries, options):
+        clients = [
+            SimulatedClient(user, conversation.id)
+            for conversation in conversations
+            for user in (conversation.participant_1, conversation.participant_2)
+        ]
+        for client in clients:
+            connected, _ = await client.communicator.connect()
+            if not connected:
+                raise CommandError(f'Connection refused for {client.user.username}')
+
+        sent_at = {}
+        latencies = []
+        readers = [asyncio.ensure_future(client.read(sent_at, latencies)) for client in clients]
+        rng = random.Random(options['seed'])
+        counts = {'message': 0, 'typing': 0, 'read': 0}
+
+        async def drive(client, index):
+            for seq in range(options['frames']):
+                action = rng.choices(('message', 'typing', 'read'), weights)[0]
+                if action == 'message':
+                    content = f'load test {index}:{seq}'
+                    sent_at[content] = time.perf_counter()
+                    frame = {'type': 'message', 'message': content}
+                elif action == 'typing':
+                    frame = {'type': 'typing', 'is_typing': True}
+                else:
+                    frame = {'type': 'read', 'message_ids': client.unread_ids}
+                    client.unread_ids = []
+                counts[action] += 1
+                await client.communicator.send_to(text_data=json.dumps(frame))
+                await asyncio.sleep(options['interval'])
+
+        queries['counting'] = True
+        started = time.perf_counter()
+        await asyncio.gather(*[drive(client, index) for index, client in enumerate(clients)])
+        deadline = time.perf_counter() + options['timeout']
+        while len(latencies) < counts['message'] and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        queries['counting'] = False
+
+        for reader in readers:
+            reader.cancel()
+        await asyncio.gather(*readers, return_exceptions=True)
+        for client in clients:
+            await client.communicator.disconnect()
+
+        return {
+            'clients': len(clients),
+            'counts': counts,
+            'delivered': len(latencies),
+            'elapsed': elapsed,
+            'latencies': latencies,
+            'queries': queries['count'],
+        }
+
+    def report(self, results):
+        counts = results['counts']
+        messages = counts['message']
+        latencies_ms = [latency * 1000 for latency in results['latencies']]
+
+        self.stdout.write(
+            f"{results['clients']} clients sent {messages} messages, {counts['typing']} typing "
+            f"and {counts['read']} read frames in {results['elapsed']:.2f}s"
+        )
+        self.stdout.write(f"Throughput: {messages / results['elapsed']:.1f} messages/sec")
+        self.stdout.write(
+            f"Delivery latency: p50 {percentile(latencies_ms, 0.5):.1f} ms, "
+            f"p95 {percentile(latencies_ms, 0.95):.1f} ms, "
+            f"max {max(latencies_ms, default=0):.1f} ms"
+        )
+        if messages:
+            self.stdout.write(f"DB queries per message: {results['queries'] / messages:.2f} "
+                              f"({results['queries']} total, all frame types)")
+
+        if results['delivered'] < messages:
+            self.stdout.write(self.style.WARNING(
+                f"{messages - results['delivered']} messages were not delivered before the timeout"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('Benchmark complete'))
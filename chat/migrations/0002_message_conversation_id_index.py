@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-19 07:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', '-id'], name='chat_messag_convers_1a2a58_idx'),
+        ),
+    ]
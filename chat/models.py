@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Case, F, OuterRef, Q, Subquery, When
+from django.db.models.functions import Left
 from django.conf import settings
 from django.utils import timezone
 from vehicles.models import Vehicle
@@ -60,6 +62,30 @@ class Conversation(models.Model):
     def __str__(self):
         return f"Conversation between {self.participant_1.email} and {self.participant_2.email}"
     
+    @classmethod
+    def inbox_for(cls, user):
+        """
+        A user's conversations with everything the inbox list shows, in one
+        statement: both participants and the vehicle are joined, the user's
+        unread counter is picked in SQL and the last message is annotated
+        from correlated subqueries.
+        """
+        last_message = Message.objects.filter(conversation=OuterRef('pk')).order_by('-created_at', '-id')
+        return (
+            cls.objects
+            .filter(Q(participant_1=user) | Q(participant_2=user))
+            .select_related('participant_1', 'participant_2', 'vehicle')
+            .annotate(
+                inbox_unread_count=Case(
+                    When(participant_1=user, then=F('unread_count_p1')),
+                    default=F('unread_count_p2'),
+                ),
+                last_message_content=Subquery(last_message.values(preview=Left('content', 100))[:1]),
+                last_message_created_at=Subquery(last_message.values('created_at')[:1]),
+                last_message_sender_email=Subquery(last_message.values('sender__email')[:1]),
+            )
+        )
+    
     def get_other_participant(self, user):
         """Get the other participant in the conversation"""
         if self.participant_1 == user:
@@ -72,21 +98,23 @@ class Conversation(models.Model):
             return self.unread_count_p1
         return self.unread_count_p2
     
+    def unread_field(self, user):
+        """Name of the unread counter column for a participant"""
+        if self.participant_1_id == getattr(user, 'pk', user):
+            return 'unread_count_p1'
+        return 'unread_count_p2'
+    
     def mark_as_read(self, user):
         """Mark all messages as read for a specific user"""
-        if self.participant_1 == user:
-            self.unread_count_p1 = 0
-        else:
-            self.unread_count_p2 = 0
-        self.save()
+        field = self.unread_field(user)
+        Conversation.objects.filter(pk=self.pk).update(**{field: 0})
+        setattr(self, field, 0)
     
     def increment_unread(self, for_user):
         """Increment unread count for a specific user"""
-        if self.participant_1 == for_user:
-            self.unread_count_p1 += 1
-        else:
-            self.unread_count_p2 += 1
-        self.save()
+        field = self.unread_field(for_user)
+        Conversation.objects.filter(pk=self.pk).update(**{field: F(field) + 1})
+        self.refresh_from_db(fields=[field])
 
 
 class Message(models.Model):
@@ -118,6 +146,8 @@ class Message(models.Model):
         ordering = ['created_at']
         indexes = [
             models.Index(fields=['conversation', 'created_at']),
+            # Keyset pagination of history (chat.consumers.ChatConsumer.get_history)
+            models.Index(fields=['conversation', '-id']),
             models.Index(fields=['sender']),
             models.Index(fields=['is_read']),
             models.Index(fields=['created_at']),
@@ -130,14 +160,21 @@ class Message(models.Model):
         is_new = self.pk is None
         super().save(*args, **kwargs)
         
-        # Update conversation's updated_at and increment unread for recipient
+        # Update conversation's updated_at and increment unread for the
+        # recipient in one atomic UPDATE, so concurrent sends are never lost
         if is_new:
-            self.conversation.updated_at = timezone.now()
-            self.conversation.save()
-            
-            # Increment unread count for the recipient
-            recipient = self.conversation.get_other_participant(self.sender)
-            self.conversation.increment_unread(recipient)
+            sent_by_p1 = Q(participant_1_id=self.sender_id)
+            Conversation.objects.filter(pk=self.conversation_id).update(
+                updated_at=timezone.now(),
+                unread_count_p1=Case(
+                    When(sent_by_p1, then=F('unread_count_p1')),
+                    default=F('unread_count_p1') + 1,
+                ),
+                unread_count_p2=Case(
+                    When(sent_by_p1, then=F('unread_count_p2') + 1),
+                    default=F('unread_count_p2'),
+                ),
+            )
 
 
 class MessageRead(models.Model):
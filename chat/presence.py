@@ -0,0 +1,118 @@
+"""
+Presence Service - Shared online status with heartbeats
+
+Each user has one cache entry listing their open WebSocket connections and
+when each expires. Connections stay alive by heartbeating; a connection
+whose worker died simply expires. Going offline is debounced: the last
+disconnect only starts a grace period, and a reconnect within it (flaky
+mobile networks) produces no offline/online broadcasts at all.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class PresenceService:
+    """
+    Online status per user, shared across workers through the Django cache
+
+    Args:
+        ttl: Seconds a connection stays online without a heartbeat
+        grace: Seconds after the last disconnect before a user is offline
+        cache_alias: Django cache holding presence entries (Redis in production)
+    """
+
+    def __init__(self, ttl=75, grace=10, cache_alias='default'):
+        self.ttl = ttl
+        self.grace = grace
+        self.cache_alias = cache_alias
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    @staticmethod
+    def key(user_id):
+        return f'presence:{user_id}'
+
+    def _load(self, user_id, now):
+        entry = self.cache.get(self.key(user_id)) or {}
+        connections = {
+            channel: expires_at
+            for channel, expires_at in entry.get('connections', {}).items()
+            if expires_at > now
+        }
+        return connections, entry.get('offline_at')
+
+    def _store(self, user_id, connections, offline_at=None):
+        # Read-modify-write of one user's entry only races with that user's
+        # own sockets; the next heartbeat repairs a lost update
+        self.cache.set(
+            self.key(user_id),
+            {'connections': connections, 'offline_at': offline_at},
+            timeout=self.ttl + self.grace,
+        )
+
+    @staticmethod
+    def _is_online(connections, offline_at, now):
+        return bool(connections) or (offline_at is not None and offline_at > now)
+
+    def connect(self, user_id, channel_name, now=None):
+        """Register a connection. Returns True if the user just came online."""
+        now = now or time.time()
+        connections, offline_at = self._load(user_id, now)
+        was_online = self._is_online(connections, offline_at, now)
+        connections[channel_name] = now + self.ttl
+        self._store(user_id, connections)
+        return not was_online
+
+    def heartbeat(self, user_id, channel_name, now=None):
+        """Extend a connection's lifetime"""
+        now = now or time.time()
+        connections, _ = self._load(user_id, now)
+        connections[channel_name] = now + self.ttl
+        self._store(user_id, connections)
+
+    def disconnect(self, user_id, channel_name, now=None):
+        """
+        Remove a connection. Returns True if it was the user's last one; call
+        settle() after ``grace`` seconds to decide whether they went offline.
+        """
+        now = now or time.time()
+        connections, _ = self._load(user_id, now)
+        connections.pop(channel_name, None)
+        offline_at = None if connections else now + self.grace
+        self._store(user_id, connections, offline_at)
+        return not connections
+
+    def settle(self, user_id, now=None):
+        """Returns True if the user is offline once their grace period is over"""
+        now = now or time.time()
+        connections, offline_at = self._load(user_id, now)
+        return not self._is_online(connections, offline_at, now)
+
+    def is_online(self, user_id, now=None):
+        return user_id in self.online_among([user_id], now=now)
+
+    def online_among(self, user_ids, now=None):
+        """Subset of ``user_ids`` currently online, in one cache round trip"""
+        now = now or time.time()
+        user_ids = set(user_ids)
+        entries = self.cache.get_many([self.key(user_id) for user_id in user_ids])
+        online = set()
+        for user_id in user_ids:
+            entry = entries.get(self.key(user_id))
+            if not entry:
+                continue
+            connections = {c: e for c, e in entry.get('connections', {}).items() if e > now}
+            if self._is_online(connections, entry.get('offline_at'), now):
+                online.add(user_id)
+        return online
+
+
+presence = PresenceService(
+    ttl=getattr(settings, 'PRESENCE_TTL', 75),
+    grace=getattr(settings, 'PRESENCE_OFFLINE_GRACE', 10),
+)
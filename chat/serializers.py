@@ -1,5 +1,7 @@
+from django.db import models
 from rest_framework import serializers
 from .models import Conversation, Message, MessageRead
+from .presence import presence
 from accounts.serializers import UserSerializer
 
 
@@ -29,6 +31,25 @@ class MessageSerializer(serializers.ModelSerializer):
         return None
 
 
+class ConversationListSerializerList(serializers.ListSerializer):
+    """
+    Looks up presence for every conversation on the page in one batch
+    """
+    
+    def to_representation(self, data):
+        request = self.context.get('request')
+        if request and request.user and 'online_user_ids' not in self.context:
+            # Evaluate once; the parent iterates the same list
+            data = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+            other_ids = {
+                conversation.participant_2_id if conversation.participant_1_id == request.user.id
+                else conversation.participant_1_id
+                for conversation in data
+            }
+            self.context['online_user_ids'] = presence.online_among(other_ids)
+        return super().to_representation(data)
+
+
 class ConversationListSerializer(serializers.ModelSerializer):
     """
     Lightweight serializer for listing conversations
@@ -45,20 +66,33 @@ class ConversationListSerializer(serializers.ModelSerializer):
             'unread_count', 'vehicle_info', 'created_at', 'updated_at',
             'is_archived'
         ]
+        list_serializer_class = ConversationListSerializerList
     
     def get_other_participant(self, obj):
         request = self.context.get('request')
         if request and request.user:
             other = obj.get_other_participant(request.user)
+            online_user_ids = self.context.get('online_user_ids')
             return {
                 'id': other.id,
                 'email': other.email,
                 'full_name': other.get_full_name() if hasattr(other, 'get_full_name') else other.email,
-                'role': other.role if hasattr(other, 'role') else None
+                'role': other.role if hasattr(other, 'role') else None,
+                'is_online': other.id in online_user_ids if online_user_ids is not None
+                else presence.is_online(other.id)
             }
         return None
     
     def get_last_message(self, obj):
+        if hasattr(obj, 'last_message_created_at'):
+            # Annotated by Conversation.inbox_for
+            if obj.last_message_created_at is None:
+                return None
+            return {
+                'content': obj.last_message_content,
+                'created_at': obj.last_message_created_at,
+                'sender_email': obj.last_message_sender_email
+            }
         last_msg = obj.messages.last()
         if last_msg:
             return {
@@ -69,6 +103,8 @@ class ConversationListSerializer(serializers.ModelSerializer):
         return None
     
     def get_unread_count(self, obj):
+        if hasattr(obj, 'inbox_unread_count'):
+            return obj.inbox_unread_count
         request = self.context.get('request')
         if request and request.user:
             return obj.get_unread_count(request.user)
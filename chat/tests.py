@@ -1,3 +1,442 @@
-from django.test import TestCase
+import asyncio
+import json
+from decimal import Decimal
+from unittest.mock import patch
 
-# Create your tests here.
+import msgpack
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from .consumers import ChatConsumer
+from .models import Conversation, Message, MessageRead
+from .presence import PresenceService, presence
+from .routing import websocket_urlpatterns
+from .typing_indicators import TypingCoalescer
+from vehicles.models import Vehicle
+
+User = get_user_model()
+
+
+class MarkMessagesReadTest(TestCase):
+    """Test batched read receipts in ChatConsumer"""
+
+    def setUp(self):
+        self.buyer = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass12345')
+        self.dealer = User.objects.create_user(username='dealer', email='dealer@example.com', password='pass12345')
+        self.conversation = Conversation.objects.create(participant_1=self.buyer, participant_2=self.dealer)
+        self.messages = [
+            Message.objects.create(conversation=self.conversation, sender=self.dealer, content=f'Offer {i}')
+            for i in range(5)
+        ]
+        self.own = Message.objects.create(conversation=self.conversation, sender=self.buyer, content='Thanks')
+        Conversation.objects.filter(pk=self.conversation.pk).update(unread_count_p1=5, unread_count_p2=1)
+
+        self.consumer = ChatConsumer()
+        self.consumer.conversation_id = self.conversation.id
+        self.consumer.user = self.buyer
+        self.consumer.participant_ids = (self.buyer.id, self.dealer.id)
+
+    def mark_read(self, message_ids):
+        return async_to_sync(self.consumer.mark_messages_read)(message_ids)
+
+    def test_marks_in_three_queries(self):
+        """Test one UPDATE, one receipt insert and one counter update"""
+        ids = [message.id for message in self.messages]
+
+        with self.assertNumQueries(3):
+            read_ids = self.mark_read(ids)
+
+        self.assertEqual(sorted(read_ids), ids)
+        self.assertFalse(Message.objects.filter(id__in=ids, is_read=False).exists())
+        self.assertEqual(MessageRead.objects.filter(user=self.buyer).count(), 5)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.unread_count_p1, 0)
+        self.assertEqual(self.conversation.unread_count_p2, 1)
+
+    def test_only_counts_newly_read_messages(self):
+        """Test already-read and own messages do not decrement the counter"""
+        self.mark_read([self.messages[0].id])
+
+        read_ids = self.mark_read([self.messages[0].id, self.messages[1].id, self.own.id])
+
+        self.assertEqual(read_ids, [self.messages[1].id])
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.unread_count_p1, 3)
+        self.assertFalse(Message.objects.get(pk=self.own.pk).is_read)
+
+
+class SaveMessageTest(TestCase):
+    """Test message sends update unread counters atomically"""
+
+    def setUp(self):
+        self.buyer = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass12345')
+        self.dealer = User.objects.create_user(username='dealer', email='dealer@example.com', password='pass12345')
+        self.conversation = Conversation.objects.create(participant_1=self.buyer, participant_2=self.dealer)
+
+        self.consumer = ChatConsumer()
+        self.consumer.conversation_id = self.conversation.id
+        self.consumer.user = self.dealer
+
+    def test_connect_caches_participants(self):
+        """Test the participant check stores both participant ids"""
+        self.assertTrue(async_to_sync(self.consumer.check_participant)())
+        self.assertEqual(self.consumer.participant_ids, (self.buyer.id, self.dealer.id))
+
+    def test_send_is_insert_plus_one_update(self):
+        """Test a send costs one INSERT and one counter UPDATE"""
+        with self.assertNumQueries(2):
+            async_to_sync(self.consumer.save_message)('Price is firm')
+
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.unread_count_p1, 1)
+        self.assertEqual(self.conversation.unread_count_p2, 0)
+
+    def test_increments_are_not_lost(self):
+        """Test counters are incremented in the database, not from stale copies"""
+        stale = Conversation.objects.get(pk=self.conversation.pk)
+        Message.objects.create(conversation=self.conversation, sender=self.dealer, content='One')
+        Message.objects.create(conversation=stale, sender=self.dealer, content='Two')
+        Message.objects.create(conversation=stale, sender=self.buyer, content='Reply')
+
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.unread_count_p1, 2)
+        self.assertEqual(self.conversation.unread_count_p2, 1)
+
+
+class HistoryTest(TestCase):
+    """Test keyset-paginated history frames"""
+
+    def setUp(self):
+        self.buyer = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass12345')
+        self.dealer = User.objects.create_user(username='dealer', email='dealer@example.com', password='pass12345')
+        self.conversation = Conversation.objects.create(participant_1=self.buyer, participant_2=self.dealer)
+        self.messages = [
+            Message.objects.create(conversation=self.conversation, sender=self.dealer, content=f'Offer {i}')
+            for i in range(5)
+        ]
+
+        self.sent = []
+        self.consumer = ChatConsumer()
+        self.consumer.conversation_id = self.conversation.id
+        self.consumer.user = self.buyer
+
+        async def send(text_data=None, bytes_data=None):
+            self.sent.append(json.loads(text_data) if text_data else msgpack.unpackb(bytes_data))
+        self.consumer.send = send
+
+    def history(self, **frame):
+        async_to_sync(self.consumer.handle_history)(frame)
+        return self.sent.pop()
+
+    def test_pages_walk_back_without_overlap(self):
+        """Test before_id/limit pages return every message once, newest first"""
+        with self.assertNumQueries(1):
+            first = self.history(limit=3)
+        second = self.history(limit=3, before_id=first['next_before_id'])
+
+        ids = [m['id'] for m in first['messages'] + second['messages']]
+        self.assertEqual(ids, [m.id for m in reversed(self.messages)])
+        self.assertTrue(first['has_more'])
+        self.assertFalse(second['has_more'])
+        self.assertIsNone(second['next_before_id'])
+        self.assertEqual(first['messages'][0]['content'], 'Offer 4')
+
+    def test_compact_encodings(self):
+        """Test compact and msgpack frames carry the same rows"""
+        compact = self.history(limit=2, encoding='compact')
+        packed = self.history(limit=2, encoding='msgpack')
+
+        self.assertEqual(compact, packed)
+        self.assertEqual(compact['fields'][:3], ['id', 'sender_id', 'content'])
+        self.assertEqual(compact['rows'][0][:3], [self.messages[4].id, self.dealer.id, 'Offer 4'])
+
+    def test_invalid_request(self):
+        """Test malformed cursors are rejected"""
+        self.assertEqual(self.history(before_id='latest')['type'], 'error')
+
+
+class PresenceServiceTest(TestCase):
+    """Test heartbeat-based presence with debounced transitions"""
+
+    def setUp(self):
+        cache.clear()
+        self.presence = PresenceService(ttl=60, grace=10)
+
+    def test_only_first_connection_comes_online(self):
+        """Test a second socket for an online user is not a transition"""
+        self.assertTrue(self.presence.connect(1, 'socket-a', now=1000))
+        self.assertFalse(self.presence.connect(1, 'socket-b', now=1001))
+        self.assertTrue(self.presence.is_online(1, now=1002))
+
+    def test_reconnect_within_grace_is_silent(self):
+        """Test a quick reconnect produces neither offline nor online"""
+        self.presence.connect(1, 'socket-a', now=1000)
+        self.assertTrue(self.presence.disconnect(1, 'socket-a', now=1005))
+        self.assertFalse(self.presence.connect(1, 'socket-b', now=1008))
+
+        self.assertFalse(self.presence.settle(1, now=1020))
+
+    def test_offline_after_grace(self):
+        """Test the user is offline once the grace period has passed"""
+        self.presence.connect(1, 'socket-a', now=1000)
+        self.presence.disconnect(1, 'socket-a', now=1005)
+
+        self.assertTrue(self.presence.is_online(1, now=1010))
+        self.assertTrue(self.presence.settle(1, now=1016))
+
+    def test_connection_expires_without_heartbeat(self):
+        """Test a socket whose worker died stops counting after the TTL"""
+        self.presence.connect(1, 'socket-a', now=1000)
+        self.presence.heartbeat(1, 'socket-a', now=1050)
+
+        self.assertTrue(self.presence.is_online(1, now=1100))
+        self.assertFalse(self.presence.is_online(1, now=1111))
+
+    def test_online_among(self):
+        """Test the batch lookup returns only online users"""
+        self.presence.connect(1, 'socket-a', now=1000)
+        self.presence.connect(3, 'socket-c', now=1000)
+
+        self.assertEqual(self.presence.online_among([1, 2, 3], now=1001), {1, 3})
+
+
+class ConversationListPresenceTest(APITestCase):
+    """Test the inbox reports the other participant's presence"""
+
+    def setUp(self):
+        cache.clear()
+        self.buyer = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass12345')
+        self.dealer = User.objects.create_user(username='dealer', email='dealer@example.com', password='pass12345')
+        Conversation.objects.create(participant_1=self.buyer, participant_2=self.dealer)
+        self.client.force_authenticate(self.buyer)
+
+    def test_other_participant_online(self):
+        presence.connect(self.dealer.id, 'socket-a')
+
+        response = self.client.get('/api/chat/conversations/')
+
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertTrue(results[0]['other_participant']['is_online'])
+
+
+# Audit rows are written inline under tests and are not the view's queries
+@modify_settings(MIDDLEWARE={'remove': ['audit.middleware.AuditMiddleware']})
+class ConversationInboxTest(APITestCase):
+    """Test the inbox list is one query whatever its size"""
+
+    def setUp(self):
+        cache.clear()
+        self.buyer = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass12345')
+        self.client.force_authenticate(self.buyer)
+        self.count = 0
+
+    def add_conversation(self):
+        self.count += 1
+        dealer = User.objects.create_user(
+            username=f'dealer{self.count}', email=f'dealer{self.count}@example.com', password='pass12345'
+        )
+        vehicle = Vehicle.objects.create(
+            dealer=dealer, make='Toyota', model='Camry', year=2020, vin=f'1HGBH41JXMN10{self.count:04d}',
+            condition='used_good', mileage=50000, color='Blue', price_cad=Decimal('25000.00'),
+            location='Toronto, ON'
+        )
+        conversation = Conversation.objects.create(participant_1=dealer, participant_2=self.buyer, vehicle=vehicle)
+        Message.objects.create(conversation=conversation, sender=dealer, content='Still available')
+        Message.objects.create(conversation=conversation, sender=dealer, content=f'Offer {self.count}')
+        return conversation
+
+    def list_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/chat/conversations/')
+        return response, len(context.captured_queries)
+
+    def test_query_count_is_constant(self):
+        """Test adding conversations adds no queries"""
+        self.add_conversation()
+        _, baseline = self.list_queries()
+        for _ in range(4):
+            self.add_conversation()
+
+        response, queries = self.list_queries()
+
+        self.assertEqual(queries, baseline)
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual(len(results), 5)
+
+    def test_annotated_fields(self):
+        """Test the annotated values match the per-row method fields"""
+        conversation = self.add_conversation()
+
+        response, _ = self.list_queries()
+
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        row = results[0]
+        self.assertEqual(row['last_message']['content'], 'Offer 1')
+        self.assertEqual(row['last_message']['sender_email'], conversation.participant_1.email)
+        self.assertEqual(row['unread_count'], 2)
+        self.assertEqual(row['other_participant']['id'], conversation.participant_1_id)
+        self.assertEqual(row['vehicle_info']['make'], 'Toyota')
+
+    def test_total_unread_count(self):
+        """Test the unread total sums the user's side of each conversation"""
+        first = self.add_conversation()
+        self.add_conversation()
+        Message.objects.create(conversation=first, sender=self.buyer, content='Deal')
+        # Other users' unread messages are not counted
+        other_buyer = User.objects.create_user(
+            username='other_buyer', email='other_buyer@example.com', password='pass12345'
+        )
+        other = self.add_conversation()
+        other.participant_2 = other_buyer
+        other.save(update_fields=['participant_2'])
+        Message.objects.create(conversation=other, sender=other_buyer, content='Mine')
+
+        response = self.client.get('/api/chat/conversations/unread_count/')
+
+        self.assertEqual(response.data['unread_count'], 4)
+
+
+class TypingCoalescerTest(TestCase):
+    """Test typing broadcasts are bounded by time, not keystrokes"""
+
+    def run_scenario(self, scenario):
+        sent = []
+
+        async def broadcast(is_typing):
+            sent.append(is_typing)
+
+        async def run():
+            coalescer = TypingCoalescer(broadcast, interval=0.05, timeout=0.2)
+            await scenario(coalescer)
+
+        asyncio.run(run())
+        return sent
+
+    def test_keystrokes_coalesce_into_one_broadcast(self):
+        """Test repeated typing events broadcast once"""
+        async def scenario(coalescer):
+            for _ in range(50):
+                await coalescer.update(True)
+            await coalescer.stop()
+
+        self.assertEqual(self.run_scenario(scenario), [True, False])
+
+    def test_rapid_toggles_send_latest_state_after_interval(self):
+        """Test changes within the interval collapse into a trailing broadcast"""
+        async def scenario(coalescer):
+            await coalescer.update(True)
+            await coalescer.update(False)
+            await coalescer.update(True)
+            await coalescer.update(False)
+            await asyncio.sleep(0.1)
+
+        self.assertEqual(self.run_scenario(scenario), [True, False])
+
+    def test_typing_expires(self):
+        """Test typing stops by itself after the timeout"""
+        async def scenario(coalescer):
+            await coalescer.update(True)
+            await asyncio.sleep(0.3)
+
+        self.assertEqual(self.run_scenario(scenario), [True, False])
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class UserChatConsumerTest(TestCase):
+    """Test the multiplexed per-user chat socket"""
+
+    def setUp(self):
+        cache.clear()
+        self.buyer = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass12345')
+        self.dealer = User.objects.create_user(username='dealer', email='dealer@example.com', password='pass12345')
+        self.broker = User.objects.create_user(username='broker', email='broker@example.com', password='pass12345')
+        self.first = Conversation.objects.create(participant_1=self.buyer, participant_2=self.dealer)
+        self.second = Conversation.objects.create(participant_1=self.broker, participant_2=self.buyer)
+
+    async def connect(self, user, path='/ws/chat/'):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), path)
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator, await communicator.receive_json_from()
+
+    async def test_one_socket_receives_all_conversations(self):
+        """Test messages from any conversation arrive tagged with its id"""
+        buyer, established = await self.connect(self.buyer)
+        self.assertEqual(established['conversation_ids'], sorted([self.first.id, self.second.id]))
+
+        dealer, _ = await self.connect(self.dealer, f'/ws/chat/{self.first.id}/')
+        frame = await buyer.receive_json_from()
+        self.assertEqual((frame['type'], frame['user_id']), ('status', self.dealer.id))
+
+        await dealer.send_json_to({'type': 'message', 'message': 'Still available'})
+
+        frame = await buyer.receive_json_from()
+        self.assertEqual(frame['type'], 'message')
+        self.assertEqual(frame['conversation_id'], self.first.id)
+
+        await buyer.send_json_to({'type': 'message', 'conversation_id': self.second.id, 'message': 'Hi'})
+        frame = await buyer.receive_json_from()
+        self.assertEqual((frame['conversation_id'], frame['content']), (self.second.id, 'Hi'))
+
+        await dealer.disconnect()
+        await buyer.disconnect()
+
+    async def test_unsubscribed_conversation_rejected(self):
+        """Test frames for other users' conversations are refused"""
+        other = await database_sync_to_async(Conversation.objects.create)(
+            participant_1=self.dealer, participant_2=self.broker
+        )
+        buyer, _ = await self.connect(self.buyer)
+
+        await buyer.send_json_to({'type': 'subscribe', 'conversation_id': other.id})
+        frame = await buyer.receive_json_from()
+        self.assertEqual(frame['type'], 'error')
+
+        await buyer.send_json_to({'type': 'unsubscribe', 'conversation_id': self.first.id})
+        self.assertEqual((await buyer.receive_json_from())['type'], 'unsubscribed')
+        await buyer.send_json_to({'type': 'message', 'conversation_id': self.first.id, 'message': 'Hi'})
+        self.assertEqual((await buyer.receive_json_from())['type'], 'error')
+
+        await buyer.disconnect()
+
+    async def test_silent_connection_expires(self):
+        """Test a socket that sends nothing stops counting after the TTL"""
+        with patch('chat.presence.time') as clock:
+            clock.time.return_value = 1000
+            buyer, _ = await self.connect(self.buyer)
+            # Presence is registered after connection_established is sent
+            self.assertTrue(await buyer.receive_nothing())
+
+            self.assertTrue(presence.is_online(self.buyer.id, now=1000 + presence.ttl - 1))
+            self.assertFalse(presence.is_online(self.buyer.id, now=1000 + presence.ttl + 1))
+            await buyer.disconnect()
+
+    @patch('chat.consumers.HEARTBEAT_INTERVAL', 0)
+    async def test_any_frame_keeps_presence_alive(self):
+        """Test chat frames and heartbeats both extend the connection"""
+        with patch('chat.presence.time') as clock:
+            clock.time.return_value = 1000
+            buyer, _ = await self.connect(self.buyer)
+            # Presence is registered after connection_established is sent
+            self.assertTrue(await buyer.receive_nothing())
+
+            clock.time.return_value = 1060
+            await buyer.send_json_to({'type': 'message', 'conversation_id': self.second.id, 'message': 'Hi'})
+            await buyer.receive_json_from()
+            self.assertTrue(presence.is_online(self.buyer.id, now=1060 + presence.ttl - 1))
+
+            clock.time.return_value = 1120
+            await buyer.send_json_to({'type': 'heartbeat'})
+            self.assertTrue(await buyer.receive_nothing())
+            self.assertTrue(presence.is_online(self.buyer.id, now=1120 + presence.ttl - 1))
+            self.assertFalse(presence.is_online(self.buyer.id, now=1120 + presence.ttl + 1))
+            await buyer.disconnect()
@@ -0,0 +1,78 @@
+"""
+Typing Indicators - Coalesced, self-expiring typing state per connection
+
+Clients send a typing event per keystroke. Only changes of state are
+broadcast, no more than one per ``interval`` seconds (a change arriving
+sooner is sent at the end of the interval, if still a change), and "is
+typing" falls back to "not typing" after ``timeout`` seconds without a
+keystroke. Channel-layer traffic is bounded by time, not by keystrokes.
+"""
+
+import asyncio
+
+
+class TypingCoalescer:
+    """
+    Args:
+        broadcast: Coroutine function called with the new ``is_typing`` state
+        interval: Minimum seconds between broadcasts
+        timeout: Seconds after the last keystroke before typing expires
+    """
+
+    def __init__(self, broadcast, interval=2.0, timeout=6.0):
+        self.broadcast = broadcast
+        self.interval = interval
+        self.timeout = timeout
+        self.sent_state = False
+        self.desired_state = False
+        self.last_sent = None
+        self._flush_task = None
+        self._expiry_task = None
+
+    @staticmethod
+    def _now():
+        return asyncio.get_running_loop().time()
+
+    async def update(self, is_typing):
+        """Record the client's typing state"""
+        if self._expiry_task:
+            self._expiry_task.cancel()
+            self._expiry_task = None
+        if is_typing:
+            self._expiry_task = asyncio.ensure_future(self._expire())
+
+        self.desired_state = is_typing
+        if self._flush_task:
+            # A trailing flush is already scheduled and will send the latest state
+            return
+        wait = 0 if self.last_sent is None else self.last_sent + self.interval - self._now()
+        if wait <= 0:
+            await self._flush()
+        else:
+            self._flush_task = asyncio.ensure_future(self._flush_later(wait))
+
+    async def stop(self):
+        """Cancel pending work and broadcast "not typing" if needed (on disconnect)"""
+        for task in (self._flush_task, self._expiry_task):
+            if task:
+                task.cancel()
+        self._flush_task = self._expiry_task = None
+        self.desired_state = False
+        await self._flush()
+
+    async def _flush(self):
+        if self.desired_state == self.sent_state:
+            return
+        self.sent_state = self.desired_state
+        self.last_sent = self._now()
+        await self.broadcast(self.sent_state)
+
+    async def _flush_later(self, wait):
+        await asyncio.sleep(wait)
+        self._flush_task = None
+        await self._flush()
+
+    async def _expire(self):
+        await asyncio.sleep(self.timeout)
+        self._expiry_task = None
+        await self.update(False)
@@ -2,7 +2,8 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from .models import Conversation, Message, MessageRead
 from .serializers import (
@@ -27,6 +28,8 @@ class ConversationViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Get conversations where current user is a participant"""
         user = self.request.user
+        if self.action == 'list':
+            return Conversation.inbox_for(user)
         return Conversation.objects.filter(
             Q(participant_1=user) | Q(participant_2=user)
         ).select_related('participant_1', 'participant_2', 'vehicle', 'deal')
@@ -110,8 +113,13 @@ class ConversationViewSet(viewsets.ModelViewSet):
     def unread_count(self, request):
         """Get total unread message count for current user"""
         user = request.user
-        conversations = self.get_queryset()
-        total_unread = sum([conv.get_unread_count(user) for conv in conversations])
+        # Summed in SQL from the per-conversation counters
+        total_unread = Conversation.objects.filter(
+            Q(participant_1=user) | Q(participant_2=user)
+        ).aggregate(
+            total=Coalesce(Sum('unread_count_p1', filter=Q(participant_1=user)), 0)
+            + Coalesce(Sum('unread_count_p2', filter=Q(participant_2=user)), 0)
+        )['total']
         return Response({'unread_count': total_unread})
 
 
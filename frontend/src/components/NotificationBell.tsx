@@ -4,6 +4,14 @@ import { Bell, X, Check, Package, DollarSign, Car, FileText, TrendingUp } from '
 import { formatDistanceToNow } from 'date-fns'
 import { useLanguage } from '../contexts/LanguageContext'
 import api from '../lib/api'
+import { notificationSocket, NotificationFrame } from '../services/notificationSocket'
+
+interface NotificationsResponse {
+  notifications: Notification[]
+  unread_count: number
+}
+
+const NOTIFICATION_LIMIT = 20
 
 interface Notification {
   id: number
@@ -25,12 +33,68 @@ export default function NotificationBell() {
   const { data: notificationsData, isLoading } = useQuery({
     queryKey: ['notifications'],
     queryFn: async () => {
-      const response = await api.getNotifications({ limit: 20 })
+      const response = await api.getNotifications({ limit: NOTIFICATION_LIMIT })
       return response
     },
-    refetchInterval: 30000, // Refetch every 30 seconds
   })
 
+  // Pushed updates replace polling; see notifications/consumers.py
+  useEffect(() => {
+    const setUnreadCount = (unreadCount: number) => {
+      queryClient.setQueryData<NotificationsResponse>(['notifications'], (old) =>
+        old ? { ...old, unread_count: unreadCount } : old
+      )
+    }
+
+    const mergeNotifications = (incoming: Notification[], unreadCount: number) => {
+      queryClient.setQueryData<NotificationsResponse>(['notifications'], (old) => {
+        if (!old) {
+          return old
+        }
+        const known = new Set(old.notifications.map((n) => n.id))
+        const fresh = incoming.filter((n) => !known.has(n.id)).sort((a, b) => b.id - a.id)
+        return {
+          notifications: [...fresh, ...old.notifications].slice(0, NOTIFICATION_LIMIT),
+          unread_count: unreadCount,
+        }
+      })
+    }
+
+    const removeFrameHandler = notificationSocket.onFrame((frame: NotificationFrame) => {
+      if (frame.unread_count === undefined) {
+        return
+      }
+      if (frame.type === 'notification' && frame.notification) {
+        mergeNotifications([frame.notification as Notification], frame.unread_count)
+      } else {
+        setUnreadCount(frame.unread_count)
+      }
+    })
+
+    // Frames published while the socket was down are lost; fetch them
+    const removeConnectHandler = notificationSocket.onConnect(async (isReconnect) => {
+      if (!isReconnect) {
+        return
+      }
+      const cached = queryClient.getQueryData<NotificationsResponse>(['notifications'])
+      if (!cached || cached.notifications.length === 0) {
+        queryClient.invalidateQueries({ queryKey: ['notifications'] })
+        return
+      }
+      const lastSeenId = Math.max(...cached.notifications.map((n) => n.id))
+      const response = await api.getNotifications({ limit: NOTIFICATION_LIMIT, after_id: lastSeenId })
+      mergeNotifications(response.notifications, response.unread_count)
+    })
+
+    notificationSocket.connect()
+
+    return () => {
+      removeFrameHandler()
+      removeConnectHandler()
+      notificationSocket.disconnect()
+    }
+  }, [queryClient])
+
   const notifications: Notification[] = notificationsData?.notifications || []
   const unreadCount = notificationsData?.unread_count || 0
 
@@ -0,0 +1,148 @@
+/**
+ * WebSocket Service for Real-Time Notifications
+ *
+ * Connects to /ws/notifications/, which pushes every new notification and
+ * every unread-count change for the signed-in user. Frames sent while the
+ * socket was down are not replayed; connection handlers are told whether
+ * they are running after a reconnect so callers can catch up over REST with
+ * `?after_id=`.
+ */
+
+export interface NotificationFrame {
+  type: 'connection_established' | 'notification';
+  // null for read/delete updates that only change the count
+  notification?: {
+    id: number;
+    type: string;
+    title: string;
+    message: string;
+    is_read: boolean;
+    link?: string;
+    created_at: string;
+  } | null;
+  unread_count?: number;
+  timestamp?: string;
+}
+
+type FrameHandler = (frame: NotificationFrame) => void;
+type ConnectionHandler = (isReconnect: boolean) => void;
+
+export class NotificationSocketService {
+  private ws: WebSocket | null = null;
+  private reconnectAttempts = 0;
+  private maxReconnectAttempts = 5;
+  private reconnectDelay = 1000; // Start with 1 second
+  private frameHandlers: FrameHandler[] = [];
+  private connectionHandlers: ConnectionHandler[] = [];
+  private hasConnected = false;
+  private isIntentionallyClosed = false;
+
+  /**
+   * Connect to the notification socket
+   */
+  connect() {
+    if (this.ws && (this.ws.readyState === WebSocket.OPEN || this.ws.readyState === WebSocket.CONNECTING)) {
+      return;
+    }
+
+    this.isIntentionallyClosed = false;
+
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const wsUrl = `${protocol}//${window.location.host}/ws/notifications/`;
+
+    try {
+      this.ws = new WebSocket(wsUrl);
+
+      this.ws.onopen = () => this.handleOpen();
+      this.ws.onmessage = (event) => this.handleMessage(event);
+      this.ws.onerror = (error) => console.error('[NotificationSocket] Error:', error);
+      this.ws.onclose = () => this.handleClose();
+    } catch (error) {
+      console.error('[NotificationSocket] Connection error:', error);
+      this.scheduleReconnect();
+    }
+  }
+
+  /**
+   * Disconnect from the notification socket
+   */
+  disconnect() {
+    this.isIntentionallyClosed = true;
+
+    if (this.ws) {
+      this.ws.close();
+      this.ws = null;
+    }
+
+    this.reconnectAttempts = 0;
+    this.hasConnected = false;
+  }
+
+  /**
+   * Add frame handler
+   */
+  onFrame(handler: FrameHandler) {
+    this.frameHandlers.push(handler);
+    return () => {
+      this.frameHandlers = this.frameHandlers.filter(h => h !== handler);
+    };
+  }
+
+  /**
+   * Add connection handler
+   */
+  onConnect(handler: ConnectionHandler) {
+    this.connectionHandlers.push(handler);
+    return () => {
+      this.connectionHandlers = this.connectionHandlers.filter(h => h !== handler);
+    };
+  }
+
+  // Private methods
+
+  private handleOpen() {
+    const isReconnect = this.hasConnected;
+    this.hasConnected = true;
+    this.reconnectAttempts = 0;
+
+    this.connectionHandlers.forEach(handler => handler(isReconnect));
+  }
+
+  private handleMessage(event: MessageEvent) {
+    try {
+      const frame: NotificationFrame = JSON.parse(event.data);
+      this.frameHandlers.forEach(handler => handler(frame));
+    } catch (error) {
+      console.error('[NotificationSocket] Failed to parse frame:', error);
+    }
+  }
+
+  private handleClose() {
+    this.ws = null;
+
+    if (!this.isIntentionallyClosed) {
+      this.scheduleReconnect();
+    }
+  }
+
+  private scheduleReconnect() {
+    if (this.reconnectAttempts >= this.maxReconnectAttempts) {
+      console.error('[NotificationSocket] Max reconnection attempts reached');
+      return;
+    }
+
+    this.reconnectAttempts++;
+
+    // Exponential backoff
+    const delay = this.reconnectDelay * Math.pow(2, this.reconnectAttempts - 1);
+
+    setTimeout(() => {
+      if (!this.isIntentionallyClosed) {
+        this.connect();
+      }
+    }, delay);
+  }
+}
+
+// Singleton instance
+export const notificationSocket = new NotificationSocketService();
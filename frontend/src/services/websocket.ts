@@ -21,6 +21,7 @@ export interface ChatMessage {
   reader_id?: number;
   conversation_id?: string;
   message?: string;
+  heartbeat_interval?: number;
 }
 
 type MessageHandler = (message: ChatMessage) => void;
@@ -37,6 +38,7 @@ export class WebSocketService {
   private connectionHandlers: ConnectionHandler[] = [];
   private disconnectionHandlers: ConnectionHandler[] = [];
   private isIntentionallyClosed = false;
+  private heartbeatTimer: ReturnType<typeof setInterval> | null = null;
   
   /**
    * Connect to WebSocket for a conversation
@@ -76,6 +78,7 @@ export class WebSocketService {
   disconnect() {
     console.log('[WebSocket] Disconnecting');
     this.isIntentionallyClosed = true;
+    this.stopHeartbeat();
     
     if (this.ws) {
       this.ws.close();
@@ -197,6 +200,11 @@ export class WebSocketService {
       const data: ChatMessage = JSON.parse(event.data);
       console.log('[WebSocket] Message received:', data.type);
       
+      // The server marks the user offline if the socket stays silent
+      if (data.type === 'connection_established' && data.heartbeat_interval) {
+        this.startHeartbeat(data.heartbeat_interval);
+      }
+      
       // Notify all message handlers
       this.messageHandlers.forEach(handler => handler(data));
     } catch (error) {
@@ -211,6 +219,7 @@ export class WebSocketService {
   private handleClose(event: CloseEvent) {
     console.log('[WebSocket] Closed:', event.code, event.reason);
     this.ws = null;
+    this.stopHeartbeat();
     
     // Notify disconnection handlers
     this.disconnectionHandlers.forEach(handler => handler());
@@ -221,6 +230,23 @@ export class WebSocketService {
     }
   }
   
+  private startHeartbeat(intervalSeconds: number) {
+    this.stopHeartbeat();
+    this.heartbeatTimer = setInterval(() => {
+      // Heartbeats are never queued; a closed socket reconnects instead
+      if (this.isConnected()) {
+        this.ws!.send(JSON.stringify({ type: 'heartbeat' }));
+      }
+    }, intervalSeconds * 1000);
+  }
+  
+  private stopHeartbeat() {
+    if (this.heartbeatTimer !== null) {
+      clearInterval(this.heartbeatTimer);
+      this.heartbeatTimer = null;
+    }
+  }
+  
   private scheduleReconnect() {
     if (this.reconnectAttempts >= this.maxReconnectAttempts) {
       console.error('[WebSocket] Max reconnection attempts reached');
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Notification
+from .models import Notification, NotificationCounter, NotificationDigest
 
 
 class NotificationAdmin(admin.ModelAdmin):
@@ -29,3 +29,23 @@ class NotificationAdmin(admin.ModelAdmin):
 
 
 admin.site.register(Notification, NotificationAdmin)
+
+
+class NotificationCounterAdmin(admin.ModelAdmin):
+    list_display = ['user', 'unread_count', 'updated_at']
+    search_fields = ['user__email']
+    readonly_fields = ['user', 'unread_count', 'updated_at']
+
+
+admin.site.register(NotificationCounter, NotificationCounterAdmin)
+
+
+class NotificationDigestAdmin(admin.ModelAdmin):
+    list_display = ['day', 'user', 'type', 'count']
+    list_filter = ['type', 'day']
+    search_fields = ['user__email']
+    readonly_fields = ['user', 'type', 'day', 'count', 'first_created_at', 'last_created_at', 'updated_at']
+    date_hierarchy = 'day'
+
+
+admin.site.register(NotificationDigest, NotificationDigestAdmin)
@@ -0,0 +1,69 @@
+"""
+WebSocket Consumer for real-time notifications
+
+Pushes new notifications and unread-count changes published by
+notifications.delivery, replacing unread_count polling.
+"""
+
+import json
+import logging
+from typing import Any, Dict
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.utils import timezone
+
+from .counters import get_unread_count
+from .delivery import user_group_name
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationConsumer(AsyncWebsocketConsumer):
+    """
+    WebSocket consumer for a user's notifications.
+
+    Sends the current unread count on connect; afterwards every new
+    notification and every read/delete arrives as a ``notification`` frame
+    carrying the updated ``unread_count``. On reconnect, clients fetch what
+    they missed with ``GET /api/v1/notifications/?after_id=<last seen id>``.
+
+    URL pattern: /ws/notifications/
+    """
+
+    async def connect(self) -> None:
+        """Handle WebSocket connection."""
+        self.user = self.scope.get('user')
+
+        if not self.user or not self.user.is_authenticated:
+            await self.close()
+            return
+
+        self.group_name = user_group_name(self.user.id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+        await self.send(text_data=json.dumps({
+            'type': 'connection_established',
+            'unread_count': await database_sync_to_async(get_unread_count)(self.user.id),
+            'timestamp': timezone.now().isoformat()
+        }))
+
+    async def disconnect(self, code: int) -> None:
+        """Handle WebSocket disconnection."""
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive(self, text_data: str = None, bytes_data: bytes = None) -> None:
+        """Notifications are push-only; client frames are ignored."""
+        logger.debug(f"Ignoring notification socket frame from user {self.user.id}")
+
+    # Personal channel events (group_send to user_<id>)
+
+    async def notify(self, event: Dict[str, Any]) -> None:
+        """Send a notification update to WebSocket."""
+        await self.send(text_data=json.dumps({
+            'type': 'notification',
+            'notification': event.get('notification'),
+            'unread_count': event.get('unread_count')
+        }))
@@ -0,0 +1,113 @@
+"""
+Notification Counters - Denormalized per-user unread counts
+
+Every change to a user's unread notifications adjusts their
+NotificationCounter row with an F() update, so reading the count is a
+primary-key lookup. A user's row is created from a real COUNT the first
+time it is needed; reconcile_unread_counts() repairs drift from writes
+that bypass the adjustments (queryset updates, raw SQL, bulk imports).
+"""
+
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Notification, NotificationCounter
+
+logger = logging.getLogger(__name__)
+
+
+def count_unread(user_id):
+    return Notification.objects.filter(user_id=user_id, is_read=False).count()
+
+
+def _create_counter(user_id):
+    """Initialize a user's counter from their notifications"""
+    try:
+        with transaction.atomic():
+            return NotificationCounter.objects.create(user_id=user_id, unread_count=count_unread(user_id))
+    except IntegrityError:
+        # Another request created it first
+        return NotificationCounter.objects.get(user_id=user_id)
+
+
+def adjust_unread(user_id, delta):
+    """
+    Add ``delta`` to a user's unread count; call after the notification
+    rows have been written
+    """
+    if not delta:
+        return
+    # Without a row there is nothing to adjust: the counter is initialized
+    # from the rows, which already include this change, when first read
+    NotificationCounter.objects.filter(user_id=user_id).update(
+        unread_count=Greatest(F('unread_count') + delta, 0)
+    )
+
+
+def get_unread_count(user_id):
+    """A user's unread notification count, in one primary-key lookup"""
+    count = NotificationCounter.objects.filter(user_id=user_id).values_list('unread_count', flat=True).first()
+    if count is None:
+        count = _create_counter(user_id).unread_count
+    return count
+
+
+def get_unread_counts(user_ids):
+    """Unread counts for many users: {user_id: count}, in at most three queries"""
+    user_ids = set(user_ids)
+    counts = dict(
+        NotificationCounter.objects.filter(user_id__in=user_ids).values_list('user_id', 'unread_count')
+    )
+    missing = user_ids - counts.keys()
+    if missing:
+        initial = dict.fromkeys(missing, 0)
+        initial.update(
+            Notification.objects
+            .filter(user_id__in=missing, is_read=False)
+            .values('user_id')
+            .annotate(total=Count('id'))
+            .values_list('user_id', 'total')
+        )
+        NotificationCounter.objects.bulk_create(
+            [NotificationCounter(user_id=user_id, unread_count=count) for user_id, count in initial.items()],
+            ignore_conflicts=True,
+        )
+        counts.update(initial)
+    return counts
+
+
+def reconcile_unread_counts(user_ids=None):
+    """
+    Reset counters that disagree with the notification rows
+
+    Covers every existing counter (or just ``user_ids``). Returns the
+    number of counters corrected.
+    """
+    counters = NotificationCounter.objects.all()
+    if user_ids is not None:
+        counters = counters.filter(user_id__in=user_ids)
+
+    drifted = counters.annotate(
+        actual=Count('user__notifications', filter=Q(user__notifications__is_read=False))
+    ).exclude(unread_count=F('actual')).values_list('user_id', 'unread_count', 'actual')
+
+    drifted = list(drifted)
+    for user_id, counted, actual in drifted:
+        logger.info(f"Reconciling unread notification count for user {user_id}: {counted} -> {actual}")
+
+    if drifted:
+        # Recount inside the UPDATE so changes since the scan are not undone
+        unread = (
+            Notification.objects
+            .filter(user_id=OuterRef('user_id'), is_read=False)
+            .values('user_id')
+            .annotate(total=Count('id'))
+            .values('total')
+        )
+        NotificationCounter.objects.filter(user_id__in=[row[0] for row in drifted]).update(
+            unread_count=Coalesce(Subquery(unread), 0)
+        )
+    return len(drifted)
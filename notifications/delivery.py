@@ -0,0 +1,83 @@
+"""
+Notification Delivery - Real-time push over Channels
+
+New notifications and unread-count changes are published to the user's
+personal ``user_<id>`` channel group once the surrounding transaction
+commits. NotificationConsumer (and the multiplexed chat socket, which joins
+the same group) forward them to the browser, so clients only call the REST
+endpoints to catch up after reconnecting.
+"""
+
+import asyncio
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+from .counters import get_unread_counts
+from .models import Notification
+from .serializers import NotificationSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def user_group_name(user_id):
+    return f'user_{user_id}'
+
+
+def publish_notification(notification):
+    """Push a new notification and the recipient's unread count on commit"""
+    transaction.on_commit(
+        lambda: _send([(notification.user_id, NotificationSerializer(notification).data)])
+    )
+
+
+def publish_notifications(notification_ids):
+    """
+    Push many new notifications on commit, in one channel layer round
+
+    Only the ids wait for the commit; rows are read back and serialized
+    then, so a large fan-out does not keep every chunk's instances alive.
+    """
+    notification_ids = list(notification_ids)
+    transaction.on_commit(lambda: _send_notifications(notification_ids))
+
+
+def publish_unread_count(user_id):
+    """Push the user's unread count on commit (after reads and deletes)"""
+    transaction.on_commit(lambda: _send([(user_id, None)]))
+
+
+def _send_notifications(notification_ids):
+    notifications = list(Notification.objects.filter(pk__in=notification_ids).order_by('pk'))
+    _send(list(zip(
+        [notification.user_id for notification in notifications],
+        NotificationSerializer(notifications, many=True).data
+    )))
+
+
+def _send(updates):
+    """Send (user_id, notification data or None) updates concurrently"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None or not updates:
+        return
+    counts = get_unread_counts(user_id for user_id, _ in updates)
+
+    async def send_all():
+        return await asyncio.gather(*[
+            channel_layer.group_send(user_group_name(user_id), {
+                'type': 'notify',
+                'notification': notification,
+                'unread_count': counts[user_id],
+            })
+            for user_id, notification in updates
+        ], return_exceptions=True)
+
+    try:
+        errors = [result for result in async_to_sync(send_all)() if isinstance(result, Exception)]
+    except Exception as e:
+        errors = [e]
+    if errors:
+        # Clients resynchronize over REST when they reconnect
+        logger.error(f"Failed to push {len(errors)} of {len(updates)} notification updates: {errors[0]}")
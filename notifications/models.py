@@ -41,6 +41,8 @@ class Notification(models.Model):
         indexes = [
             models.Index(fields=['user', 'is_read']),
             models.Index(fields=['user', '-created_at']),
+            # Retention scans (notifications.retention)
+            models.Index(fields=['type', 'is_read', 'created_at']),
         ]
     
     def __str__(self):
@@ -53,3 +55,58 @@ class Notification(models.Model):
             self.is_read = True
             self.read_at = timezone.now()
             self.save()
+
+
+class NotificationCounter(models.Model):
+    """
+    Denormalized unread notification count per user
+
+    Adjusted atomically as notifications are created, read and deleted
+    (see notifications.counters), so unread counts are a primary-key
+    lookup instead of a COUNT over Notification. A periodic reconciler
+    repairs any drift from bulk writes that bypass the adjustments.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='notification_counter'
+    )
+    unread_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.unread_count} unread"
+
+
+class NotificationDigest(models.Model):
+    """
+    Per-user, per-type daily summary of compacted notifications
+
+    Old read notifications are collapsed into these rows by
+    notifications.retention, keeping the Notification table (and each
+    user's index range in it) small.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notification_digests'
+    )
+    type = models.CharField(max_length=20, choices=Notification.TYPE_CHOICES)
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+    first_created_at = models.DateTimeField()
+    last_created_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'type', 'day'], name='notification_digest_user_type_day_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-day']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.type} - {self.day}: {self.count}"
@@ -0,0 +1,163 @@
+"""
+Notification Retention - Compaction of old read notifications
+
+Read notifications older than their type's retention window are collapsed
+into per-user, per-type daily NotificationDigest rows and deleted. Each
+chunk of rows is summarized and deleted in one transaction, so an
+interrupted run never counts a row twice, and chunks are bounded with a
+pause between them so compaction never issues one large, lock-heavy
+DELETE. Unread notifications are never compacted.
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Notification, NotificationDigest
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETENTION_DAYS = 90
+DEFAULT_DIGEST_RETENTION_DAYS = 730
+
+
+class NotificationRetentionEngine:
+    """
+    Compact expired read notifications into daily digests
+
+    Args:
+        retention_days: Notification type -> days to keep read
+            notifications (falls back to ``default_days``)
+        default_days: Retention for types not listed
+        digest_retention_days: Days to keep digests; None keeps them forever
+        chunk_size: Notifications summarized and deleted per transaction
+        chunk_sleep: Seconds to pause between chunks
+    """
+
+    def __init__(self, retention_days=None, default_days=DEFAULT_RETENTION_DAYS,
+                 digest_retention_days=DEFAULT_DIGEST_RETENTION_DAYS, chunk_size=5000, chunk_sleep=0.1):
+        self.retention_days = retention_days or {}
+        self.default_days = default_days
+        self.digest_retention_days = digest_retention_days
+        self.chunk_size = chunk_size
+        self.chunk_sleep = chunk_sleep
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            retention_days=getattr(settings, 'NOTIFICATION_RETENTION_DAYS', {}),
+            default_days=getattr(settings, 'NOTIFICATION_DEFAULT_RETENTION_DAYS', DEFAULT_RETENTION_DAYS),
+            digest_retention_days=getattr(
+                settings, 'NOTIFICATION_DIGEST_RETENTION_DAYS', DEFAULT_DIGEST_RETENTION_DAYS
+            ),
+            chunk_size=getattr(settings, 'NOTIFICATION_RETENTION_CHUNK_SIZE', 5000),
+            chunk_sleep=getattr(settings, 'NOTIFICATION_RETENTION_CHUNK_SLEEP', 0.1),
+        )
+
+    def get_retention_days(self, notification_type):
+        return self.retention_days.get(notification_type, self.default_days)
+
+    def expired_queryset(self, notification_type, now=None):
+        cutoff = (now or timezone.now()) - timedelta(days=self.get_retention_days(notification_type))
+        return Notification.objects.filter(type=notification_type, is_read=True, created_at__lt=cutoff)
+
+    def compact_chunk(self, pks):
+        """
+        Fold notifications into digests and delete them, atomically
+
+        Returns the number of digest rows created or updated.
+        """
+        with transaction.atomic():
+            groups = (
+                Notification.objects
+                .filter(pk__in=pks)
+                .annotate(day=TruncDate('created_at'))
+                .values('user_id', 'type', 'day')
+                .annotate(count=Count('id'), first=Min('created_at'), last=Max('created_at'))
+            )
+            groups = {(row['user_id'], row['type'], row['day']): row for row in groups}
+
+            existing = NotificationDigest.objects.select_for_update().filter(
+                user_id__in={key[0] for key in groups},
+                type__in={key[1] for key in groups},
+                day__in={key[2] for key in groups},
+            )
+            updated = []
+            for digest in existing:
+                row = groups.pop((digest.user_id, digest.type, digest.day), None)
+                if row is None:
+                    continue
+                digest.count += row['count']
+                digest.first_created_at = min(digest.first_created_at, row['first'])
+                digest.last_created_at = max(digest.last_created_at, row['last'])
+                updated.append(digest)
+
+            if updated:
+                NotificationDigest.objects.bulk_update(
+                    updated, ['count', 'first_created_at', 'last_created_at', 'updated_at']
+                )
+            NotificationDigest.objects.bulk_create([
+                NotificationDigest(
+                    user_id=user_id, type=notification_type, day=day, count=row['count'],
+                    first_created_at=row['first'], last_created_at=row['last'],
+                )
+                for (user_id, notification_type, day), row in groups.items()
+            ])
+            Notification.objects.filter(pk__in=pks).delete()
+        return len(updated) + len(groups)
+
+    def compact(self, notification_type, now=None):
+        """Compact every expired notification of a type. Returns (rows, digests)."""
+        queryset = self.expired_queryset(notification_type, now=now)
+        rows = digests = 0
+        while True:
+            pks = list(queryset.order_by('created_at').values_list('pk', flat=True)[:self.chunk_size])
+            if not pks:
+                break
+            digests += self.compact_chunk(pks)
+            rows += len(pks)
+            if len(pks) < self.chunk_size:
+                break
+            if self.chunk_sleep:
+                time.sleep(self.chunk_sleep)
+        return rows, digests
+
+    def purge_digests(self, now=None):
+        """Delete digests past their retention window. Returns rows deleted."""
+        if self.digest_retention_days is None:
+            return 0
+        cutoff = (now or timezone.now()) - timedelta(days=self.digest_retention_days)
+        deleted, _ = NotificationDigest.objects.filter(day__lt=cutoff.date()).delete()
+        return deleted
+
+    def run(self, types=None, now=None, dry_run=False):
+        """
+        Compact every notification type, then purge expired digests
+
+        Returns a list of ``{'type', 'rows', 'digests'}`` dicts.
+        """
+        results = []
+        for notification_type in types or [choice for choice, _ in Notification.TYPE_CHOICES]:
+            result = {'type': notification_type, 'digests': 0}
+            if dry_run:
+                result['rows'] = self.expired_queryset(notification_type, now=now).count()
+            else:
+                result['rows'], result['digests'] = self.compact(notification_type, now=now)
+                if result['rows']:
+                    logger.info(
+                        f"Compacted {result['rows']} {notification_type} notifications "
+                        f"into {result['digests']} digest rows"
+                    )
+            results.append(result)
+
+        if not dry_run:
+            purged = self.purge_digests(now=now)
+            if purged:
+                logger.info(f"Purged {purged} expired notification digests")
+        return results
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Notification
+from .models import Notification, NotificationDigest
 
 
 class NotificationSerializer(serializers.ModelSerializer):
@@ -22,3 +22,14 @@ class NotificationSerializer(serializers.ModelSerializer):
             'read_at'
         ]
         read_only_fields = ['id', 'created_at', 'read_at']
+
+
+class NotificationDigestSerializer(serializers.ModelSerializer):
+    """
+    Serializer for NotificationDigest model.
+    """
+    
+    class Meta:
+        model = NotificationDigest
+        fields = ['type', 'day', 'count', 'first_created_at', 'last_created_at']
+        read_only_fields = fields
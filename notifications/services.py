@@ -0,0 +1,78 @@
+"""
+Notification Service - Bulk notification delivery
+"""
+
+from django.db import transaction
+from django.db.models import F, QuerySet
+
+from .delivery import publish_notifications
+from .models import Notification, NotificationCounter
+
+FAN_OUT_CHUNK_SIZE = 1000
+
+
+class NotificationService:
+    """Service class for creating notifications in bulk"""
+
+    @staticmethod
+    def fan_out(users, notification_type, title, message, link=None, related_id=None,
+                related_model=None, chunk_size=FAN_OUT_CHUNK_SIZE):
+        """
+        Create the same notification for many users
+
+        Rows are inserted with bulk_create in chunks inside one transaction,
+        unread counters are bumped with one UPDATE per chunk and real-time
+        pushes go out after commit. bulk_create sends no signals, so this is
+        the only bookkeeping the rows get.
+
+        Args:
+            users: QuerySet of users, or an iterable of users or user ids
+            notification_type: Type of notification ('system', 'deal', etc.)
+            title: Notification title
+            message: Notification message
+            link: Optional link to related resource
+            related_id: Optional ID of related object
+            related_model: Optional model name of related object
+            chunk_size: Rows per INSERT
+
+        Returns:
+            Number of notifications created
+        """
+        if isinstance(users, QuerySet):
+            user_ids = users.values_list('pk', flat=True).iterator(chunk_size=chunk_size)
+        else:
+            user_ids = (getattr(user, 'pk', user) for user in users)
+
+        created = 0
+        with transaction.atomic():
+            for chunk in _chunks(user_ids, chunk_size):
+                notifications = Notification.objects.bulk_create([
+                    Notification(
+                        user_id=user_id,
+                        type=notification_type,
+                        title=title,
+                        message=message,
+                        link=link,
+                        related_id=related_id,
+                        related_model=related_model
+                    )
+                    for user_id in chunk
+                ])
+                # Users without a counter row get one counted from their rows
+                NotificationCounter.objects.filter(user_id__in=chunk).update(
+                    unread_count=F('unread_count') + 1
+                )
+                publish_notifications(notification.pk for notification in notifications)
+                created += len(notifications)
+        return created
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -1,7 +1,7 @@
 """
 Signals for creating notifications when important events occur.
 """
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_init, post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 
@@ -10,6 +10,8 @@ from commissions.models import Commission
 from shipments.models import Shipment
 from vehicles.models import Vehicle
 
+from .counters import adjust_unread
+from .delivery import publish_notification
 from .models import Notification
 
 User = get_user_model()
@@ -21,9 +23,9 @@ def create_lead_notification(sender, instance, created, **kwargs):
     if created:
         # Notify broker if assigned
         if instance.broker:
-            Notification.objects.create(
+            create_notification(
                 user=instance.broker,
-                type='lead',
+                notification_type='lead',
                 title=f"New Lead Assigned",
                 message=f"A new lead has been assigned to you for {instance.vehicle}.",
                 link=f'/leads/{instance.id}',
@@ -38,9 +40,9 @@ def create_deal_notification(sender, instance, created, **kwargs):
     if not created:
         # Deal status changed
         if instance.buyer:
-            Notification.objects.create(
+            create_notification(
                 user=instance.buyer,
-                type='deal',
+                notification_type='deal',
                 title=f"Deal Updated: {instance.vehicle.make} {instance.vehicle.model}",
                 message=f"Deal status changed to {instance.get_status_display()}.",
                 link=f'/deals/{instance.id}',
@@ -53,9 +55,9 @@ def create_deal_notification(sender, instance, created, **kwargs):
 def create_commission_notification(sender, instance, created, **kwargs):
     """Create notification when a commission is earned"""
     if created and instance.recipient and instance.commission_type == 'broker':
-        Notification.objects.create(
+        create_notification(
             user=instance.recipient,
-            type='commission',
+            notification_type='commission',
             title="Commission Earned!",
             message=f"You earned a commission of ${instance.amount_cad:,.2f} on deal #{instance.deal.id}.",
             link=f'/commissions',
@@ -70,9 +72,9 @@ def create_shipment_notification(sender, instance, created, **kwargs):
     if not created:
         # Shipment status changed
         if instance.deal and instance.deal.buyer:
-            Notification.objects.create(
+            create_notification(
                 user=instance.deal.buyer,
-                type='shipment',
+                notification_type='shipment',
                 title=f"Shipment Update: {instance.tracking_number}",
                 message=f"Shipment status changed to {instance.get_status_display()}.",
                 link=f'/shipments/{instance.id}',
@@ -91,11 +93,39 @@ def create_vehicle_notification(sender, instance, created, **kwargs):
         pass
 
 
+@receiver(post_init, sender=Notification)
+def remember_read_state(sender, instance, **kwargs):
+    # Read from __dict__ so a deferred field is not fetched
+    instance._counted_is_read = instance.__dict__.get('is_read')
+
+
+@receiver(post_save, sender=Notification)
+def count_unread_on_save(sender, instance, created, **kwargs):
+    """Keep the recipient's unread counter in step with the row"""
+    if created:
+        delta = 0 if instance.is_read else 1
+    elif instance._counted_is_read is None or instance._counted_is_read == instance.is_read:
+        delta = 0
+    else:
+        delta = -1 if instance.is_read else 1
+    adjust_unread(instance.user_id, delta)
+    instance._counted_is_read = instance.is_read
+
+
+@receiver(post_delete, sender=Notification)
+def count_unread_on_delete(sender, instance, **kwargs):
+    if not instance.is_read:
+        adjust_unread(instance.user_id, -1)
+
+
 # Helper function to manually create notifications
 def create_notification(user, notification_type, title, message, link=None, related_id=None, related_model=None):
     """
     Helper function to manually create notifications.
     
+    The notification is pushed to the user's open sockets once the
+    surrounding transaction commits.
+    
     Args:
         user: User object to receive the notification
         notification_type: Type of notification ('lead', 'deal', 'commission', etc.)
@@ -105,7 +135,7 @@ def create_notification(user, notification_type, title, message, link=None, rela
         related_id: Optional ID of related object
         related_model: Optional model name of related object
     """
-    return Notification.objects.create(
+    notification = Notification.objects.create(
         user=user,
         type=notification_type,
         title=title,
@@ -114,3 +144,5 @@ def create_notification(user, notification_type, title, message, link=None, rela
         related_id=related_id,
         related_model=related_model
     )
+    publish_notification(notification)
+    return notification
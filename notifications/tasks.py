@@ -0,0 +1,50 @@
+from celery import shared_task
+from django.contrib.auth import get_user_model
+
+from .counters import reconcile_unread_counts
+from .retention import NotificationRetentionEngine
+from .services import NotificationService
+
+User = get_user_model()
+
+
+@shared_task
+def reconcile_notification_counters():
+    """
+    Periodic task to repair drift in the denormalized unread notification
+    counters. Runs hourly.
+    """
+    corrected = reconcile_unread_counts()
+    return f"Reconciled {corrected} notification counters"
+
+
+@shared_task
+def fan_out_notification(notification_type, title, message, link=None, related_id=None,
+                         related_model=None, user_ids=None, user_filters=None):
+    """
+    Create a notification for many users in the background.
+    Targets ``user_ids`` if given, otherwise every active user matching
+    ``user_filters`` (e.g. {"role": "dealer"}), so system-wide
+    announcements need not pass 100k+ ids through the broker.
+    """
+    if user_ids is not None:
+        users = user_ids
+    else:
+        users = User.objects.filter(is_active=True, **(user_filters or {}))
+
+    created = NotificationService.fan_out(
+        users, notification_type, title, message,
+        link=link, related_id=related_id, related_model=related_model
+    )
+    return f"Created {created} notifications"
+
+
+@shared_task
+def compact_old_notifications(dry_run=False):
+    """
+    Fold expired read notifications into daily digests and delete them.
+    Runs daily; see notifications.retention.NotificationRetentionEngine
+    """
+    results = NotificationRetentionEngine.from_settings().run(dry_run=dry_run)
+    total = sum(result['rows'] for result in results)
+    return f"Compacted {total} notifications"
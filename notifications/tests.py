@@ -0,0 +1,243 @@
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from .counters import get_unread_count, reconcile_unread_counts
+from .models import Notification, NotificationCounter, NotificationDigest
+from .retention import NotificationRetentionEngine
+from .routing import websocket_urlpatterns
+from .services import NotificationService
+from .signals import create_notification
+
+User = get_user_model()
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class NotificationPushTest(TestCase):
+    """Test notifications are pushed to open sockets on commit"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass12345')
+        Notification.objects.create(user=self.user, type='system', title='Welcome', message='Hello')
+
+    async def connect(self):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/notifications/')
+        communicator.scope['user'] = self.user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    def notify(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_notification(self.user, 'deal', 'Deal Updated', 'Deal status changed to Paid.')
+
+    async def test_connect_sends_unread_count(self):
+        socket = await self.connect()
+
+        frame = await socket.receive_json_from()
+
+        self.assertEqual((frame['type'], frame['unread_count']), ('connection_established', 1))
+        await socket.disconnect()
+
+    async def test_new_notification_pushed_with_count(self):
+        socket = await self.connect()
+        await socket.receive_json_from()
+
+        notification = await database_sync_to_async(self.notify)()
+
+        frame = await socket.receive_json_from()
+        self.assertEqual(frame['type'], 'notification')
+        self.assertEqual(frame['notification']['id'], notification.id)
+        self.assertEqual(frame['unread_count'], 2)
+        await socket.disconnect()
+
+    async def test_nothing_pushed_before_commit(self):
+        socket = await self.connect()
+        await socket.receive_json_from()
+
+        await database_sync_to_async(create_notification)(self.user, 'deal', 'Deal Updated', 'Rolled back')
+
+        self.assertTrue(await socket.receive_nothing())
+        await socket.disconnect()
+
+
+class NotificationCatchUpTest(APITestCase):
+    """Test clients can fetch only what they missed while disconnected"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass12345')
+        self.client.force_authenticate(self.user)
+        self.notifications = [
+            Notification.objects.create(user=self.user, type='system', title=f'Notice {i}', message='Hello')
+            for i in range(3)
+        ]
+
+    def test_after_id(self):
+        response = self.client.get(f'/api/v1/notifications/?after_id={self.notifications[0].id}')
+
+        ids = sorted(n['id'] for n in response.data['notifications'])
+        self.assertEqual(ids, [n.id for n in self.notifications[1:]])
+        self.assertEqual(response.data['unread_count'], 3)
+
+    def test_invalid_after_id(self):
+        response = self.client.get('/api/v1/notifications/?after_id=latest')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class UnreadCounterTest(APITestCase):
+    """Test the denormalized unread counter tracks every change"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass12345')
+        self.client.force_authenticate(self.user)
+        self.notifications = [
+            Notification.objects.create(user=self.user, type='system', title=f'Notice {i}', message='Hello')
+            for i in range(3)
+        ]
+
+    def unread(self):
+        return self.client.get('/api/v1/notifications/unread-count/').data['unread_count']
+
+    def test_initialized_from_rows(self):
+        self.assertFalse(NotificationCounter.objects.filter(user=self.user).exists())
+
+        self.assertEqual(self.unread(), 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_unread_count(self.user.id), 3)
+
+    def test_create_read_and_delete(self):
+        self.unread()
+        create_notification(self.user, 'deal', 'Deal Updated', 'Deal status changed to Paid.')
+        self.assertEqual(self.unread(), 4)
+
+        self.client.post(f'/api/v1/notifications/{self.notifications[0].id}/read/')
+        self.client.post(f'/api/v1/notifications/{self.notifications[0].id}/read/')
+        self.assertEqual(self.unread(), 3)
+
+        self.client.delete(f'/api/v1/notifications/{self.notifications[1].id}/delete/')
+        self.client.delete(f'/api/v1/notifications/{self.notifications[0].id}/delete/')
+        self.assertEqual(self.unread(), 2)
+
+        self.client.post('/api/v1/notifications/mark-all-read/')
+        self.assertEqual(self.unread(), 0)
+
+    def test_reconcile_repairs_drift(self):
+        self.unread()
+        Notification.objects.filter(id=self.notifications[0].id).update(is_read=True)
+
+        self.assertEqual(reconcile_unread_counts(), 1)
+        self.assertEqual(self.unread(), 2)
+        self.assertEqual(reconcile_unread_counts(), 0)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class FanOutTest(TestCase):
+    """Test bulk notification fan-out"""
+
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(username=f'dealer{i}', email=f'dealer{i}@example.com', password='pass12345')
+            for i in range(5)
+        ]
+        Notification.objects.create(user=self.users[0], type='system', title='Welcome', message='Hello')
+        get_unread_count(self.users[0].id)
+
+    def fan_out(self, users, chunk_size=2):
+        with self.captureOnCommitCallbacks(execute=True):
+            return NotificationService.fan_out(
+                users, 'system', 'Maintenance', 'Scheduled downtime tonight.', chunk_size=chunk_size
+            )
+
+    def test_queries_scale_with_chunks(self):
+        queryset = User.objects.filter(username__startswith='dealer')
+        # Savepoint pair and user ids, then per chunk of two: INSERT,
+        # counter UPDATE, and the push's row read, counter read,
+        # initializing COUNT and counter INSERT
+        with self.assertNumQueries(3 + 3 * 6):
+            created = self.fan_out(queryset)
+
+        self.assertEqual(created, 5)
+        self.assertEqual(Notification.objects.filter(title='Maintenance').count(), 5)
+
+    def test_pending_pushes_hold_only_ids(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            NotificationService.fan_out(self.users, 'system', 'Maintenance', 'Tonight.', chunk_size=2)
+
+        captured = [cell.cell_contents for callback in callbacks for cell in callback.__closure__]
+        self.assertEqual(len(callbacks), 3)
+        self.assertTrue(all(isinstance(pk, int) for ids in captured for pk in ids))
+
+    def test_counters_and_pushes(self):
+        async def listen():
+            communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/notifications/')
+            communicator.scope['user'] = self.users[0]
+            await communicator.connect()
+            await communicator.receive_json_from()
+            await database_sync_to_async(self.fan_out)([self.users[0], self.users[1].id])
+            frame = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return frame
+
+        frame = async_to_sync(listen)()
+
+        self.assertEqual((frame['notification']['title'], frame['unread_count']), ('Maintenance', 2))
+        self.assertEqual(get_unread_count(self.users[0].id), 2)
+        self.assertEqual(get_unread_count(self.users[1].id), 1)
+
+
+class NotificationRetentionTest(APITestCase):
+    """Test old read notifications are compacted into daily digests"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass12345')
+        self.now = timezone.now()
+        self.engine = NotificationRetentionEngine(
+            retention_days={'system': 30}, default_days=90, chunk_size=2, chunk_sleep=0
+        )
+
+    def add(self, notification_type, days_ago, is_read=True):
+        notification = Notification.objects.create(
+            user=self.user, type=notification_type, title='Notice', message='Hello', is_read=is_read
+        )
+        Notification.objects.filter(pk=notification.pk).update(created_at=self.now - timedelta(days=days_ago))
+        return notification
+
+    def test_compacts_per_type_window(self):
+        old = [self.add('system', 40) for _ in range(3)]
+        kept = [self.add('system', 10), self.add('system', 40, is_read=False), self.add('deal', 40)]
+
+        results = self.engine.run(types=['system', 'deal'], now=self.now)
+
+        self.assertEqual({r['type']: r['rows'] for r in results}, {'system': 3, 'deal': 0})
+        self.assertFalse(Notification.objects.filter(pk__in=[n.pk for n in old]).exists())
+        self.assertEqual(Notification.objects.filter(pk__in=[n.pk for n in kept]).count(), 3)
+        digest = NotificationDigest.objects.get(user=self.user, type='system')
+        self.assertEqual(digest.count, 3)
+
+    def test_reruns_add_to_existing_digest(self):
+        self.add('system', 40)
+        self.engine.run(types=['system'], now=self.now)
+        self.add('system', 40)
+
+        self.engine.run(types=['system'], now=self.now)
+
+        self.assertEqual(NotificationDigest.objects.get(user=self.user).count, 2)
+
+    def test_dry_run_and_digest_endpoint(self):
+        self.add('system', 40)
+        self.assertEqual(self.engine.run(types=['system'], now=self.now, dry_run=True)[0]['rows'], 1)
+        self.assertEqual(Notification.objects.count(), 1)
+
+        self.engine.run(types=['system'], now=self.now)
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/v1/notifications/digests/')
+
+        self.assertEqual(response.data['digests'][0]['count'], 1)
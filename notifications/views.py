@@ -5,8 +5,10 @@ from rest_framework.response import Response
 from django.utils import timezone
 from django.db.models import Q
 
-from .models import Notification
-from .serializers import NotificationSerializer
+from .counters import adjust_unread, get_unread_count
+from .delivery import publish_unread_count
+from .models import Notification, NotificationDigest
+from .serializers import NotificationDigestSerializer, NotificationSerializer
 
 
 @api_view(['GET'])
@@ -19,6 +21,8 @@ def list_notifications(request):
     - unread_only: boolean (default: false) - Return only unread notifications
     - limit: int (default: 50) - Maximum number of notifications to return
     - type: string - Filter by notification type
+    - after_id: int - Only notifications newer than this id (catch-up after
+      a notification socket reconnects)
     """
     user = request.user
     
@@ -34,6 +38,17 @@ def list_notifications(request):
     if notification_type:
         queryset = queryset.filter(type=notification_type)
     
+    # Catch up from the last notification the client saw
+    after_id = request.GET.get('after_id')
+    if after_id:
+        try:
+            queryset = queryset.filter(id__gt=int(after_id))
+        except ValueError:
+            return Response(
+                {'error': 'after_id must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    
     # Limit results
     limit = int(request.GET.get('limit', 50))
     queryset = queryset[:limit]
@@ -41,7 +56,7 @@ def list_notifications(request):
     serializer = NotificationSerializer(queryset, many=True)
     
     # Also return unread count
-    unread_count = Notification.objects.filter(user=user, is_read=False).count()
+    unread_count = get_unread_count(user.id)
     
     return Response({
         'notifications': serializer.data,
@@ -60,7 +75,9 @@ def mark_notification_read(request, notification_id):
             id=notification_id,
             user=request.user
         )
-        notification.mark_as_read()
+        if not notification.is_read:
+            notification.mark_as_read()
+            publish_unread_count(request.user.id)
         
         serializer = NotificationSerializer(notification)
         return Response(serializer.data)
@@ -88,6 +105,10 @@ def mark_all_read(request):
         is_read=True,
         read_at=timezone.now()
     )
+    if updated_count:
+        # Queryset updates send no signals
+        adjust_unread(user.id, -updated_count)
+        publish_unread_count(user.id)
     
     return Response({
         'success': True,
@@ -107,6 +128,8 @@ def delete_notification(request, notification_id):
             user=request.user
         )
         notification.delete()
+        if not notification.is_read:
+            publish_unread_count(request.user.id)
         
         return Response({'success': True})
         
@@ -123,9 +146,26 @@ def unread_count(request):
     """
     Get the count of unread notifications for the authenticated user.
     """
-    count = Notification.objects.filter(
-        user=request.user,
-        is_read=False
-    ).count()
+    return Response({'unread_count': get_unread_count(request.user.id)})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def list_digests(request):
+    """
+    List daily summaries of old notifications that retention compacted.
+    
+    Query Parameters:
+    - limit: int (default: 50) - Maximum number of digests to return
+    - type: string - Filter by notification type
+    """
+    queryset = NotificationDigest.objects.filter(user=request.user)
+    
+    notification_type = request.GET.get('type')
+    if notification_type:
+        queryset = queryset.filter(type=notification_type)
+    
+    limit = int(request.GET.get('limit', 50))
+    serializer = NotificationDigestSerializer(queryset[:limit], many=True)
     
-    return Response({'unread_count': count})
+    return Response({'digests': serializer.data})
@@ -1,18 +1,22 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from django.db.models import Sum, Count, Avg, Q
+from django.db.models import Sum, Count, Avg, Q, DateField
+from django.db.models.functions import Trunc
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, time, timedelta
 from decimal import Decimal
+from dateutil.relativedelta import relativedelta
 from vehicles.models import Vehicle
 from deals.models import Deal, Lead
 from commissions.models import Commission
 from shipments.models import Shipment
+from analytics.cache import cached_analytics
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cached_analytics('analytics_stats')
 def get_analytics_stats(request):
     """Get comprehensive analytics statistics"""
     user = request.user
@@ -114,12 +118,42 @@ def get_analytics_stats(request):
     })
 
 
+# Chart granularities: step between buckets and label format. Labels carry
+# the year since windows of up to MAX_CHART_MONTHS span several years.
+CHART_GRANULARITIES = {
+    'day': (relativedelta(days=1), '%b %d %Y'),
+    'week': (relativedelta(weeks=1), '%b %d %Y'),
+    'month': (relativedelta(months=1), '%b %Y'),
+}
+MAX_CHART_MONTHS = 24
+
+
+def _chart_window_start(today, months, granularity):
+    """First bucket of a chart window spanning ``months`` calendar months."""
+    start = today.replace(day=1) - relativedelta(months=months - 1)
+    if granularity == 'week':
+        start -= timedelta(days=start.weekday())
+    return start
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cached_analytics('revenue_chart')
 def get_revenue_chart(request):
-    """Get revenue and deals data for the last 6 months"""
+    """
+    Get revenue and deals data over calendar-aligned periods.
+    Query params: months (window length, default 6), granularity (day/week/month)
+    """
     user = request.user
-    now = timezone.now()
+    granularity = request.GET.get('granularity', 'month')
+    if granularity not in CHART_GRANULARITIES:
+        granularity = 'month'
+    try:
+        months = int(request.GET.get('months', 6))
+    except (TypeError, ValueError):
+        months = 6
+    months = max(1, min(months, MAX_CHART_MONTHS))
+    step, label_format = CHART_GRANULARITIES[granularity]
     
     # Filter based on user role
     if user.role == 'dealer':
@@ -129,35 +163,43 @@ def get_revenue_chart(request):
     else:
         deals_qs = Deal.objects.all()
     
+    today = timezone.localdate()
+    start = _chart_window_start(today, months, granularity)
+    start_dt = timezone.make_aware(datetime.combine(start, time.min))
+    
+    # Single grouped query; truncation happens in the active timezone
+    rows = (
+        deals_qs
+        .filter(created_at__gte=start_dt)
+        .annotate(period=Trunc('created_at', granularity, output_field=DateField()))
+        .values('period')
+        .annotate(
+            revenue=Sum('agreed_price_cad', filter=Q(status__in=['completed', 'shipped'])),
+            deals=Count('id'),
+        )
+        .order_by('period')
+    )
+    totals = {row['period']: row for row in rows}
+    
+    # Fill gaps so every period in the window is present
     data = []
-    months = ['Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-    
-    for i in range(6):
-        month_start = now - timedelta(days=(6-i)*30)
-        month_end = now - timedelta(days=(5-i)*30)
-        
-        revenue = deals_qs.filter(
-            status__in=['completed', 'shipped'],
-            created_at__gte=month_start,
-            created_at__lt=month_end
-        ).aggregate(total=Sum('agreed_price_cad'))['total'] or Decimal('0')
-        
-        deals_count = deals_qs.filter(
-            created_at__gte=month_start,
-            created_at__lt=month_end
-        ).count()
-        
+    period = start
+    while period <= today:
+        row = totals.get(period, {})
         data.append({
-            'month': months[i],
-            'revenue': float(revenue),
-            'deals': deals_count
+            'period': period.isoformat(),
+            'month': period.strftime(label_format),
+            'revenue': float(row.get('revenue') or 0),
+            'deals': row.get('deals', 0),
         })
+        period += step
     
     return Response(data)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cached_analytics('pipeline_chart')
 def get_pipeline_chart(request):
     """Get deal pipeline distribution"""
     user = request.user
@@ -194,6 +236,7 @@ def get_pipeline_chart(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cached_analytics('recent_activities')
 def get_recent_activities(request):
     """Get recent activities across all entities"""
     user = request.user
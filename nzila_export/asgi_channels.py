@@ -22,6 +22,7 @@ django_asgi_app = get_asgi_application()
 
 # Import routing after Django initialization
 from chat import routing as chat_routing
+from notifications import routing as notifications_routing
 
 application = ProtocolTypeRouter({
     # HTTP protocol (standard Django)
@@ -31,7 +32,8 @@ application = ProtocolTypeRouter({
     "websocket": AllowedHostsOriginValidator(
         AuthMiddlewareStack(
             URLRouter(
-                chat_routing.websocket_urlpatterns
+                chat_routing.websocket_urlpatterns +
+                notifications_routing.websocket_urlpatterns
             )
         )
     ),
@@ -35,6 +35,14 @@ app.conf.beat_schedule = {
         'task': 'commissions.tasks.process_pending_commissions',
         'schedule': crontab(hour=10, minute=0, day_of_week='monday'),  # Weekly on Monday
     },
+    'reconcile-notification-counters': {
+        'task': 'notifications.tasks.reconcile_notification_counters',
+        'schedule': crontab(minute=15),  # Hourly
+    },
+    'compact-old-notifications': {
+        'task': 'notifications.tasks.compact_old_notifications',
+        'schedule': crontab(hour=3, minute=0),  # Daily at 3 AM
+    },
     'cleanup-old-audit-logs': {
         'task': 'nzila_export.tasks.cleanup_old_audit_logs',
         'schedule': crontab(hour=2, minute=0, day_of_month=1),  # Monthly cleanup
@@ -11,11 +11,15 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# True under `manage.py test` and pytest
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/6.0/howto/deployment/checklist/
@@ -315,3 +319,87 @@ if SENTRY_DSN:
         # Include request headers and IP for users (PII data)
         send_default_pii=True,
     )
+
+# Analytics response cache (analytics/cache.py)
+# Responses are fresh for SOFT_TTL seconds, then served stale for up to
+# STALE_TTL seconds while a single request recomputes them
+ANALYTICS_CACHE_SOFT_TTL = config('ANALYTICS_CACHE_SOFT_TTL', default=300, cast=int)
+ANALYTICS_CACHE_STALE_TTL = config('ANALYTICS_CACHE_STALE_TTL', default=1800, cast=int)
+# Seconds before the in-process deal snapshot (analytics/olap.py) is rebuilt
+ANALYTICS_SNAPSHOT_TTL = config('ANALYTICS_SNAPSHOT_TTL', default=60, cast=int)
+
+# Audit write pipeline (audit/writer.py)
+# API access logs are queued and bulk-inserted by a background thread.
+# When the queue is full records are dropped, or appended to
+# AUDIT_WRITE_SPILL_PATH (NDJSON) and replayed later if OVERFLOW is 'spill'.
+# Rows the database rejects, and spilled records still failing after
+# MAX_REPLAYS replays, go to AUDIT_WRITE_SPILL_PATH + '.dead'.
+# Tests write inline: a writer thread must not touch the test database
+# while a TestCase transaction holds it.
+AUDIT_ASYNC_WRITES = config('AUDIT_ASYNC_WRITES', default=not TESTING, cast=bool)
+AUDIT_WRITE_BATCH_SIZE = config('AUDIT_WRITE_BATCH_SIZE', default=200, cast=int)
+AUDIT_WRITE_FLUSH_INTERVAL = config('AUDIT_WRITE_FLUSH_INTERVAL', default=1.0, cast=float)
+AUDIT_WRITE_QUEUE_SIZE = config('AUDIT_WRITE_QUEUE_SIZE', default=10000, cast=int)
+AUDIT_WRITE_OVERFLOW = config('AUDIT_WRITE_OVERFLOW', default='drop')
+AUDIT_WRITE_SPILL_PATH = config('AUDIT_WRITE_SPILL_PATH', default=str(BASE_DIR / 'audit_spill.ndjson'))
+AUDIT_WRITE_MAX_REPLAYS = config('AUDIT_WRITE_MAX_REPLAYS', default=5, cast=int)
+
+# API access log sampling (audit/policy.py)
+# Mutating requests and non-2xx responses are always logged. Successful reads
+# are logged at the first matching (path regex, rate); the rest are counted
+# per minute in APIAccessAggregate.
+AUDIT_ACCESS_DEFAULT_SAMPLE_RATE = config('AUDIT_ACCESS_DEFAULT_SAMPLE_RATE', default=0.1, cast=float)
+AUDIT_ACCESS_SAMPLE_RATES = [
+    (r'^/api/(v1/)?(accounts|payments|audit)/', 1.0),
+    (r'^/api/(v1/)?(vehicles|notifications|chat)/', 0.01),
+]
+
+# Audit retention (audit/retention.py, run monthly by cleanup-old-audit-logs)
+# Days to keep per audit model; whole calendar months past the window are
+# exported to AUDIT_ARCHIVE_DIR as gzipped NDJSON, then deleted in chunks.
+AUDIT_LOG_RETENTION_DAYS = config('AUDIT_LOG_RETENTION_DAYS', default=2555, cast=int)  # 7 years
+AUDIT_RETENTION_DAYS = {
+    'APIAccessLog': config('AUDIT_API_ACCESS_RETENTION_DAYS', default=90, cast=int),
+    'APIAccessAggregate': config('AUDIT_API_AGGREGATE_RETENTION_DAYS', default=730, cast=int),
+}
+AUDIT_RETENTION_CHUNK_SIZE = config('AUDIT_RETENTION_CHUNK_SIZE', default=5000, cast=int)
+AUDIT_RETENTION_CHUNK_SLEEP = config('AUDIT_RETENTION_CHUNK_SLEEP', default=0.1, cast=float)
+AUDIT_ARCHIVE_DIR = config('AUDIT_ARCHIVE_DIR', default=str(BASE_DIR / 'audit_archive'))
+
+# API latency histograms (audit/metrics.py), scraped from /metrics
+# Each worker publishes its histograms to the cache every FLUSH_INTERVAL
+# seconds; snapshots of workers that stop publishing expire after WORKER_TTL.
+# The cache must be shared (Redis) for /metrics to cover every worker.
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=5.0, cast=float)
+METRICS_WORKER_TTL = config('METRICS_WORKER_TTL', default=86400, cast=int)
+METRICS_AUTH_TOKEN = config('METRICS_AUTH_TOKEN', default='')
+
+# Chat presence (chat/presence.py), shared through the cache
+# Clients heartbeat every HEARTBEAT_INTERVAL seconds; a connection without a
+# heartbeat for PRESENCE_TTL seconds is dropped. Offline status is announced
+# only after OFFLINE_GRACE seconds without any connection.
+PRESENCE_HEARTBEAT_INTERVAL = config('PRESENCE_HEARTBEAT_INTERVAL', default=30, cast=int)
+PRESENCE_TTL = config('PRESENCE_TTL', default=75, cast=int)
+PRESENCE_OFFLINE_GRACE = config('PRESENCE_OFFLINE_GRACE', default=10, cast=int)
+
+# Chat typing indicators (chat/typing_indicators.py): one broadcast per
+# BROADCAST_INTERVAL seconds at most; "typing" expires after TIMEOUT seconds
+CHAT_TYPING_BROADCAST_INTERVAL = config('CHAT_TYPING_BROADCAST_INTERVAL', default=2.0, cast=float)
+CHAT_TYPING_TIMEOUT = config('CHAT_TYPING_TIMEOUT', default=6.0, cast=float)
+
+# Notification retention (notifications/retention.py, run daily by
+# compact-old-notifications). Read notifications older than their type's
+# window are folded into per-user daily digests and deleted in chunks;
+# unread notifications are kept.
+NOTIFICATION_DEFAULT_RETENTION_DAYS = config('NOTIFICATION_DEFAULT_RETENTION_DAYS', default=90, cast=int)
+NOTIFICATION_RETENTION_DAYS = {
+    'system': config('NOTIFICATION_SYSTEM_RETENTION_DAYS', default=30, cast=int),
+    'vehicle': config('NOTIFICATION_VEHICLE_RETENTION_DAYS', default=30, cast=int),
+    'commission': config('NOTIFICATION_COMMISSION_RETENTION_DAYS', default=365, cast=int),
+}
+NOTIFICATION_DIGEST_RETENTION_DAYS = config('NOTIFICATION_DIGEST_RETENTION_DAYS', default=730, cast=int)
+NOTIFICATION_RETENTION_CHUNK_SIZE = config('NOTIFICATION_RETENTION_CHUNK_SIZE', default=5000, cast=int)
+NOTIFICATION_RETENTION_CHUNK_SLEEP = config('NOTIFICATION_RETENTION_CHUNK_SLEEP', default=0.1, cast=float)
+
+# Payment intents a user may create per hour (payments.throttles.PaymentAttemptThrottle)
+PAYMENT_ATTEMPT_LIMIT = config('PAYMENT_ATTEMPT_LIMIT', default=20, cast=int)
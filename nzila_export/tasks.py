@@ -0,0 +1,18 @@
+"""
+Celery tasks for project-wide maintenance
+"""
+from celery import shared_task
+
+
+@shared_task
+def cleanup_old_audit_logs(dry_run=False):
+    """
+    Archive and purge audit rows whose monthly bucket is past retention
+    Deletes run in bounded chunks; see audit.retention.AuditRetentionEngine
+    """
+    from audit.retention import AuditRetentionEngine
+    
+    results = AuditRetentionEngine.from_settings().run(dry_run=dry_run)
+    total = sum(result['rows'] for result in results)
+    
+    return f"Purged {total} audit rows across {len(results)} buckets"
@@ -22,6 +22,7 @@ from django.conf.urls.i18n import i18n_patterns
 from .views import home
 from .analytics_views import get_analytics_stats, get_revenue_chart, get_pipeline_chart, get_recent_activities
 from .settings_views import company_settings, currency_rates, currency_rate_detail
+from audit.views import prometheus_metrics
 
 def trigger_error(request):
     """Sentry test endpoint - triggers a division by zero error"""
@@ -73,6 +74,9 @@ urlpatterns = [
     path('api/settings/currency/', currency_rates, name='currency-rates'),
     path('api/settings/currency/<int:pk>/', currency_rate_detail, name='currency-rate-detail'),
     
+    # Prometheus scrape endpoint (API latency histograms)
+    path('metrics', prometheus_metrics, name='metrics'),
+    
     # Internationalization
     path('i18n/', include('django.conf.urls.i18n')),
 ]
@@ -2,7 +2,9 @@
 Payment Throttle Class
 Provides stricter rate limiting for sensitive payment endpoints
 """
-from rest_framework.throttling import UserRateThrottle
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle, UserRateThrottle
+from audit.counters import payment_attempts
 
 
 class PaymentRateThrottle(UserRateThrottle):
@@ -12,3 +14,25 @@ class PaymentRateThrottle(UserRateThrottle):
     """
     scope = 'payment'
 
+
+class PaymentAttemptThrottle(BaseThrottle):
+    """
+    Cap payment intent creation per user over a sliding window
+    Backed by a cache counter, so the limit holds across workers when the
+    default cache is shared (see audit.W001)
+    """
+    
+    def get_limit(self):
+        return getattr(settings, 'PAYMENT_ATTEMPT_LIMIT', 20)
+    
+    def allow_request(self, request, view):
+        if not request.user.is_authenticated:
+            return True
+        key = f'user:{request.user.pk}'
+        if payment_attempts.exceeded(key, self.get_limit()):
+            return False
+        payment_attempts.hit(key)
+        return True
+    
+    def wait(self):
+        return payment_attempts.bucket_seconds
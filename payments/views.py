@@ -15,7 +15,7 @@ from .serializers import (
     RefundSerializer, InvoiceSerializer, InvoiceCreateSerializer, TransactionSerializer
 )
 from .stripe_service import StripePaymentService, CurrencyService
-from .throttles import PaymentRateThrottle
+from .throttles import PaymentRateThrottle, PaymentAttemptThrottle
 from deals.models import Deal
 from shipments.models import Shipment
 
@@ -136,7 +136,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
         
         return queryset.select_related('user', 'currency', 'payment_method', 'deal')
     
-    @action(detail=False, methods=['post'])
+    @action(detail=False, methods=['post'], throttle_classes=[PaymentRateThrottle, PaymentAttemptThrottle])
     def create_intent(self, request):
         """Create a payment intent"""
         serializer = PaymentIntentCreateSerializer(data=request.data)